@@ -0,0 +1,155 @@
+"""
+Admission control for API requests
+
+Two checks run before a request reaches a handler:
+
+* RateLimiter: a token bucket per (client, endpoint class). Cheap reads,
+  analytics, exports and writes each get their own rate and burst, so one
+  client paging through exports cannot starve their own reads or anyone
+  else's requests. An empty bucket is answered with 429 and the time until
+  the next token.
+* ConcurrencyGate: a global limit on in-flight work, sized to the
+  connection pool. A request takes as many slots as connections it can
+  hold at once (one, except for fan-out endpoints). Requests over the
+  limit wait in a queue only while the expected wait (queue depth over
+  limit, times the smoothed service time) fits the latency budget. Beyond
+  that they are shed immediately with 503, rather than piling up on pool
+  checkouts.
+"""
+
+import math
+import threading
+import time
+
+ENDPOINT_CLASSES = ('read', 'analytics', 'export', 'write')
+
+# rate (tokens per second) / burst per endpoint class
+DEFAULT_RATE_LIMITS = 'read=20/40,analytics=5/15,export=0.1/2,write=5/20'
+
+def parse_rate_limits(spec):
+    """Parse 'class=rate/burst,...' into {class: (rate, burst)}"""
+    limits = {}
+    for item in spec.split(','):
+        if not item.strip():
+            continue
+        name, values = item.split('=')
+        rate, burst = values.split('/')
+        name = name.strip()
+        if name not in ENDPOINT_CLASSES:
+            raise ValueError(f"Unknown endpoint class {name}")
+        limits[name] = (float(rate), float(burst))
+    return limits
+
+def retry_after_header(seconds):
+    """Whole seconds for a Retry-After header, at least 1"""
+    return str(max(1, math.ceil(seconds)))
+
+class RateLimiter:
+    """Token buckets per (client, endpoint class)"""
+
+    # Buckets are pruned once there are more than this many
+    MAX_BUCKETS = 10000
+
+    def __init__(self, limits):
+        self.limits = limits
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.counters = {name: {'allowed': 0, 'rejected': 0} for name in ENDPOINT_CLASSES}
+
+    def acquire(self, client, endpoint_class):
+        """Take one token; returns 0 when allowed, else seconds until a token is due"""
+        rate, burst = self.limits.get(endpoint_class, (None, None))
+        if rate is None:
+            return 0
+
+        now = time.monotonic()
+        with self.lock:
+            key = (client, endpoint_class)
+            tokens, updated = self.buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                self.buckets[key] = (tokens - 1, now)
+                self.counters[endpoint_class]['allowed'] += 1
+                return 0
+            self.buckets[key] = (tokens, now)
+            self.counters[endpoint_class]['rejected'] += 1
+            if len(self.buckets) > self.MAX_BUCKETS:
+                self._prune(now)
+            return (1 - tokens) / rate
+
+    def _prune(self, now):
+        """Drop buckets idle long enough to have refilled; they equal new ones"""
+        for key, (tokens, updated) in list(self.buckets.items()):
+            rate, burst = self.limits[key[1]]
+            if tokens + (now - updated) * rate >= burst:
+                del self.buckets[key]
+
+    def stats(self):
+        with self.lock:
+            return {
+                'clients': len(self.buckets),
+                'classes': {name: dict(counters) for name, counters in self.counters.items()}
+            }
+
+class ConcurrencyGate:
+    """Bounded in-flight requests with a latency-budgeted wait queue"""
+
+    def __init__(self, limit, latency_budget):
+        self.limit = limit
+        self.latency_budget = latency_budget
+        self.condition = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+        # Smoothed seconds a request holds its slot
+        self.service_time = 0.05
+        self.counters = {name: {'admitted': 0, 'queued': 0, 'shed': 0, 'timed_out': 0}
+                         for name in ENDPOINT_CLASSES}
+
+    def enter(self, endpoint_class, slots=1):
+        """Wait for slots; returns (True, 0) or (False, suggested retry seconds)"""
+        counters = self.counters[endpoint_class]
+        with self.condition:
+            if self.active + slots <= self.limit and not self.waiting:
+                self.active += slots
+                counters['admitted'] += 1
+                return True, 0
+
+            expected_wait = (self.waiting + 1) / self.limit * self.service_time
+            if expected_wait > self.latency_budget:
+                counters['shed'] += 1
+                return False, expected_wait
+
+            counters['queued'] += 1
+            self.waiting += 1
+            deadline = time.monotonic() + self.latency_budget
+            try:
+                while self.active + slots > self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        counters['timed_out'] += 1
+                        return False, self.service_time * (self.waiting / self.limit + 1)
+                    self.condition.wait(remaining)
+            finally:
+                self.waiting -= 1
+
+            self.active += slots
+            counters['admitted'] += 1
+            return True, 0
+
+    def leave(self, elapsed, slots=1):
+        """Free slots, folding the request's duration into the service time"""
+        with self.condition:
+            self.active -= slots
+            self.service_time = 0.9 * self.service_time + 0.1 * elapsed
+            # Waiters need different numbers of slots
+            self.condition.notify_all()
+
+    def stats(self):
+        with self.condition:
+            return {
+                'limit': self.limit,
+                'in_flight': self.active,
+                'waiting': self.waiting,
+                'avg_service_ms': round(self.service_time * 1000, 2),
+                'classes': {name: dict(counters) for name, counters in self.counters.items()}
+            }
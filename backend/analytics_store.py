@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Spend Tracker In-Process Analytics Store
+
+Active transactions are held in memory as compact typed arrays: day
+ordinals, ids and credited/debited integer cents. They are partitioned by
+user and category, and each partition is kept sorted by date. A date
+filter is then two bisections, and a group-by over users, categories or
+months is a sum over contiguous array slices, done in C rather than per
+row in Python.
+
+The store is loaded once, then kept in sync by polling for rows whose
+updated_at moved past the last watermark. Summary, category-spending and
+monthly-trend reads are answered from memory while the last successful
+sync is recent enough. Otherwise, or when a filter the store cannot
+evaluate (tags) is present, the caller falls back to SQL.
+
+Run as a script to check the in-memory totals against SQL.
+"""
+
+import mysql.connector
+from mysql.connector import Error
+import os
+import sys
+import threading
+import time
+import logging
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from dotenv import load_dotenv
+from dateutil.relativedelta import relativedelta
+
+from timeseries import parse_date, to_cents
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_SYNC_INTERVAL = float(os.getenv('ANALYTICS_SYNC_INTERVAL', 1))
+# Reads fall back to SQL when the last successful sync is older than this
+ANALYTICS_MAX_STALENESS = float(os.getenv('ANALYTICS_MAX_STALENESS', 10))
+# updated_at has one-second resolution and is set before commit, so each
+# poll re-reads a short overlap; re-applying a row is idempotent. Every
+# writer stamps it with the database's CURRENT_TIMESTAMP, never the app
+# server's clock, so the watermark compares times from a single clock
+SYNC_OVERLAP_SECONDS = 5
+
+def to_timestamp(value):
+    """MAX(updated_at) comes back untyped from some engines"""
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+def to_amount(cents):
+    """Integer cents back to a two-place Decimal, as SUM() returns it"""
+    return Decimal(cents).scaleb(-2)
+
+class Partition:
+    """One user's transactions in one category, sorted by date"""
+
+    __slots__ = ('days', 'ids', 'credited', 'debited')
+
+    def __init__(self):
+        self.days = array('i')
+        self.ids = array('q')
+        self.credited = array('q')
+        self.debited = array('q')
+
+    def append(self, day, transaction_id, credited, debited):
+        """Add a row known to sort after every existing row"""
+        self.days.append(day)
+        self.ids.append(transaction_id)
+        self.credited.append(credited)
+        self.debited.append(debited)
+
+    def insert(self, day, transaction_id, credited, debited):
+        index = bisect_right(self.days, day)
+        self.days.insert(index, day)
+        self.ids.insert(index, transaction_id)
+        self.credited.insert(index, credited)
+        self.debited.insert(index, debited)
+
+    def remove(self, day, transaction_id):
+        for index in range(bisect_left(self.days, day), bisect_right(self.days, day)):
+            if self.ids[index] == transaction_id:
+                del self.days[index]
+                del self.ids[index]
+                del self.credited[index]
+                del self.debited[index]
+                return
+
+    def span(self, from_day=None, to_day=None):
+        """Slice bounds of the rows dated within [from_day, to_day]"""
+        lo = bisect_left(self.days, from_day) if from_day is not None else 0
+        hi = bisect_right(self.days, to_day) if to_day is not None else len(self.days)
+        return lo, hi
+
+    def totals(self, lo, hi):
+        """(count, credited cents, debited cents) over a slice"""
+        return hi - lo, sum(self.credited[lo:hi]), sum(self.debited[lo:hi])
+
+class AnalyticsStore:
+    """Columnar copy of active transactions, synced by polling updated_at"""
+
+    def __init__(self, get_connection, interval=ANALYTICS_SYNC_INTERVAL,
+                 max_staleness=ANALYTICS_MAX_STALENESS):
+        self.get_connection = get_connection
+        self.interval = interval
+        self.max_staleness = max_staleness
+        self.lock = threading.Lock()
+        self.partitions = {}
+        self.locations = {}
+        self.categories = {}
+        self.watermarks = {'transactions': None, 'categories': None}
+        self.synced_at = None
+        self.stop = threading.Event()
+
+    # Loading and syncing
+
+    def load(self, connection):
+        """Replace the store's contents with a full read of active rows"""
+        cursor = connection.cursor()
+        # Take the watermarks first so rows changed during the scan are re-read
+        cursor.execute("SELECT MAX(updated_at) FROM transactions")
+        transactions_mark = to_timestamp(cursor.fetchone()[0])
+        cursor.execute("SELECT MAX(updated_at) FROM categories")
+        categories_mark = to_timestamp(cursor.fetchone()[0])
+
+        cursor.execute("SELECT id, name, color, icon, status FROM categories")
+        categories = {row[0]: row[1:] for row in cursor.fetchall()}
+
+        cursor.execute("""
+            SELECT id, user_id, category_id, transaction_date, credited, debited
+            FROM transactions
+            WHERE status = 'active'
+            ORDER BY user_id, category_id, transaction_date, id
+        """)
+        partitions = {}
+        locations = {}
+        while True:
+            rows = cursor.fetchmany(10000)
+            if not rows:
+                break
+            for transaction_id, user_id, category_id, day, credited, debited in rows:
+                day = parse_date(day).toordinal()
+                partition = partitions.setdefault(user_id, {}).get(category_id)
+                if partition is None:
+                    partition = partitions[user_id][category_id] = Partition()
+                partition.append(day, transaction_id, to_cents(credited), to_cents(debited))
+                locations[transaction_id] = (user_id, category_id, day)
+        cursor.close()
+
+        with self.lock:
+            self.partitions = partitions
+            self.locations = locations
+            self.categories = categories
+            self.watermarks = {'transactions': transactions_mark, 'categories': categories_mark}
+            self.synced_at = time.monotonic()
+        logger.info(f"Analytics store loaded {len(locations)} transactions")
+
+    def _changed_since(self, cursor, table, columns):
+        watermark = self.watermarks[table]
+        query = f"SELECT {columns}, updated_at FROM {table}"
+        params = []
+        if watermark is not None:
+            query += " WHERE updated_at >= %s"
+            params.append(watermark - timedelta(seconds=SYNC_OVERLAP_SECONDS))
+        cursor.execute(query + " ORDER BY updated_at, id", params)
+        return cursor.fetchall()
+
+    def sync(self, connection):
+        """Apply every row changed since the last watermark"""
+        cursor = connection.cursor()
+        categories = self._changed_since(cursor, 'categories', 'id, name, color, icon, status')
+        transactions = self._changed_since(
+            cursor, 'transactions', 'id, user_id, category_id, transaction_date, credited, debited, status'
+        )
+        cursor.close()
+
+        with self.lock:
+            for row in categories:
+                self.categories[row[0]] = row[1:5]
+                self.watermarks['categories'] = row[5]
+            for row in transactions:
+                self._apply(*row[:7])
+                self.watermarks['transactions'] = row[7]
+            self.synced_at = time.monotonic()
+
+    def _apply(self, transaction_id, user_id, category_id, day, credited, debited, status):
+        """Upsert one transaction; inactive rows are dropped"""
+        previous = self.locations.pop(transaction_id, None)
+        if previous:
+            old_user, old_category, old_day = previous
+            self.partitions[old_user][old_category].remove(old_day, transaction_id)
+
+        if status == 'active':
+            day = parse_date(day).toordinal()
+            partition = self.partitions.setdefault(user_id, {}).get(category_id)
+            if partition is None:
+                partition = self.partitions[user_id][category_id] = Partition()
+            partition.insert(day, transaction_id, to_cents(credited), to_cents(debited))
+            self.locations[transaction_id] = (user_id, category_id, day)
+
+    def _run(self):
+        while not self.stop.is_set():
+            try:
+                connection = self.get_connection()
+                try:
+                    if self.synced_at is None:
+                        self.load(connection)
+                    else:
+                        self.sync(connection)
+                finally:
+                    connection.close()
+            except Exception as e:
+                logger.error(f"Analytics store sync error: {e}")
+            self.stop.wait(self.interval)
+
+    def start(self):
+        """Load and then keep polling on a daemon thread"""
+        threading.Thread(target=self._run, name='analytics-store', daemon=True).start()
+        return self.stop
+
+    # Reads
+
+    @property
+    def lag(self):
+        """Seconds since the last successful sync, or None before the first load"""
+        if self.synced_at is None:
+            return None
+        return time.monotonic() - self.synced_at
+
+    def serves(self, args):
+        """Whether a request with these filters can be answered from memory"""
+        lag = self.lag
+        return (lag is not None and lag < self.max_staleness and not args.get('tags')
+                and not args.get('include_subcategories'))
+
+    @staticmethod
+    def _day_range(args):
+        from_day = parse_date(args['from_date']).toordinal() if args.get('from_date') else None
+        to_day = parse_date(args['to_date']).toordinal() if args.get('to_date') else None
+        return from_day, to_day
+
+    def summary(self, user_id, args):
+        """Income/expense totals, matching fetch_summary's SQL"""
+        from_day, to_day = self._day_range(args)
+        category_id = int(args['category_id']) if args.get('category_id') else None
+
+        count = credited = debited = 0
+        with self.lock:
+            for key, partition in self.partitions.get(user_id, {}).items():
+                if category_id is not None and key != category_id:
+                    continue
+                n, c, d = partition.totals(*partition.span(from_day, to_day))
+                count += n
+                credited += c
+                debited += d
+
+        return {
+            'total_credited': to_amount(credited),
+            'total_debited': to_amount(debited),
+            'net_balance': to_amount(credited - debited),
+            'transaction_count': count
+        }
+
+    def category_spending(self, user_id, args):
+        """Debited totals per active category, largest first"""
+        from_day, to_day = self._day_range(args)
+
+        rows = []
+        with self.lock:
+            for category_id, partition in self.partitions.get(user_id, {}).items():
+                category = self.categories.get(category_id)
+                if not category or category[3] != 'active':
+                    continue
+                lo, hi = partition.span(from_day, to_day)
+                spent = sum(partition.debited[lo:hi])
+                if spent > 0:
+                    rows.append((category[0], category[1], category[2], spent))
+
+        rows.sort(key=lambda row: row[3], reverse=True)
+        return ('name', 'color', 'icon', 'total_spent'), [row[:3] + (to_amount(row[3]),) for row in rows]
+
+    def monthly_trend(self, user_id, args):
+        """Monthly income/expense totals, defaulting to the last 12 months"""
+        from_day, to_day = self._day_range(args)
+        if from_day is None:
+            from_day = (date.today() - relativedelta(months=12)).toordinal()
+
+        months = {}
+        with self.lock:
+            for partition in self.partitions.get(user_id, {}).values():
+                lo, hi = partition.span(from_day, to_day)
+                # Each step bisects to the end of the month of the next row
+                while lo < hi:
+                    month = date.fromordinal(partition.days[lo]).replace(day=1)
+                    end = bisect_left(partition.days, (month + relativedelta(months=1)).toordinal(), lo, hi)
+                    totals = months.setdefault(month, [0, 0])
+                    totals[0] += sum(partition.credited[lo:end])
+                    totals[1] += sum(partition.debited[lo:end])
+                    lo = end
+
+        rows = [
+            (month.strftime('%Y-%m'), to_amount(income), to_amount(expense))
+            for month, (income, expense) in sorted(months.items())
+        ]
+        return ('month', 'total_income', 'total_expense'), rows
+
+    def stats(self):
+        """Size and freshness counters for /api/metrics"""
+        lag = self.lag
+        with self.lock:
+            return {
+                'transactions': len(self.locations),
+                'partitions': sum(len(categories) for categories in self.partitions.values()),
+                'lag_seconds': round(lag, 3) if lag is not None else None,
+                'serving': lag is not None and lag < self.max_staleness
+            }
+
+def check_consistency(connection):
+    """Compare per-user, per-category totals in a fresh store against SQL
+
+    Returns a list of mismatch descriptions (empty when consistent).
+    """
+    store = AnalyticsStore(lambda: connection)
+    store.load(connection)
+
+    cursor = connection.cursor()
+    cursor.execute("""
+        SELECT user_id, category_id, COUNT(*), SUM(credited), SUM(debited)
+        FROM transactions
+        WHERE status = 'active'
+        GROUP BY user_id, category_id
+    """)
+    expected = {(row[0], row[1]): (row[2], to_cents(row[3]), to_cents(row[4])) for row in cursor.fetchall()}
+    cursor.close()
+
+    actual = {}
+    for user_id, categories in store.partitions.items():
+        for category_id, partition in categories.items():
+            if partition.days:
+                actual[(user_id, category_id)] = partition.totals(0, len(partition.days))
+
+    return [
+        f"user {key[0]} category {key[1]}: sql={expected.get(key)} store={actual.get(key)}"
+        for key in sorted(set(expected) | set(actual), key=lambda k: (k[0] or 0, k[1]))
+        if expected.get(key) != actual.get(key)
+    ]
+
+def main():
+    """Load the store and check it against SQL."""
+    from setup_database import get_database_config
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    config = get_database_config()
+    config['database'] = os.getenv('MYSQL_DATABASE', 'spend_tracker')
+
+    try:
+        connection = mysql.connector.connect(**config)
+        mismatches = check_consistency(connection)
+        connection.close()
+    except Error as e:
+        logger.error(f"Consistency check failed: {e}")
+        sys.exit(1)
+
+    for mismatch in mismatches:
+        logger.error(mismatch)
+    if mismatches:
+        sys.exit(1)
+    logger.info("Analytics store matches SQL totals")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Streaming spending-anomaly detection
+
+category_stats holds one row per (user, category) with Welford running
+statistics of transaction amounts (n, mean, m2) and two exponentially
+decayed transaction counts (short and long horizon). Every insert, update
+and delete adjusts that row with a single atomic UPDATE, so flagging a new
+transaction costs one primary-key read and one write regardless of history
+size.
+
+A transaction is flagged when its amount is more than ANOMALY_Z_THRESHOLD
+standard deviations from the category mean, or when the short-horizon rate
+of transactions in its category jumps above FREQUENCY_SPIKE_RATIO times the
+long-horizon rate. The rates are only compared once the category's history
+spans MIN_FREQUENCY_SPAN_DAYS: before that the long count has not filled its
+horizon and every steady category would look like a spike.
+
+The counts are referenced to last_event_date. A later transaction decays
+them forward to its own date; a backdated one adds only its own decayed
+weight, so the order of inserts does not change the counts.
+rebuild_anomaly_stats.py recomputes the table from history; bulk edits
+recompute just the categories they touch with rebuild_categories.
+"""
+
+import math
+import os
+
+from timeseries import parse_date
+
+ANOMALY_Z_THRESHOLD = float(os.getenv('ANOMALY_Z_THRESHOLD', 3.0))
+FREQUENCY_SPIKE_RATIO = float(os.getenv('FREQUENCY_SPIKE_RATIO', 3.0))
+# Observations needed before a category's statistics are trusted
+MIN_OBSERVATIONS = 5
+# Decay time constants for the frequency counts, in days (floats, so
+# DATEDIFF / horizon never truncates on engines with integer division)
+SHORT_HORIZON_DAYS = 7.0
+LONG_HORIZON_DAYS = 90.0
+# History a category needs before its frequency can be flagged
+MIN_FREQUENCY_SPAN_DAYS = LONG_HORIZON_DAYS
+
+def transaction_amount(credited, debited):
+    """Magnitude compared against the category's history"""
+    return max(float(credited or 0), float(debited or 0))
+
+def ensure_stats_row(cursor, user_id, category_id):
+    cursor.execute("""
+        INSERT IGNORE INTO category_stats (user_id, category_id) VALUES (%s, %s)
+    """, (user_id, category_id))
+
+def fetch_stats(cursor, user_id, category_id):
+    """Current statistics for a category, or None"""
+    cursor.execute("""
+        SELECT n, mean, m2, short_count, long_count, first_event_date, last_event_date
+        FROM category_stats
+        WHERE user_key = COALESCE(%s, 0) AND category_id = %s
+    """, (user_id, category_id))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    if not isinstance(row, dict):
+        row = dict(zip(('n', 'mean', 'm2', 'short_count', 'long_count', 'first_event_date', 'last_event_date'), row))
+    return row
+
+def decayed(count, last_event_date, day, horizon):
+    """Decay a count from last_event_date forward to day (not back: a count
+    stays referenced to its latest event)"""
+    if count is None or last_event_date is None:
+        return 0.0
+    elapsed = max((day - parse_date(last_event_date)).days, 0)
+    return float(count) * math.exp(-elapsed / horizon)
+
+def event_weight(last_event_date, day, horizon):
+    """What one transaction on day adds to a count referenced to the later
+    of last_event_date and day"""
+    if last_event_date is None:
+        return 1.0
+    return math.exp(-max((parse_date(last_event_date) - day).days, 0) / horizon)
+
+def evaluate(stats, amount, day):
+    """Score an amount and date against a category's statistics
+
+    Returns a flag dict when the transaction is anomalous, else None.
+    """
+    if not stats:
+        return None
+
+    reasons = []
+    z_score = None
+    n = stats['n']
+    if n >= MIN_OBSERVATIONS:
+        variance = float(stats['m2']) / n
+        if variance > 0:
+            z_score = (amount - float(stats['mean'])) / math.sqrt(variance)
+            if abs(z_score) > ANOMALY_Z_THRESHOLD:
+                reasons.append('amount')
+
+    # Include this transaction in both decayed counts before comparing rates
+    last = stats['last_event_date']
+    short_count = (decayed(stats['short_count'], last, day, SHORT_HORIZON_DAYS)
+                   + event_weight(last, day, SHORT_HORIZON_DAYS))
+    long_count = (decayed(stats['long_count'], last, day, LONG_HORIZON_DAYS)
+                  + event_weight(last, day, LONG_HORIZON_DAYS))
+    frequency_ratio = (short_count / SHORT_HORIZON_DAYS) / (long_count / LONG_HORIZON_DAYS)
+    first = parse_date(stats['first_event_date']) if stats.get('first_event_date') else day
+    span = (max(day, parse_date(last) if last else day) - min(first, day)).days
+    if n >= MIN_OBSERVATIONS and span >= MIN_FREQUENCY_SPAN_DAYS and short_count >= 3 \
+            and frequency_ratio > FREQUENCY_SPIKE_RATIO:
+        reasons.append('frequency')
+
+    if not reasons:
+        return None
+    return {
+        'reasons': reasons,
+        'z_score': round(z_score, 4) if z_score is not None else None,
+        'frequency_ratio': round(frequency_ratio, 4)
+    }
+
+def add_observation(cursor, user_id, category_id, amount, day):
+    """Fold one transaction into its category's statistics (Welford add)"""
+    ensure_stats_row(cursor, user_id, category_id)
+    # MySQL applies single-table SET assignments left to right, so m2 and
+    # mean below read the previous n and mean
+    cursor.execute("""
+        UPDATE category_stats SET
+            m2 = m2 + (%s - mean) * (%s - (mean + (%s - mean) / (n + 1))),
+            mean = mean + (%s - mean) / (n + 1),
+            n = n + 1,
+            short_count = short_count * EXP(-GREATEST(DATEDIFF(%s, COALESCE(last_event_date, %s)), 0) / %s)
+                + EXP(-GREATEST(DATEDIFF(COALESCE(last_event_date, %s), %s), 0) / %s),
+            long_count = long_count * EXP(-GREATEST(DATEDIFF(%s, COALESCE(last_event_date, %s)), 0) / %s)
+                + EXP(-GREATEST(DATEDIFF(COALESCE(last_event_date, %s), %s), 0) / %s),
+            first_event_date = LEAST(COALESCE(first_event_date, %s), %s),
+            last_event_date = GREATEST(COALESCE(last_event_date, %s), %s)
+        WHERE user_key = COALESCE(%s, 0) AND category_id = %s
+    """, (amount, amount, amount, amount,
+          day, day, SHORT_HORIZON_DAYS, day, day, SHORT_HORIZON_DAYS,
+          day, day, LONG_HORIZON_DAYS, day, day, LONG_HORIZON_DAYS,
+          day, day, day, day, user_id, category_id))
+
+def remove_observation(cursor, user_id, category_id, amount, day):
+    """Take one transaction back out of its category's statistics (Welford remove)"""
+    cursor.execute("""
+        UPDATE category_stats SET
+            m2 = CASE WHEN n <= 1 THEN 0
+                 ELSE GREATEST(m2 - (%s - (n * mean - %s) / (n - 1)) * (%s - mean), 0) END,
+            mean = CASE WHEN n <= 1 THEN 0 ELSE (n * mean - %s) / (n - 1) END,
+            n = GREATEST(n - 1, 0),
+            short_count = GREATEST(short_count - EXP(-GREATEST(DATEDIFF(last_event_date, %s), 0) / %s), 0),
+            long_count = GREATEST(long_count - EXP(-GREATEST(DATEDIFF(last_event_date, %s), 0) / %s), 0)
+        WHERE user_key = COALESCE(%s, 0) AND category_id = %s
+    """, (amount, amount, amount, amount,
+          day, SHORT_HORIZON_DAYS,
+          day, LONG_HORIZON_DAYS,
+          user_id, category_id))
+
+def record_flag(cursor, user_id, transaction_id, category_id, flag):
+    """Store or clear the anomaly flag of a transaction"""
+    cursor.execute("DELETE FROM transaction_anomalies WHERE transaction_id = %s", (transaction_id,))
+    if flag:
+        cursor.execute("""
+            INSERT INTO transaction_anomalies
+            (transaction_id, user_id, category_id, reasons, z_score, frequency_ratio)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, (transaction_id, user_id, category_id, ','.join(flag['reasons']),
+              flag['z_score'], flag['frequency_ratio']))
+
+def observe_insert(cursor, user_id, transaction_id, category_id, transaction_date, credited, debited):
+    """Score a new transaction, then add it to the statistics"""
+    day = parse_date(transaction_date)
+    amount = transaction_amount(credited, debited)
+    flag = evaluate(fetch_stats(cursor, user_id, category_id), amount, day)
+    add_observation(cursor, user_id, category_id, amount, day)
+    record_flag(cursor, user_id, transaction_id, category_id, flag)
+    return flag
+
+def observe_update(cursor, user_id, transaction_id, old, new):
+    """Replace an edited transaction's contribution and re-score it"""
+    remove_observation(cursor, user_id, old['category_id'],
+                       transaction_amount(old['credited'], old['debited']),
+                       parse_date(old['transaction_date']))
+    return observe_insert(cursor, user_id, transaction_id, new['category_id'],
+                          new['transaction_date'], new['credited'], new['debited'])
+
+def observe_delete(cursor, user_id, old):
+    """Remove a deleted transaction's contribution"""
+    remove_observation(cursor, user_id, old['category_id'],
+                       transaction_amount(old['credited'], old['debited']),
+                       parse_date(old['transaction_date']))
+
+def rebuild_categories(cursor, user_id, category_ids):
+    """Recompute one user's statistics for some categories from history
+
+    One set-based pass, used after bulk edits where a Welford update per
+    row would cost two statements per transaction.
+    """
+    category_ids = sorted(set(category_ids))
+    if not category_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(category_ids))
+    cursor.execute(f"""
+        DELETE FROM category_stats
+        WHERE user_key = COALESCE(%s, 0) AND category_id IN ({placeholders})
+    """, [user_id, *category_ids])
+    cursor.execute(f"""
+        INSERT INTO category_stats
+        (user_id, category_id, n, mean, m2, short_count, long_count, first_event_date, last_event_date)
+        SELECT
+            %s,
+            t.category_id,
+            COUNT(*),
+            AVG(t.amount),
+            GREATEST(SUM(t.amount * t.amount) - SUM(t.amount) * SUM(t.amount) / COUNT(*), 0),
+            SUM(EXP(-DATEDIFF(m.last_date, t.transaction_date) / %s)),
+            SUM(EXP(-DATEDIFF(m.last_date, t.transaction_date) / %s)),
+            MIN(t.transaction_date),
+            m.last_date
+        FROM (
+            SELECT category_id, transaction_date, GREATEST(credited, debited) AS amount
+            FROM transactions
+            WHERE user_id <=> %s AND status = 'active' AND category_id IN ({placeholders})
+        ) t
+        JOIN (
+            SELECT category_id, MAX(transaction_date) AS last_date
+            FROM transactions
+            WHERE user_id <=> %s AND status = 'active' AND category_id IN ({placeholders})
+            GROUP BY category_id
+        ) m ON m.category_id = t.category_id
+        GROUP BY t.category_id, m.last_date
+    """, [user_id, SHORT_HORIZON_DAYS, LONG_HORIZON_DAYS,
+          user_id, *category_ids, user_id, *category_ids])
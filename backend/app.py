@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file, g, has_request_context
 from flask_cors import CORS
 import mysql.connector
 from mysql.connector import pooling
@@ -6,18 +6,47 @@ import os
 from datetime import datetime, timedelta
 import csv
 import io
+import re
+import json
+import base64
+import time
+import threading
 import jwt
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
 from dotenv import load_dotenv
 import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from tag_index import attach_tags, detach_tags, sync_transaction_tags, build_tag_filter
+from serialization import FastJSONProvider, records, shape_rows
+from timeseries import TimeSeriesCache, GRANULARITIES, METRICS, parse_date
+import forecast
+import anomaly
+import duplicates
+import categorizer
+import guardrails
+import archiver
+import audit
+import exports
+import category_tree
+from analytics_store import AnalyticsStore
+import storage
+import change_feed
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from admission import RateLimiter, ConcurrencyGate, parse_rate_limits, retry_after_header, DEFAULT_RATE_LIMITS
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-change-in-production')
 
+# Multi-user mode scopes every data route to the authenticated user;
+# single-user mode works on rows whose user_id is NULL
+MULTI_USER_ENABLED = os.getenv('ENABLE_MULTI_USER', 'False').lower() == 'true'
+
 # Configure CORS
 CORS(app, origins=['http://localhost:3000', 'http://localhost:5173'])
 
@@ -34,33 +63,498 @@ DB_CONFIG = {
     'port': int(os.getenv('MYSQL_PORT', 3306)),
     'charset': 'utf8mb4',
     'use_unicode': True,
-    'autocommit': True
+    'autocommit': True,
+    'connection_timeout': int(os.getenv('MYSQL_CONNECT_TIMEOUT', 5))
 }
 
-# Create connection pool
-try:
-    connection_pool = pooling.MySQLConnectionPool(
-        pool_name="spend_tracker_pool",
-        pool_size=5,
+# Cooperative (gevent) workers need the pure-Python driver, whose sockets
+# are patched; the C extension would block every greenlet in the worker
+if os.getenv('MYSQL_USE_PURE', 'False').lower() == 'true':
+    DB_CONFIG['use_pure'] = True
+
+# Read replica configuration (optional). Any MySQL instance holding a copy
+# of the data works; a second local instance is enough for development.
+REPLICA_DB_CONFIG = dict(
+    DB_CONFIG,
+    host=os.getenv('MYSQL_REPLICA_HOST'),
+    port=int(os.getenv('MYSQL_REPLICA_PORT', DB_CONFIG['port'])),
+    user=os.getenv('MYSQL_REPLICA_USER', DB_CONFIG['user']),
+    password=os.getenv('MYSQL_REPLICA_PASSWORD', DB_CONFIG['password'])
+) if os.getenv('MYSQL_REPLICA_HOST') else None
+
+# Reads by a user who wrote within this window go to the primary
+READ_YOUR_WRITES_SECONDS = float(os.getenv('READ_YOUR_WRITES_SECONDS', 5))
+# Replica lag above this sends reads to the primary
+MAX_REPLICA_LAG_SECONDS = float(os.getenv('MAX_REPLICA_LAG_SECONDS', 2))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv('REPLICA_LAG_CHECK_INTERVAL', 1))
+
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+
+# Pools are created per process, never at import, so workers forked from a
+# preloaded app do not share the parent's sockets. They are built by a
+# background thread that keeps retrying with backoff while MySQL is
+# unreachable; meanwhile the circuit breaker makes callers fail fast.
+connection_pool = None
+replica_pool = None
+worker_state = {'pid': None}
+worker_lock = threading.Lock()
+pool_lock = threading.Lock()
+pool_state = {'maintainer': None}
+pools_ready = threading.Event()
+
+POOL_RETRY_SECONDS = float(os.getenv('POOL_RETRY_SECONDS', 1))
+POOL_RETRY_MAX_SECONDS = float(os.getenv('POOL_RETRY_MAX_SECONDS', 30))
+# How long a request waits for the first pool build before failing
+POOL_STARTUP_WAIT_SECONDS = float(os.getenv('POOL_STARTUP_WAIT_SECONDS', 2))
+# How long a checkout waits for a free primary connection. Export workers,
+# the archiver and the analytics poller share the pool with requests but
+# bypass admission control
+POOL_CHECKOUT_WAIT_SECONDS = float(os.getenv('POOL_CHECKOUT_WAIT_SECONDS', 2))
+
+db_breaker = CircuitBreaker(
+    failure_threshold=int(os.getenv('DB_BREAKER_FAILURES', 5)),
+    reset_timeout=float(os.getenv('DB_BREAKER_RESET_SECONDS', 2)),
+    max_reset_timeout=POOL_RETRY_MAX_SECONDS
+)
+
+def create_pool(name, config):
+    return pooling.MySQLConnectionPool(
+        pool_name=f"{name}_{os.getpid()}",
+        pool_size=DB_POOL_SIZE,
         pool_reset_session=True,
-        **DB_CONFIG
+        **config
     )
-    logger.info("Database connection pool created successfully")
-except Exception as e:
-    logger.error(f"Failed to create database connection pool: {e}")
-    connection_pool = None
 
-def get_db_connection():
-    """Get database connection from pool"""
+def create_missing_pools():
+    """Create whichever of the primary and replica pools does not exist yet"""
+    global connection_pool, replica_pool
+    if connection_pool is None:
+        try:
+            connection_pool = create_pool("spend_tracker_pool", DB_CONFIG)
+            db_breaker.record_success()
+            pools_ready.set()
+            logger.info("Database connection pool created successfully")
+        except Exception as e:
+            db_breaker.record_failure()
+            logger.error(f"Failed to create database connection pool: {e}")
+
+    if REPLICA_DB_CONFIG and replica_pool is None:
+        try:
+            replica_pool = create_pool("spend_tracker_replica_pool", REPLICA_DB_CONFIG)
+            logger.info("Replica connection pool created successfully")
+        except Exception as e:
+            logger.error(f"Failed to create replica connection pool: {e}")
+
+def maintain_pools():
+    """Retry pool creation with exponential backoff until every pool exists"""
+    delay = POOL_RETRY_SECONDS
+    while True:
+        create_missing_pools()
+        if connection_pool is not None and (replica_pool is not None or not REPLICA_DB_CONFIG):
+            return
+        time.sleep(delay)
+        delay = min(delay * 2, POOL_RETRY_MAX_SECONDS)
+
+def ensure_pool_maintainer():
+    """Start the pool-building thread unless one is already running"""
+    with pool_lock:
+        maintainer = pool_state['maintainer']
+        if maintainer is None or not maintainer.is_alive():
+            maintainer = threading.Thread(target=maintain_pools, name='db-pool-maintainer', daemon=True)
+            pool_state['maintainer'] = maintainer
+            maintainer.start()
+
+def init_worker():
+    """Start pool creation and background threads once per process"""
+    with worker_lock:
+        if worker_state['pid'] == os.getpid():
+            return
+        worker_state['pid'] = os.getpid()
+    
+    if not storage.is_sqlite():
+        ensure_pool_maintainer()
+    if ARCHIVER_ENABLED:
+        archiver.start_background_archiver(lambda: get_db_connection(readonly=False))
+    if analytics_store:
+        analytics_store.start()
+    if export_pool:
+        export_pool.start()
+    if change_hub and CHANGE_FEED_REDIS_URL:
+        # Redis sockets, like pools, must not be shared across fork
+        change_feed.RedisBridge(change_hub, CHANGE_FEED_REDIS_URL).start()
+
+# Routing state shared by all request threads
+routing_lock = threading.Lock()
+recent_writes = {}
+replica_state = {'checked_at': 0.0, 'lag': None, 'healthy': True}
+pool_metrics = {
+    'primary': {'checkouts': 0, 'checkout_waits': 0, 'errors': 0},
+    'replica': {'checkouts': 0, 'errors': 0},
+    'routing': {'replica_reads': 0, 'sticky_reads': 0, 'lag_fallbacks': 0, 'error_fallbacks': 0}
+}
+
+def record_metric(section, name):
+    """Increment a connection routing counter"""
+    with routing_lock:
+        pool_metrics[section][name] += 1
+
+def note_user_write(user_id):
+    """Remember that a user just wrote, for read-your-writes stickiness"""
+    now = time.monotonic()
+    with routing_lock:
+        recent_writes[user_id] = now
+        if len(recent_writes) > 10000:
+            cutoff = now - READ_YOUR_WRITES_SECONDS
+            for key in [key for key, at in recent_writes.items() if at < cutoff]:
+                del recent_writes[key]
+
+def wrote_recently(user_id):
+    """Check whether a user is inside their read-your-writes window"""
+    with routing_lock:
+        written_at = recent_writes.get(user_id)
+    return written_at is not None and time.monotonic() - written_at < READ_YOUR_WRITES_SECONDS
+
+def replica_is_current():
+    """Check replica lag, at most once per REPLICA_LAG_CHECK_INTERVAL"""
+    now = time.monotonic()
+    with routing_lock:
+        if now - replica_state['checked_at'] < REPLICA_LAG_CHECK_INTERVAL:
+            return replica_state['healthy']
+        # Claim the check so concurrent requests reuse the previous result
+        replica_state['checked_at'] = now
+
+    lag = None
+    healthy = False
     try:
-        if connection_pool:
-            return connection_pool.get_connection()
+        connection = replica_pool.get_connection()
+        cursor = connection.cursor(dictionary=True)
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+        except mysql.connector.Error:
+            # MySQL before 8.0.22
+            cursor.execute("SHOW SLAVE STATUS")
+        status = cursor.fetchone()
+        cursor.close()
+        connection.close()
+
+        if status is None:
+            # Not a replication target (e.g. a standalone local copy)
+            lag, healthy = 0, True
         else:
-            return mysql.connector.connect(**DB_CONFIG)
+            lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+            healthy = lag is not None and lag <= MAX_REPLICA_LAG_SECONDS
     except Exception as e:
+        logger.warning(f"Replica lag check failed: {e}")
+
+    with routing_lock:
+        replica_state['lag'] = lag
+        replica_state['healthy'] = healthy
+    return healthy
+
+def use_replica(user_id):
+    """Decide whether a read for user_id can be served by the replica"""
+    if wrote_recently(user_id):
+        record_metric('routing', 'sticky_reads')
+        return False
+    if not replica_is_current():
+        record_metric('routing', 'lag_fallbacks')
+        return False
+    return True
+
+def get_db_connection(readonly=None, user_id=None, query_class=None):
+    """Get database connection, routing GET requests to the replica when safe
+
+    Worker threads have no request context, so they pass readonly and the
+    user_id whose read-your-writes window applies explicitly. The
+    connection's SELECTs are time-bounded by query_class, which defaults to
+    the request's endpoint class (see guardrails).
+    """
+    if not has_request_context() and readonly is None:
+        # Guessing would silently skip the replica and the caller's
+        # read-your-writes window
+        raise RuntimeError('get_db_connection() outside a request needs an explicit readonly')
+    if user_id is None and has_request_context():
+        user_id = g.get('current_user_id')
+    return guard_connection(checkout_connection(readonly, user_id), user_id, query_class)
+
+def guard_connection(connection, user_id, query_class=None):
+    """Wrap a connection so its SELECTs carry the class's time budget"""
+    if query_class is None:
+        query_class = guardrails.current_query_class() or (endpoint_class() if has_request_context() else 'background')
+    endpoint = request.endpoint if has_request_context() else threading.current_thread().name
+    return guardrails.GuardedConnection(connection, query_class, endpoint, user_id)
+
+def checkout_connection(readonly, user_id):
+    """A raw connection from the replica, primary or SQLite backend"""
+    # Background threads start on first use under either backend
+    if worker_state['pid'] != os.getpid():
+        init_worker()
+    if storage.is_sqlite():
+        return storage.connect_sqlite()
+    if readonly is None:
+        readonly = has_request_context() and request.method in ('GET', 'HEAD')
+
+    if readonly and replica_pool and use_replica(user_id):
+        try:
+            connection = replica_pool.get_connection()
+            record_metric('replica', 'checkouts')
+            record_metric('routing', 'replica_reads')
+            return connection
+        except Exception as e:
+            logger.warning(f"Replica connection error, using primary: {e}")
+            record_metric('replica', 'errors')
+            record_metric('routing', 'error_fallbacks')
+
+    db_breaker.before_call()
+    pool = connection_pool
+    if pool is None:
+        ensure_pool_maintainer()
+        pools_ready.wait(POOL_STARTUP_WAIT_SECONDS)
+        pool = connection_pool
+    if pool is None:
+        record_metric('primary', 'errors')
+        raise CircuitOpenError(db_breaker.retry_after())
+
+    try:
+        connection = wait_for_connection(pool)
+        db_breaker.record_success()
+        record_metric('primary', 'checkouts')
+        return connection
+    except pooling.PoolError as e:
+        # An exhausted pool is load, not an outage
+        db_breaker.record_success()
+        record_metric('primary', 'errors')
+        logger.error(f"Database connection error: {e}")
+        raise
+    except Exception as e:
+        db_breaker.record_failure()
+        record_metric('primary', 'errors')
         logger.error(f"Database connection error: {e}")
         raise
 
+def wait_for_connection(pool):
+    """pool.get_connection(), retrying with backoff while the pool is
+    exhausted, for up to POOL_CHECKOUT_WAIT_SECONDS
+
+    mysql.connector raises PoolError at once when every connection is out.
+    """
+    deadline = time.monotonic() + POOL_CHECKOUT_WAIT_SECONDS
+    delay = 0.005
+    while True:
+        try:
+            return pool.get_connection()
+        except pooling.PoolError:
+            if time.monotonic() + delay > deadline:
+                raise
+            if delay == 0.005:
+                record_metric('primary', 'checkout_waits')
+            time.sleep(delay)
+            delay = min(delay * 2, 0.1)
+
+@app.after_request
+def track_user_writes(response):
+    """Start the read-your-writes window after a successful mutation"""
+    if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400 and 'current_user_id' in g:
+        note_user_write(g.current_user_id)
+    return response
+
+# Admission control: per-client token buckets per endpoint class, and a
+# global in-flight limit sized to the pool that sheds load past a latency
+# budget. A slot stands for one connection: the dashboard takes one per
+# section it runs in parallel
+ADMISSION_CONTROL_ENABLED = os.getenv('ADMISSION_CONTROL_ENABLED', 'True').lower() == 'true'
+rate_limiter = RateLimiter(parse_rate_limits(os.getenv('RATE_LIMITS', DEFAULT_RATE_LIMITS)))
+admission_gate = ConcurrencyGate(
+    limit=int(os.getenv('MAX_CONCURRENT_REQUESTS', DB_POOL_SIZE)),
+    latency_budget=float(os.getenv('ADMISSION_LATENCY_BUDGET_MS', 500)) / 1000
+)
+
+ADMISSION_EXEMPT_ENDPOINTS = {'health_check', 'liveness_check', 'readiness_check', 'get_metrics', 'static', None}
+# Long-lived streams are rate limited but do not hold a concurrency slot
+STREAMING_ENDPOINTS = {'stream_changes'}
+EXPORT_ENDPOINTS = {'export_csv', 'create_export'}
+ANALYTICS_ENDPOINTS = {
+    'get_summary', 'get_category_spending', 'get_monthly_trend', 'get_timeseries',
+    'get_forecast', 'get_dashboard', 'get_anomalies', 'get_balance_history'
+}
+
+def endpoint_class():
+    """Classify the current request for rate limiting and query time budgets"""
+    if request.endpoint in EXPORT_ENDPOINTS:
+        return 'export'
+    if request.method not in ('GET', 'HEAD'):
+        return 'write'
+    if request.endpoint in ANALYTICS_ENDPOINTS:
+        return 'analytics'
+    return 'read'
+
+def client_identity():
+    """Rate-limit key: the token's user when one is valid, else the remote address"""
+    token = request.headers.get('Authorization', '')
+    if token.startswith('Bearer '):
+        try:
+            data = jwt.decode(token.split(' ')[1], app.config['SECRET_KEY'], algorithms=['HS256'])
+            return f"user:{data['user_id']}"
+        except (jwt.InvalidTokenError, KeyError):
+            pass
+    return f"ip:{request.remote_addr}"
+
+def reject_request(status, message, retry_after):
+    response = jsonify({'message': message, 'retry_after': float(retry_after_header(retry_after))})
+    response.status_code = status
+    response.headers['Retry-After'] = retry_after_header(retry_after)
+    return response
+
+@app.before_request
+def admit_request():
+    """Apply the rate limit, then wait for a slot in the concurrency gate"""
+    if not ADMISSION_CONTROL_ENABLED or request.method == 'OPTIONS' \
+            or request.endpoint in ADMISSION_EXEMPT_ENDPOINTS:
+        return None
+    
+    kind = endpoint_class()
+    # Fail fast while the database is down, unless a replica can serve the read
+    if db_breaker.is_open and (kind == 'write' or replica_pool is None):
+        return reject_request(503, 'Database unavailable, please retry', db_breaker.retry_after())
+    
+    retry_after = rate_limiter.acquire(client_identity(), kind)
+    if retry_after:
+        return reject_request(429, 'Rate limit exceeded', retry_after)
+    if request.endpoint in STREAMING_ENDPOINTS:
+        return None
+    
+    slots = admission_slots()
+    admitted, retry_after = admission_gate.enter(kind, slots)
+    if not admitted:
+        return reject_request(503, 'Server busy, please retry', retry_after)
+    g.admitted_at = time.monotonic()
+    g.admission_slots = slots
+    return None
+
+def admission_slots():
+    """Connections the current request can hold at once"""
+    if request.endpoint == 'get_dashboard':
+        return min(DASHBOARD_WORKERS, admission_gate.limit)
+    return 1
+
+@app.teardown_request
+def release_admission(error):
+    """Free the request's concurrency slot"""
+    admitted_at = g.pop('admitted_at', None)
+    if admitted_at is not None:
+        admission_gate.leave(time.monotonic() - admitted_at, g.pop('admission_slots', 1))
+
+# Derived in-process state (caches, detectors) registers here to be told
+# about every committed transaction change: listener(user_id, old, new),
+# where old is None for inserts and new is None for deletes
+transaction_listeners = []
+
+# Server-sent change events for dashboards (GET /api/changes)
+CHANGE_FEED_ENABLED = os.getenv('CHANGE_FEED_ENABLED', 'True').lower() == 'true'
+CHANGE_FEED_REDIS_URL = os.getenv('CHANGE_FEED_REDIS_URL')
+CHANGE_FEED_HEARTBEAT_SECONDS = float(os.getenv('CHANGE_FEED_HEARTBEAT_SECONDS', 15))
+CHANGE_FEED_MAX_STREAM_SECONDS = float(os.getenv('CHANGE_FEED_MAX_STREAM_SECONDS', 300))
+change_hub = change_feed.ChangeHub(
+    max_subscribers=int(os.getenv('CHANGE_FEED_MAX_STREAMS', 100))
+) if CHANGE_FEED_ENABLED else None
+
+def notify_transaction_change(user_id, old, new, balance=None):
+    """Fan a transaction change out to the registered listeners and the change feed"""
+    for listener in transaction_listeners:
+        try:
+            listener(user_id, old, new)
+        except Exception as e:
+            logger.error(f"Transaction listener {listener.__name__} error: {e}")
+    if change_hub:
+        try:
+            change_hub.publish(user_id, change_feed.describe_change(old, new, balance))
+        except Exception as e:
+            logger.error(f"Change feed publish error: {e}")
+
+def notify_bulk_change(user_id, kind, changes, balance=None):
+    """Tell listeners about each changed row, and the change feed once"""
+    for listener in transaction_listeners:
+        for old, new in changes:
+            try:
+                listener(user_id, old, new)
+            except Exception as e:
+                logger.error(f"Transaction listener {listener.__name__} error: {e}")
+    if change_hub and changes:
+        try:
+            change_hub.publish(user_id, change_feed.describe_bulk_change(kind, changes, balance))
+        except Exception as e:
+            logger.error(f"Change feed publish error: {e}")
+
+def current_balance(connection, user_id):
+    """The user's balance over active transactions, for change events"""
+    if not change_hub:
+        return None
+    cursor = connection.cursor()
+    cursor.execute("""
+        SELECT COALESCE(SUM(credited - debited), 0)
+        FROM transactions
+        WHERE user_id <=> %s AND status = 'active'
+    """, (user_id,))
+    balance = cursor.fetchone()[0]
+    cursor.close()
+    return balance
+
+def encode_cursor(values):
+    """Encode keyset pagination values as an opaque cursor string"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor, or None if it is malformed"""
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError):
+        return None
+
+def range_too_large(error):
+    """400 for a synchronous range over the cap, pointing at the background export"""
+    return jsonify({
+        'message': str(error),
+        'max_days': error.max_days,
+        'alternatives': {
+            'export': 'POST /api/exports'
+        }
+    }), 400
+
+def query_timed_out():
+    return jsonify({'message': 'Query took too long; narrow the filters or date range'}), 503
+
+def build_transaction_filters(args, user_id, alias='t'):
+    """Build the shared user/category/date/tag WHERE fragment for transaction queries"""
+    query = f" AND {alias}.user_id <=> %s"
+    params = [user_id]
+
+    category_id = args.get('category_id')
+    if category_id and args.get('include_subcategories', '').lower() in ('1', 'true'):
+        query += f" AND {alias}.category_id IN (SELECT descendant_id FROM category_closure WHERE ancestor_id = %s)"
+        params.append(category_id)
+    elif category_id:
+        query += f" AND {alias}.category_id = %s"
+        params.append(category_id)
+
+    from_date = args.get('from_date')
+    if from_date:
+        query += f" AND {alias}.transaction_date >= %s"
+        params.append(from_date)
+
+    to_date = args.get('to_date')
+    if to_date:
+        query += f" AND {alias}.transaction_date <= %s"
+        params.append(to_date)
+
+    tags = args.get('tags')
+    if tags:
+        match = 'all' if args.get('match') == 'all' else 'any'
+        tag_query, tag_params = build_tag_filter(tags, match, column=f'{alias}.id', user_id=user_id)
+        query += tag_query
+        params.extend(tag_params)
+
+    return query, params
+
 def token_required(f):
     """Decorator for JWT token authentication"""
     @wraps(f)
@@ -80,9 +574,22 @@ def token_required(f):
         except jwt.InvalidTokenError:
             return jsonify({'message': 'Invalid token'}), 401
         
+        g.current_user_id = current_user_id
         return f(current_user_id, *args, **kwargs)
     return decorated
 
+def user_scoped(f):
+    """Decorator that resolves the user whose data a route operates on"""
+    authenticated = token_required(f)
+
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if MULTI_USER_ENABLED:
+            return authenticated(*args, **kwargs)
+        g.current_user_id = None
+        return f(None, *args, **kwargs)
+    return decorated
+
 # Authentication Routes
 @app.route('/api/auth/register', methods=['POST'])
 def register():
@@ -108,8 +615,8 @@ def register():
         hashed_password = generate_password_hash(password)
         cursor.execute("""
             INSERT INTO users (email, password_hash, name, created_at)
-            VALUES (%s, %s, %s, %s)
-        """, (email, hashed_password, name, datetime.utcnow()))
+            VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
+        """, (email, hashed_password, name))
         
         user_id = cursor.lastrowid
         
@@ -177,18 +684,19 @@ def login():
 
 # Categories Routes
 @app.route('/api/categories', methods=['GET'])
-def get_categories():
-    """Get all categories"""
+@user_scoped
+def get_categories(current_user_id):
+    """Get system categories and the user's own categories"""
     try:
         connection = get_db_connection()
         cursor = connection.cursor(dictionary=True)
         
         cursor.execute("""
-            SELECT id, name, color, icon, is_income, created_at
+            SELECT id, name, color, icon, is_income, parent_id, sort_order, created_at
             FROM categories 
-            WHERE status = 'active'
+            WHERE status = 'active' AND (user_id IS NULL OR user_id = %s)
             ORDER BY name
-        """)
+        """, (current_user_id,))
         
         categories = cursor.fetchall()
         cursor.close()
@@ -201,7 +709,8 @@ def get_categories():
         return jsonify({'message': 'Failed to fetch categories'}), 500
 
 @app.route('/api/categories', methods=['POST'])
-def add_category():
+@user_scoped
+def add_category(current_user_id):
     """Add a new category"""
     try:
         data = request.get_json()
@@ -209,22 +718,36 @@ def add_category():
         color = data.get('color', '#3b82f6')
         icon = data.get('icon', '📝')
         is_income = data.get('is_income', False)
+        parent_id = data.get('parent_id')
         
         if not name:
             return jsonify({'message': 'Category name is required'}), 400
         
         connection = get_db_connection()
         cursor = connection.cursor()
+        connection.start_transaction()
+        
+        if parent_id is not None and not visible_category(cursor, parent_id, current_user_id):
+            connection.rollback()
+            cursor.close()
+            connection.close()
+            return jsonify({'message': 'Parent category not found'}), 400
         
         cursor.execute("""
-            INSERT INTO categories (name, color, icon, is_income, created_at)
-            VALUES (%s, %s, %s, %s, %s)
-        """, (name, color, icon, is_income, datetime.utcnow()))
+            INSERT INTO categories (user_id, name, color, icon, is_income, parent_id, sort_order, created_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+        """, (current_user_id, name, color, icon, is_income, parent_id, int(data.get('sort_order', 0))))
         
         category_id = cursor.lastrowid
+        category_tree.add_node(cursor, category_id, parent_id)
+        
+        connection.commit()
         cursor.close()
         connection.close()
         
+        # The cached categorizer model only learns categories it knows of
+        categorizer.forget(current_user_id)
+        
         return jsonify({
             'message': 'Category added successfully',
             'id': category_id
@@ -234,8 +757,92 @@ def add_category():
         logger.error(f"Add category error: {e}")
         return jsonify({'message': 'Failed to add category'}), 500
 
+def visible_category(cursor, category_id, user_id):
+    """Whether an active category is a system category or the user's own"""
+    cursor.execute("""
+        SELECT 1 FROM categories
+        WHERE id = %s AND status = 'active' AND (user_id IS NULL OR user_id <=> %s)
+    """, (category_id, user_id))
+    return cursor.fetchone() is not None
+
+def invisible_categories(cursor, category_ids, user_id):
+    """The ids among category_ids that visible_category would reject"""
+    category_ids = set(category_ids)
+    if not category_ids:
+        return set()
+    placeholders = ', '.join(['%s'] * len(category_ids))
+    cursor.execute(f"""
+        SELECT id FROM categories
+        WHERE id IN ({placeholders}) AND status = 'active' AND (user_id IS NULL OR user_id <=> %s)
+    """, [*category_ids, user_id])
+    return category_ids - {row['id'] if isinstance(row, dict) else row[0] for row in cursor.fetchall()}
+
+CATEGORY_UPDATABLE_FIELDS = ('name', 'color', 'icon', 'sort_order')
+
+@app.route('/api/categories/<int:category_id>', methods=['PUT'])
+@user_scoped
+def update_category(current_user_id, category_id):
+    """Rename or restyle a category, or move it under another parent"""
+    connection = None
+    try:
+        data = request.get_json() or {}
+        
+        connection = get_db_connection()
+        cursor = connection.cursor(dictionary=True)
+        connection.start_transaction()
+        
+        cursor.execute("""
+            SELECT id, parent_id FROM categories
+            WHERE id = %s AND user_id <=> %s AND status = 'active'
+            FOR UPDATE
+        """, (category_id, current_user_id))
+        existing = cursor.fetchone()
+        
+        if not existing:
+            connection.rollback()
+            cursor.close()
+            return jsonify({'message': 'Category not found'}), 404
+        
+        changes = {field: data[field] for field in CATEGORY_UPDATABLE_FIELDS if field in data}
+        
+        if 'parent_id' in data and data['parent_id'] != existing['parent_id']:
+            parent_id = data['parent_id']
+            if parent_id is not None and not visible_category(cursor, parent_id, current_user_id):
+                connection.rollback()
+                cursor.close()
+                return jsonify({'message': 'Parent category not found'}), 400
+            # Raises ValueError when the parent is inside the moved subtree
+            category_tree.move_node(cursor, category_id, parent_id)
+            changes['parent_id'] = parent_id
+        
+        if changes:
+            assignments = ', '.join(f"{field} = %s" for field in changes)
+            cursor.execute(f"""
+                UPDATE categories SET {assignments}, updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s
+            """, [*changes.values(), category_id])
+        
+        connection.commit()
+        cursor.close()
+        
+        return jsonify({'message': 'Category updated successfully'}), 200
+        
+    except ValueError as e:
+        if connection:
+            connection.rollback()
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Update category error: {e}")
+        if connection:
+            connection.rollback()
+        return jsonify({'message': 'Failed to update category'}), 500
+    finally:
+        if connection:
+            connection.close()
+
 @app.route('/api/categories/<int:category_id>', methods=['DELETE'])
-def delete_category(category_id):
+@user_scoped
+def delete_category(current_user_id, category_id):
     """Delete a category (soft delete)"""
     try:
         connection = get_db_connection()
@@ -251,84 +858,228 @@ def delete_category(category_id):
         # Soft delete the category
         cursor.execute("""
             UPDATE categories 
-            SET status = 'inactive', updated_at = %s
-            WHERE id = %s
-        """, (datetime.utcnow(), category_id))
+            SET status = 'inactive', updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s AND user_id <=> %s
+        """, (category_id, current_user_id))
+        deleted = cursor.rowcount
         
         cursor.close()
         connection.close()
         
+        if not deleted:
+            return jsonify({'message': 'Category not found'}), 404
+        
+        categorizer.forget(current_user_id)
+        
         return jsonify({'message': 'Category deleted successfully'}), 200
         
     except Exception as e:
         logger.error(f"Delete category error: {e}")
         return jsonify({'message': 'Failed to delete category'}), 500
 
-# Transactions Routes
-@app.route('/api/transactions', methods=['GET'])
-def get_transactions():
-    """Get transactions with optional filtering"""
+@app.route('/api/categories/suggest', methods=['GET'])
+@user_scoped
+def suggest_category(current_user_id):
+    """Ranked category suggestions for a transaction being entered"""
     try:
-        # Get query parameters
-        category_id = request.args.get('category_id')
-        from_date = request.args.get('from_date')
-        to_date = request.args.get('to_date')
-        limit = int(request.args.get('limit', 100))
-        offset = int(request.args.get('offset', 0))
-        
-        connection = get_db_connection()
-        cursor = connection.cursor(dictionary=True)
-        
-        # Build query
-        query = """
-            SELECT t.*, c.name as category_name, c.color as category_color, c.icon as category_icon
-            FROM transactions t
-            LEFT JOIN categories c ON t.category_id = c.id
-            WHERE t.status = 'active'
-        """
-        params = []
-        
-        if category_id:
-            query += " AND t.category_id = %s"
-            params.append(category_id)
+        description = request.args.get('description', '')
+        if not description:
+            return jsonify({'message': 'description is required'}), 400
+        limit = guardrails.page_limit(request.args, 'suggest_category')
         
-        if from_date:
-            query += " AND t.transaction_date >= %s"
-            params.append(from_date)
+        connection = get_db_connection(readonly=True, user_id=current_user_id)
+        cursor = connection.cursor()
+        suggestions = categorizer.suggest(
+            cursor, current_user_id, description,
+            request.args.get('credited', 0), request.args.get('debited', 0), limit
+        )
+        cursor.close()
+        connection.close()
         
-        if to_date:
-            query += " AND t.transaction_date <= %s"
-            params.append(to_date)
+        return jsonify({'suggestions': suggestions}), 200
         
-        query += " ORDER BY t.transaction_date DESC, t.created_at DESC LIMIT %s OFFSET %s"
-        params.extend([limit, offset])
+    except ValueError:
+        return jsonify({'message': 'credited, debited and limit must be numbers'}), 400
+    except Exception as e:
+        logger.error(f"Suggest category error: {e}")
+        return jsonify({'message': 'Failed to suggest categories'}), 500
+
+@app.route('/api/categories/suggest', methods=['POST'])
+@user_scoped
+def suggest_categories(current_user_id):
+    """Best category for each of a batch of transactions, e.g. to preview an import"""
+    try:
+        data = request.get_json() or {}
+        items = data.get('transactions')
+        if not isinstance(items, list) or not items:
+            return jsonify({'message': 'transactions must be a non-empty list'}), 400
+        if len(items) > BULK_MAX_ROWS:
+            return jsonify({'message': f'At most {BULK_MAX_ROWS} transactions per request'}), 400
+        rows = [{
+            'description': str(item.get('description') or ''),
+            'credited': float(item.get('credited') or 0),
+            'debited': float(item.get('debited') or 0)
+        } for item in items]
+        
+        connection = get_db_connection(readonly=True, user_id=current_user_id)
+        cursor = connection.cursor()
+        predictions = categorizer.categorize(cursor, current_user_id, rows)
+        cursor.close()
+        connection.close()
         
-        cursor.execute(query, params)
-        transactions = cursor.fetchall()
+        return jsonify({
+            'min_confidence': categorizer.CATEGORIZER_MIN_CONFIDENCE,
+            'suggestions': predictions
+        }), 200
         
-        # Convert decimal to float for JSON serialization
-        for transaction in transactions:
-            transaction['credited'] = float(transaction['credited'])
-            transaction['debited'] = float(transaction['debited'])
-            transaction['running_balance'] = float(transaction['running_balance'])
+    except (TypeError, ValueError):
+        return jsonify({'message': 'credited and debited must be numbers'}), 400
+    except Exception as e:
+        logger.error(f"Suggest categories error: {e}")
+        return jsonify({'message': 'Failed to suggest categories'}), 500
+
+# Transactions Routes
+def fetch_transactions(user_id, args, limit, offset=0):
+    """Query one page of the user's transactions"""
+    connection = get_db_connection(readonly=True, user_id=user_id)
+    cursor = connection.cursor()
+    
+    # Build query
+    query = """
+        SELECT t.*, c.name as category_name, c.color as category_color, c.icon as category_icon
+        FROM transactions t
+        LEFT JOIN categories c ON t.category_id = c.id
+        WHERE t.status = 'active'
+    """
+    filter_query, params = build_transaction_filters(args, user_id)
+    query += filter_query
+    
+    query += " ORDER BY t.transaction_date DESC, t.created_at DESC LIMIT %s OFFSET %s"
+    params.extend([limit, offset])
+    
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+    columns = cursor.column_names
+    
+    cursor.close()
+    connection.close()
+    
+    return shape_rows(columns, rows, args.get('format'))
+
+@app.route('/api/transactions', methods=['GET'])
+@user_scoped
+def get_transactions(current_user_id):
+    """Get transactions with optional filtering"""
+    try:
+        # Get query parameters
+        limit = guardrails.page_limit(request.args, 'get_transactions')
+        offset = max(0, int(request.args.get('offset', 0)))
         
-        cursor.close()
-        connection.close()
+        transactions = fetch_transactions(current_user_id, request.args, limit, offset)
         
         return jsonify(transactions), 200
         
+    except guardrails.QueryTimeout:
+        return query_timed_out()
     except Exception as e:
         logger.error(f"Get transactions error: {e}")
         return jsonify({'message': 'Failed to fetch transactions'}), 500
 
+SEARCH_TERM_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+def build_search_expression(query):
+    """Turn free text into a full-text expression requiring every term as a prefix"""
+    terms = SEARCH_TERM_PATTERN.findall(query.lower())
+    if storage.is_sqlite():
+        # FTS5 ANDs adjacent terms
+        return ' '.join(f'"{term}"*' for term in terms)
+    return ' '.join(f'+{term}*' for term in terms)
+
+@app.route('/api/transactions/search', methods=['GET'])
+@user_scoped
+def search_transactions(current_user_id):
+    """Full-text search over description, notes and tags"""
+    try:
+        expression = build_search_expression(request.args.get('q', ''))
+        if not expression:
+            return jsonify({'message': 'Search query is required'}), 400
+
+        limit = guardrails.page_limit(request.args, 'search_transactions')
+        cursor_token = request.args.get('cursor')
+
+        after = None
+        if cursor_token:
+            after = decode_cursor(cursor_token)
+            if not isinstance(after, list) or len(after) != 2:
+                return jsonify({'message': 'Invalid cursor'}), 400
+
+        connection = get_db_connection()
+        cursor = connection.cursor()
+
+        if storage.is_sqlite():
+            source = "transactions t JOIN transactions_fts ON transactions_fts.rowid = t.id"
+            relevance = "-bm25(transactions_fts)"
+            relevance_params = []
+            match = "transactions_fts MATCH %s"
+        else:
+            source = "transactions t"
+            relevance = "MATCH(t.description, t.notes, t.tags) AGAINST (%s IN BOOLEAN MODE)"
+            relevance_params = [expression]
+            match = relevance
+        
+        query = f"""
+            SELECT t.*, c.name as category_name, c.color as category_color, c.icon as category_icon,
+                {relevance} as relevance
+            FROM {source}
+            LEFT JOIN categories c ON t.category_id = c.id
+            WHERE {match} AND t.status = 'active'
+        """
+        params = [*relevance_params, expression]
+
+        filter_query, filter_params = build_transaction_filters(request.args, current_user_id)
+        query += filter_query
+        params.extend(filter_params)
+
+        # Keyset pagination on (relevance, id) so deep pages stay cheap
+        if after:
+            query += f" AND ({relevance} < %s OR ({relevance} = %s AND t.id < %s))"
+            params.extend([*relevance_params, after[0], *relevance_params, after[0], after[1]])
+
+        query += " ORDER BY relevance DESC, t.id DESC LIMIT %s"
+        params.append(limit + 1)
+
+        cursor.execute(query, params)
+        transactions = records(cursor.column_names, cursor.fetchall())
+
+        next_cursor = None
+        if len(transactions) > limit:
+            transactions = transactions[:limit]
+            last = transactions[-1]
+            next_cursor = encode_cursor([float(last['relevance']), last['id']])
+
+        cursor.close()
+        connection.close()
+
+        return jsonify({'results': transactions, 'next_cursor': next_cursor}), 200
+
+    except ValueError:
+        return jsonify({'message': 'Invalid search parameters'}), 400
+    except guardrails.QueryTimeout:
+        return query_timed_out()
+    except Exception as e:
+        logger.error(f"Search transactions error: {e}")
+        return jsonify({'message': 'Failed to search transactions'}), 500
+
 @app.route('/api/transactions', methods=['POST'])
-def add_transaction():
+@user_scoped
+def add_transaction(current_user_id):
     """Add a new transaction"""
+    connection = None
     try:
         data = request.get_json()
         
-        # Validate required fields
-        required_fields = ['transaction_date', 'category_id', 'description']
+        # Validate required fields; a missing category is suggested below
+        required_fields = ['transaction_date', 'description']
         for field in required_fields:
             if not data.get(field):
                 return jsonify({'message': f'{field} is required'}), 400
@@ -342,66 +1093,156 @@ def add_transaction():
         
         connection = get_db_connection()
         cursor = connection.cursor()
-        
-        # Calculate running balance
-        cursor.execute("SELECT COALESCE(SUM(credited - debited), 0) as balance FROM transactions WHERE status = 'active'")
-        current_balance = float(cursor.fetchone()[0])
-        new_balance = current_balance + credited - debited
-        
-        # Insert transaction
+        # The row, its balances and every derived index commit together
+        connection.start_transaction()
+        
+        # Without a category, take the categorizer's if it is confident enough
+        category_id = data.get('category_id')
+        suggestion = None
+        if not category_id:
+            suggestion = categorizer.categorize(cursor, current_user_id, [{
+                'description': data['description'], 'credited': credited, 'debited': debited
+            }])[0]
+            if not suggestion or suggestion['confidence'] < categorizer.CATEGORIZER_MIN_CONFIDENCE:
+                suggestions = categorizer.suggest(cursor, current_user_id, data['description'], credited, debited)
+                connection.rollback()
+                cursor.close()
+                return jsonify({'message': 'category_id is required', 'suggestions': suggestions}), 400
+            category_id = suggestion['category_id']
+        elif not visible_category(cursor, category_id, current_user_id):
+            connection.rollback()
+            cursor.close()
+            return jsonify({'message': 'Category not found'}), 400
+        
+        # Insert transaction; its running balance is set by the repair below
         cursor.execute("""
             INSERT INTO transactions 
-            (transaction_date, category_id, description, credited, debited, running_balance, tags, notes, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            (user_id, transaction_date, category_id, description, credited, debited, running_balance, tags, notes, created_at)
+            VALUES (%s, %s, %s, %s, %s, %s, 0, %s, %s, CURRENT_TIMESTAMP)
         """, (
+            current_user_id,
             data['transaction_date'],
-            data['category_id'],
+            category_id,
             data['description'],
             credited,
             debited,
-            new_balance,
             data.get('tags', ''),
-            data.get('notes', ''),
-            datetime.utcnow()
+            data.get('notes', '')
         ))
         
         transaction_id = cursor.lastrowid
         
-        # Add audit log
-        cursor.execute("""
-            INSERT INTO audit_log (table_name, record_id, action, old_values, new_values, created_at)
-            VALUES ('transactions', %s, 'INSERT', '{}', %s, %s)
-        """, (transaction_id, str(data), datetime.utcnow()))
+        # A backdated row shifts every later balance, as in update and delete
+        recalculate_running_balances(cursor, current_user_id, data['transaction_date'])
+        cursor.execute("SELECT running_balance FROM transactions WHERE id = %s", (transaction_id,))
+        new_balance = float(cursor.fetchone()[0])
+        
+        # Maintain normalized tags
+        attach_tags(cursor, [(transaction_id, data.get('tags', ''))], current_user_id)
+        
+        # Look up near-duplicates through the blocking keys, then index this row
+        inserted = {
+            'id': transaction_id,
+            'transaction_date': data['transaction_date'],
+            'description': data['description'],
+            'credited': credited,
+            'debited': debited
+        }
+        duplicate_matches = duplicates.find_duplicates(cursor, current_user_id, [inserted])[0]
+        duplicates.index_transactions(cursor, current_user_id, [inserted])
+        categorizer.learn(cursor, current_user_id, added=[dict(inserted, category_id=category_id)])
+        
+        # Score against the category's streaming statistics, then fold it in
+        anomaly_flag = anomaly.observe_insert(
+            cursor, current_user_id, transaction_id, category_id,
+            data['transaction_date'], credited, debited
+        )
         
+        # Add audit log: a snapshot to replay later diffs onto
+        audit.record(cursor, current_user_id, 'transactions', transaction_id, 'INSERT', new={
+            'transaction_date': data['transaction_date'],
+            'category_id': category_id,
+            'description': data['description'],
+            'credited': credited,
+            'debited': debited,
+            'tags': data.get('tags', ''),
+            'notes': data.get('notes', ''),
+            'status': 'active'
+        })
+        
+        connection.commit()
+        balance = current_balance(connection, current_user_id)
         cursor.close()
-        connection.close()
+        
+        notify_transaction_change(current_user_id, None, {
+            'id': transaction_id,
+            'transaction_date': data['transaction_date'],
+            'category_id': category_id,
+            'credited': credited,
+            'debited': debited
+        }, balance)
         
         return jsonify({
             'message': 'Transaction added successfully',
             'id': transaction_id,
-            'running_balance': new_balance
+            'running_balance': new_balance,
+            'category_id': category_id,
+            'category_suggestion': suggestion,
+            'anomaly': anomaly_flag,
+            'duplicates': duplicate_matches
         }), 201
         
     except Exception as e:
         logger.error(f"Add transaction error: {e}")
+        if connection:
+            connection.rollback()
         return jsonify({'message': 'Failed to add transaction'}), 500
+    finally:
+        if connection:
+            connection.close()
 
 @app.route('/api/transactions/<int:transaction_id>', methods=['PUT'])
-def update_transaction(transaction_id):
+@user_scoped
+def update_transaction(current_user_id, transaction_id):
     """Update a transaction"""
+    connection = None
     try:
         data = request.get_json()
         
         connection = get_db_connection()
         cursor = connection.cursor(dictionary=True)
+        connection.start_transaction()
         
         # Get existing transaction
-        cursor.execute("SELECT * FROM transactions WHERE id = %s AND status = 'active'", (transaction_id,))
+        cursor.execute("""
+            SELECT * FROM transactions
+            WHERE id = %s AND user_id <=> %s AND status = 'active'
+            FOR UPDATE
+        """, (transaction_id, current_user_id))
         existing = cursor.fetchone()
         
         if not existing:
+            connection.rollback()
+            cursor.close()
             return jsonify({'message': 'Transaction not found'}), 404
         
+        if 'category_id' in data and data['category_id'] != existing['category_id'] and \
+                not visible_category(cursor, data['category_id'], current_user_id):
+            connection.rollback()
+            cursor.close()
+            return jsonify({'message': 'Category not found'}), 400
+        
+        updated = {
+            'id': transaction_id,
+            'transaction_date': data.get('transaction_date', existing['transaction_date']),
+            'category_id': data.get('category_id', existing['category_id']),
+            'description': data.get('description', existing['description']),
+            'credited': float(data.get('credited', existing['credited'])),
+            'debited': float(data.get('debited', existing['debited'])),
+            'tags': data.get('tags', existing['tags']),
+            'notes': data.get('notes', existing['notes'])
+        }
+        
         # Update transaction
         cursor.execute("""
             UPDATE transactions SET
@@ -412,243 +1253,1286 @@ def update_transaction(transaction_id):
                 debited = %s,
                 tags = %s,
                 notes = %s,
-                updated_at = %s
+                updated_at = CURRENT_TIMESTAMP
             WHERE id = %s
         """, (
-            data.get('transaction_date', existing['transaction_date']),
-            data.get('category_id', existing['category_id']),
-            data.get('description', existing['description']),
-            float(data.get('credited', existing['credited'])),
-            float(data.get('debited', existing['debited'])),
-            data.get('tags', existing['tags']),
-            data.get('notes', existing['notes']),
-            datetime.utcnow(),
+            updated['transaction_date'],
+            updated['category_id'],
+            updated['description'],
+            updated['credited'],
+            updated['debited'],
+            updated['tags'],
+            updated['notes'],
             transaction_id
         ))
         
-        # Recalculate running balances for all transactions
-        recalculate_running_balances(cursor)
+        # Maintain normalized tags
+        if 'tags' in data:
+            sync_transaction_tags(cursor, transaction_id, existing['tags'], data['tags'], current_user_id)
         
-        # Add audit log
-        cursor.execute("""
-            INSERT INTO audit_log (table_name, record_id, action, old_values, new_values, created_at)
-            VALUES ('transactions', %s, 'UPDATE', %s, %s, %s)
-        """, (transaction_id, str(dict(existing)), str(data), datetime.utcnow()))
+        # Replace the old contribution to the anomaly statistics and re-score
+        anomaly_flag = anomaly.observe_update(cursor, current_user_id, transaction_id, existing, updated)
+        duplicates.reindex_transactions(cursor, current_user_id, [updated])
+        # A corrected category retrains the categorizer
+        categorizer.relearn(cursor, current_user_id, [(existing, updated)])
+        
+        # Recalculate this user's running balances from the earliest affected date
+        recalculate_running_balances(
+            cursor, current_user_id,
+            min(str(existing['transaction_date']), str(updated['transaction_date']))
+        )
+        
+        # Add audit log: only the fields that changed
+        audit.record(cursor, current_user_id, 'transactions', transaction_id, 'UPDATE', existing, updated)
         
+        connection.commit()
+        balance = current_balance(connection, current_user_id)
         cursor.close()
-        connection.close()
         
-        return jsonify({'message': 'Transaction updated successfully'}), 200
+        notify_transaction_change(current_user_id, existing, updated, balance)
+        
+        return jsonify({'message': 'Transaction updated successfully', 'anomaly': anomaly_flag}), 200
         
     except Exception as e:
         logger.error(f"Update transaction error: {e}")
+        if connection:
+            connection.rollback()
         return jsonify({'message': 'Failed to update transaction'}), 500
+    finally:
+        if connection:
+            connection.close()
 
 @app.route('/api/transactions/<int:transaction_id>', methods=['DELETE'])
-def delete_transaction(transaction_id):
+@user_scoped
+def delete_transaction(current_user_id, transaction_id):
     """Delete a transaction (soft delete)"""
+    connection = None
     try:
         connection = get_db_connection()
         cursor = connection.cursor(dictionary=True)
+        connection.start_transaction()
         
         # Get existing transaction
-        cursor.execute("SELECT * FROM transactions WHERE id = %s AND status = 'active'", (transaction_id,))
+        cursor.execute("""
+            SELECT * FROM transactions
+            WHERE id = %s AND user_id <=> %s AND status = 'active'
+            FOR UPDATE
+        """, (transaction_id, current_user_id))
         existing = cursor.fetchone()
         
         if not existing:
+            connection.rollback()
+            cursor.close()
             return jsonify({'message': 'Transaction not found'}), 404
         
         # Soft delete
         cursor.execute("""
             UPDATE transactions 
-            SET status = 'inactive', updated_at = %s
+            SET status = 'inactive', updated_at = CURRENT_TIMESTAMP
             WHERE id = %s
-        """, (datetime.utcnow(), transaction_id))
+        """, (transaction_id,))
+        
+        # Deleted transactions no longer count towards tag usage
+        sync_transaction_tags(cursor, transaction_id, existing['tags'], '', current_user_id)
+        anomaly.observe_delete(cursor, current_user_id, existing)
+        duplicates.remove_transactions(cursor, [transaction_id])
+        categorizer.learn(cursor, current_user_id, removed=[existing])
         
-        # Recalculate running balances
-        recalculate_running_balances(cursor)
+        # Recalculate this user's running balances from the deleted row's date
+        recalculate_running_balances(cursor, current_user_id, existing['transaction_date'])
         
         # Add audit log
-        cursor.execute("""
-            INSERT INTO audit_log (table_name, record_id, action, old_values, new_values, created_at)
-            VALUES ('transactions', %s, 'DELETE', %s, '{}', %s)
-        """, (transaction_id, str(dict(existing)), datetime.utcnow()))
+        audit.record(cursor, current_user_id, 'transactions', transaction_id, 'DELETE',
+                     existing, {'status': 'inactive'})
         
+        connection.commit()
+        balance = current_balance(connection, current_user_id)
         cursor.close()
-        connection.close()
+        
+        notify_transaction_change(current_user_id, existing, None, balance)
         
         return jsonify({'message': 'Transaction deleted successfully'}), 200
         
     except Exception as e:
         logger.error(f"Delete transaction error: {e}")
+        if connection:
+            connection.rollback()
         return jsonify({'message': 'Failed to delete transaction'}), 500
+    finally:
+        if connection:
+            connection.close()
 
-def recalculate_running_balances(cursor):
-    """Recalculate running balances for all active transactions"""
-    cursor.execute("""
-        SELECT id, credited, debited FROM transactions 
-        WHERE status = 'active'
-        ORDER BY transaction_date, created_at
-    """)
+# Bulk edits select rows by id list or by the list filters, lock them, and
+# apply one UPDATE, one balance repair and one batched audit insert
+BULK_MAX_ROWS = int(os.getenv('BULK_MAX_ROWS', 10000))
+BULK_ACTIONS = ('update', 'recategorize', 'delete')
+BULK_UPDATABLE_FIELDS = ('transaction_date', 'category_id', 'description', 'tags', 'notes')
+BULK_FILTER_KEYS = ('category_id', 'from_date', 'to_date', 'tags')
+
+def bulk_selection(data, user_id):
+    """WHERE fragment and params for a bulk request's target rows
+
+    Raises ValueError for a missing, empty or oversized selection.
+    """
+    if data.get('ids') is not None:
+        ids = sorted({int(transaction_id) for transaction_id in data['ids']})
+        if not ids:
+            raise ValueError('ids must not be empty')
+        if len(ids) > BULK_MAX_ROWS:
+            raise ValueError(f'At most {BULK_MAX_ROWS} ids per request')
+        placeholders = ', '.join(['%s'] * len(ids))
+        return f" AND t.user_id <=> %s AND t.id IN ({placeholders})", [user_id, *ids]
     
-    transactions = cursor.fetchall()
-    running_balance = 0
+    filters = data.get('filter') or {}
+    # Refuse an empty filter rather than edit every transaction
+    if not any(filters.get(key) for key in BULK_FILTER_KEYS):
+        raise ValueError(f'Provide ids or a filter on one of {", ".join(BULK_FILTER_KEYS)}')
+    return build_transaction_filters(filters, user_id)
+
+@app.route('/api/transactions/bulk/<action>', methods=['POST'])
+@user_scoped
+def bulk_transactions(current_user_id, action):
+    """Update, recategorize or soft-delete many transactions at once"""
+    if action not in BULK_ACTIONS:
+        return jsonify({'message': f'action must be one of {", ".join(BULK_ACTIONS)}'}), 404
     
-    for transaction in transactions:
-        running_balance += float(transaction['credited']) - float(transaction['debited'])
-        cursor.execute("""
-            UPDATE transactions 
-            SET running_balance = %s 
-            WHERE id = %s
-        """, (running_balance, transaction['id']))
+    connection = None
+    try:
+        data = request.get_json() or {}
+        
+        if action == 'delete':
+            changes = {}
+        elif action == 'recategorize':
+            if not data.get('category_id'):
+                return jsonify({'message': 'category_id is required'}), 400
+            changes = {'category_id': int(data['category_id'])}
+        else:
+            changes = {field: data['set'][field] for field in BULK_UPDATABLE_FIELDS
+                       if field in (data.get('set') or {})}
+            if not changes:
+                return jsonify({'message': f'set must contain one of {", ".join(BULK_UPDATABLE_FIELDS)}'}), 400
+            if 'transaction_date' in changes:
+                changes['transaction_date'] = parse_date(changes['transaction_date']).isoformat()
+        
+        selection, params = bulk_selection(data, current_user_id)
+        
+        connection = get_db_connection()
+        cursor = connection.cursor(dictionary=True)
+        connection.start_transaction()
+        
+        if 'category_id' in changes and not visible_category(cursor, changes['category_id'], current_user_id):
+            raise ValueError('Category not found')
+        
+        cursor.execute(f"""
+            SELECT t.id, t.transaction_date, t.category_id, t.description,
+                t.credited, t.debited, t.tags, t.notes, t.status
+            FROM transactions t
+            WHERE t.status = 'active'{selection}
+            ORDER BY t.id
+            LIMIT %s
+            FOR UPDATE
+        """, [*params, BULK_MAX_ROWS + 1])
+        rows = cursor.fetchall()
+        
+        if len(rows) > BULK_MAX_ROWS or not rows:
+            connection.rollback()
+            cursor.close()
+            if rows:
+                return jsonify({'message': f'Selection matches more than {BULK_MAX_ROWS} transactions'}), 400
+            return jsonify({'message': 'No matching transactions', 'affected': 0}), 200
+        
+        ids = [row['id'] for row in rows]
+        placeholders = ', '.join(['%s'] * len(ids))
+        
+        if action == 'delete':
+            cursor.execute(f"""
+                UPDATE transactions SET status = 'inactive', updated_at = CURRENT_TIMESTAMP
+                WHERE id IN ({placeholders})
+            """, ids)
+            pairs = [(row, None) for row in rows]
+        else:
+            assignments = ', '.join(f"{field} = %s" for field in changes)
+            cursor.execute(f"""
+                UPDATE transactions SET {assignments}, updated_at = CURRENT_TIMESTAMP
+                WHERE id IN ({placeholders})
+            """, [*changes.values(), *ids])
+            pairs = [(row, dict(row, **changes)) for row in rows]
+        
+        # Normalized tags: drop the old links and attach the new ones in batches
+        if action == 'delete' or 'tags' in changes:
+            detach_tags(cursor, [(row['id'], row['tags']) for row in rows], current_user_id)
+        if 'tags' in changes:
+            attach_tags(cursor, [(transaction_id, changes['tags']) for transaction_id in ids], current_user_id)
+        
+        # Anomaly statistics of every category touched, recomputed in one pass
+        if action == 'delete' or 'category_id' in changes or 'transaction_date' in changes:
+            touched = {row['category_id'] for row in rows} | ({changes['category_id']} if 'category_id' in changes else set())
+            anomaly.rebuild_categories(cursor, current_user_id, touched)
+        # Duplicate blocking keys follow the date and description
+        if action == 'delete':
+            duplicates.remove_transactions(cursor, ids)
+        elif 'transaction_date' in changes or 'description' in changes:
+            duplicates.reindex_transactions(cursor, current_user_id, [new for _, new in pairs])
+        # Recategorizing is the categorizer's main source of corrections
+        if action == 'delete':
+            categorizer.learn(cursor, current_user_id, removed=rows)
+        elif 'category_id' in changes or 'description' in changes:
+            categorizer.relearn(cursor, current_user_id, pairs)
+        
+        if 'category_id' in changes:
+            cursor.execute(f"""
+                UPDATE transaction_anomalies SET category_id = %s
+                WHERE transaction_id IN ({placeholders})
+            """, [changes['category_id'], *ids])
+        
+        # Balances only move when rows leave or change date; repair once
+        # from the earliest affected date
+        if action == 'delete' or 'transaction_date' in changes:
+            dates = [str(row['transaction_date']) for row in rows]
+            if 'transaction_date' in changes:
+                dates.append(changes['transaction_date'])
+            recalculate_running_balances(cursor, current_user_id, min(dates))
+        
+        audit_action = 'DELETE' if action == 'delete' else 'UPDATE'
+        audited = {'status': 'inactive'} if action == 'delete' else changes
+        audit.record_many(cursor, [
+            audit.entry(current_user_id, 'transactions', row['id'], audit_action, row, audited)
+            for row in rows
+        ])
+        
+        balance = current_balance(connection, current_user_id)
+        connection.commit()
+        cursor.close()
+        
+        notify_bulk_change(current_user_id, 'deleted' if action == 'delete' else 'updated', pairs, balance)
+        
+        return jsonify({'message': 'Transactions updated successfully', 'affected': len(ids)}), 200
+        
+    except ValueError as e:
+        if connection:
+            connection.rollback()
+        return jsonify({'message': str(e) or 'Invalid bulk request'}), 400
+    except storage.IntegrityError as e:
+        logger.error(f"Bulk {action} conflict: {e}")
+        connection.rollback()
+        return jsonify({'message': 'Invalid category'}), 400
+    except Exception as e:
+        logger.error(f"Bulk {action} error: {e}")
+        if connection:
+            connection.rollback()
+        return jsonify({'message': 'Failed to update transactions'}), 500
+    finally:
+        # Pooled connections are only returned by close()
+        if connection:
+            connection.close()
 
-# Summary and Analytics Routes
-@app.route('/api/summary', methods=['GET'])
-def get_summary():
-    """Get transaction summary"""
+def parse_import_row(item, position):
+    """Validated transaction dict from one import row; raises ValueError
+
+    category_id may be missing; it is then None and filled in later.
+    """
+    for field in ('transaction_date', 'description'):
+        if not item.get(field):
+            raise ValueError(f'Row {position}: {field} is required')
+    credited = float(item.get('credited') or 0)
+    debited = float(item.get('debited') or 0)
+    if credited <= 0 and debited <= 0:
+        raise ValueError(f'Row {position}: either credited or debited amount must be greater than 0')
+    try:
+        transaction_date = parse_date(item['transaction_date']).isoformat()
+    except ValueError:
+        raise ValueError(f'Row {position}: transaction_date must be YYYY-MM-DD')
+    return {
+        'transaction_date': transaction_date,
+        'category_id': int(item['category_id']) if item.get('category_id') else None,
+        'description': str(item['description']),
+        'credited': credited,
+        'debited': debited,
+        'tags': item.get('tags') or '',
+        'notes': item.get('notes') or ''
+    }
+
+@app.route('/api/transactions/import', methods=['POST'])
+@user_scoped
+def import_transactions(current_user_id):
+    """Insert a batch of transactions, reporting likely duplicates
+
+    Rows without a category_id get the categorizer's choice when it is
+    confident enough, and default_category_id otherwise.
+    """
+    connection = None
     try:
+        data = request.get_json() or {}
+        items = data.get('transactions')
+        if not isinstance(items, list) or not items:
+            return jsonify({'message': 'transactions must be a non-empty list'}), 400
+        if len(items) > BULK_MAX_ROWS:
+            return jsonify({'message': f'At most {BULK_MAX_ROWS} transactions per request'}), 400
+        rows = [parse_import_row(item, position) for position, item in enumerate(items)]
+        skip_duplicates = bool(data.get('skip_duplicates'))
+        default_category_id = int(data['default_category_id']) if data.get('default_category_id') else None
+        
+        connection = get_db_connection()
+        cursor = connection.cursor(dictionary=True)
+        connection.start_transaction()
+        
+        if default_category_id and not visible_category(cursor, default_category_id, current_user_id):
+            raise ValueError('default_category_id not found')
+        hidden = invisible_categories(cursor, [row['category_id'] for row in rows if row['category_id']],
+                                      current_user_id)
+        if hidden:
+            raise ValueError(f'category_id {min(hidden)} not found')
+        
+        # One batch prediction for the rows that arrived without a category
+        uncategorized = [position for position, row in enumerate(rows) if row['category_id'] is None]
+        categorized = []
+        predictions = (categorizer.categorize(cursor, current_user_id, [rows[position] for position in uncategorized])
+                       if uncategorized else [])
+        for position, prediction in zip(uncategorized, predictions):
+            if prediction and prediction['confidence'] >= categorizer.CATEGORIZER_MIN_CONFIDENCE:
+                rows[position]['category_id'] = prediction['category_id']
+                categorized.append(dict(prediction, index=position))
+            elif default_category_id:
+                rows[position]['category_id'] = default_category_id
+            else:
+                raise ValueError(f'Row {position}: category_id is required (no confident suggestion; '
+                                 f'set default_category_id)')
+        
+        # Each row is matched against history and the rows before it
+        matches = duplicates.find_duplicates(cursor, current_user_id, rows)
+        
+        inserted = []
+        ids = {}
+        for position, (row, row_matches) in enumerate(zip(rows, matches)):
+            if skip_duplicates and row_matches:
+                continue
+            # Balances are repaired once below
+            cursor.execute("""
+                INSERT INTO transactions
+                (user_id, transaction_date, category_id, description, credited, debited, running_balance, tags, notes, created_at)
+                VALUES (%s, %s, %s, %s, %s, %s, 0, %s, %s, CURRENT_TIMESTAMP)
+            """, (
+                current_user_id, row['transaction_date'], row['category_id'], row['description'],
+                row['credited'], row['debited'], row['tags'], row['notes']
+            ))
+            ids[position] = cursor.lastrowid
+            inserted.append(dict(row, id=cursor.lastrowid, status='active'))
+        
+        balance = None
+        if inserted:
+            attach_tags(cursor, [(row['id'], row['tags']) for row in inserted], current_user_id)
+            duplicates.index_transactions(cursor, current_user_id, inserted)
+            categorizer.learn(cursor, current_user_id, added=inserted)
+            anomaly.rebuild_categories(cursor, current_user_id, {row['category_id'] for row in inserted})
+            recalculate_running_balances(cursor, current_user_id, min(row['transaction_date'] for row in inserted))
+            audit.record_many(cursor, [
+                audit.entry(current_user_id, 'transactions', row['id'], 'INSERT', new=row)
+                for row in inserted
+            ])
+            balance = current_balance(connection, current_user_id)
+        
+        connection.commit()
+        cursor.close()
+        
+        if inserted:
+            notify_bulk_change(current_user_id, 'added', [(None, row) for row in inserted], balance)
+        
+        reported = []
+        for position, row_matches in enumerate(matches):
+            if not row_matches:
+                continue
+            for match in row_matches:
+                if 'index' in match:
+                    match['id'] = ids.get(match['index'])
+            reported.append({'index': position, 'id': ids.get(position),
+                             'skipped': position not in ids, 'matches': row_matches})
+        
+        return jsonify({
+            'message': 'Transactions imported successfully',
+            'imported': len(inserted),
+            'skipped': len(rows) - len(inserted),
+            'ids': [row['id'] for row in inserted],
+            'categorized': [dict(prediction, id=ids.get(prediction['index'])) for prediction in categorized],
+            'duplicates': reported
+        }), 201
+        
+    except ValueError as e:
+        if connection:
+            connection.rollback()
+        return jsonify({'message': str(e) or 'Invalid import'}), 400
+    except storage.IntegrityError as e:
+        logger.error(f"Import conflict: {e}")
+        connection.rollback()
+        return jsonify({'message': 'Invalid category'}), 400
+    except Exception as e:
+        logger.error(f"Import error: {e}")
+        if connection:
+            connection.rollback()
+        return jsonify({'message': 'Failed to import transactions'}), 500
+    finally:
+        # Pooled connections are only returned by close()
+        if connection:
+            connection.close()
+
+@app.route('/api/transactions/duplicates', methods=['GET'])
+@user_scoped
+def get_duplicates(current_user_id):
+    """Likely duplicate pairs among existing transactions, most confident first"""
+    try:
+        limit = guardrails.page_limit(request.args, 'get_duplicates')
+        threshold = float(request.args.get('min_confidence', duplicates.DUPLICATE_THRESHOLD))
         from_date = request.args.get('from_date')
         to_date = request.args.get('to_date')
-        category_id = request.args.get('category_id')
+        from_date = parse_date(from_date).isoformat() if from_date else None
+        to_date = parse_date(to_date).isoformat() if to_date else None
         
         connection = get_db_connection()
         cursor = connection.cursor(dictionary=True)
+        pairs, truncated = duplicates.scan(cursor, current_user_id, from_date, to_date, threshold, limit)
+        cursor.close()
+        connection.close()
+        
+        return jsonify({'pairs': pairs, 'truncated': truncated}), 200
+        
+    except ValueError:
+        return jsonify({'message': 'Invalid duplicate parameters'}), 400
+    except Exception as e:
+        logger.error(f"Duplicate scan error: {e}")
+        return jsonify({'message': 'Failed to scan for duplicates'}), 500
+
+def recalculate_running_balances(cursor, user_id, from_date=None):
+    """Recalculate one user's running balances, optionally starting at from_date
+
+    Rows before from_date are untouched; their sum is the opening balance.
+    The repair is a single set-based UPDATE over idx_user_status_date.
+    """
+    opening_balance = 0
+    date_filter = ""
+    params = [user_id]
+    if from_date is not None:
+        cursor.execute("""
+            SELECT COALESCE(SUM(credited - debited), 0) as balance
+            FROM transactions
+            WHERE user_id <=> %s AND status = 'active' AND transaction_date < %s
+        """, (user_id, from_date))
+        row = cursor.fetchone()
+        opening_balance = row['balance'] if isinstance(row, dict) else row[0]
+        date_filter = " AND transaction_date >= %s"
+        params.append(from_date)
+    
+    balances = f"""
+        SELECT id, %s + SUM(credited - debited) OVER (
+            ORDER BY transaction_date, created_at, id
+        ) as balance
+        FROM transactions
+        WHERE user_id <=> %s AND status = 'active'{date_filter}
+    """
+    if storage.is_sqlite():
+        cursor.execute(f"""
+            UPDATE transactions SET running_balance = b.balance
+            FROM ({balances}) b
+            WHERE b.id = transactions.id
+        """, [opening_balance, *params])
+    else:
+        cursor.execute(f"""
+            UPDATE transactions t
+            JOIN ({balances}) b ON b.id = t.id
+            SET t.running_balance = b.balance
+        """, [opening_balance, *params])
+
+@app.route('/api/anomalies', methods=['GET'])
+@user_scoped
+def get_anomalies(current_user_id):
+    """List transactions flagged as unusual for their category, newest first"""
+    try:
+        limit = guardrails.page_limit(request.args, 'get_anomalies')
+        before_id = request.args.get('before_id')
+        
+        connection = get_db_connection()
+        cursor = connection.cursor()
         
-        # Build query
         query = """
-            SELECT 
-                COALESCE(SUM(credited), 0) as total_credited,
-                COALESCE(SUM(debited), 0) as total_debited,
-                COALESCE(SUM(credited - debited), 0) as net_balance,
-                COUNT(*) as transaction_count
-            FROM transactions 
-            WHERE status = 'active'
+            SELECT t.id, t.transaction_date, t.description, t.credited, t.debited,
+                t.category_id, c.name as category_name,
+                a.reasons, a.z_score, a.frequency_ratio, a.created_at as flagged_at
+            FROM transaction_anomalies a
+            JOIN transactions t ON t.id = a.transaction_id AND t.status = 'active'
+            LEFT JOIN categories c ON t.category_id = c.id
+            WHERE a.user_id <=> %s
         """
-        params = []
+        params = [current_user_id]
         
-        if category_id:
-            query += " AND category_id = %s"
-            params.append(category_id)
+        if before_id:
+            query += " AND a.transaction_id < %s"
+            params.append(int(before_id))
         
-        if from_date:
-            query += " AND transaction_date >= %s"
-            params.append(from_date)
-        
-        if to_date:
-            query += " AND transaction_date <= %s"
-            params.append(to_date)
+        query += " ORDER BY a.transaction_id DESC LIMIT %s"
+        params.append(limit)
         
         cursor.execute(query, params)
-        summary = cursor.fetchone()
+        data = records(cursor.column_names, cursor.fetchall())
+        for item in data:
+            item['reasons'] = item['reasons'].split(',')
+        
+        cursor.close()
+        connection.close()
+        
+        return jsonify(data), 200
+        
+    except ValueError:
+        return jsonify({'message': 'Invalid anomaly parameters'}), 400
+    except guardrails.QueryTimeout:
+        return query_timed_out()
+    except Exception as e:
+        logger.error(f"Get anomalies error: {e}")
+        return jsonify({'message': 'Failed to fetch anomalies'}), 500
+
+# Audit Routes
+AUDIT_COLUMNS = "id, table_name, record_id, action, old_values, new_values, created_at"
+
+@app.route('/api/transactions/<int:transaction_id>/history', methods=['GET'])
+@user_scoped
+def get_transaction_history(current_user_id, transaction_id):
+    """A transaction's changes newest first, or its version as of a point in time"""
+    try:
+        limit = guardrails.page_limit(request.args, 'get_transaction_history')
+        before_id = request.args.get('before_id')
+        as_of = request.args.get('as_of')
+        
+        connection = get_db_connection(readonly=True, user_id=current_user_id)
+        cursor = connection.cursor(dictionary=True)
         
-        # Convert to float
-        summary['total_credited'] = float(summary['total_credited'])
-        summary['total_debited'] = float(summary['total_debited'])
-        summary['net_balance'] = float(summary['net_balance'])
+        # Every query walks idx_table_record, whose entries are in id order
+        query = f"""
+            SELECT {AUDIT_COLUMNS}
+            FROM audit_log
+            WHERE table_name = 'transactions' AND record_id = %s AND user_id <=> %s
+        """
+        params = [transaction_id, current_user_id]
+        
+        if as_of:
+            # Replay the diffs up to the requested moment
+            query += " AND created_at <= %s ORDER BY id"
+            params.append(datetime.fromisoformat(as_of))
+            cursor.execute(query, params)
+            versions = audit.replay(cursor.fetchall())
+            cursor.close()
+            connection.close()
+            if not versions:
+                return jsonify({'message': 'No history at that time'}), 404
+            return jsonify(dict(versions[-1], record_id=transaction_id)), 200
+        
+        if before_id:
+            query += " AND id < %s"
+            params.append(int(before_id))
+        query += " ORDER BY id DESC LIMIT %s"
+        params.append(limit + 1)
         
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
         cursor.close()
         connection.close()
         
-        return jsonify(summary), 200
+        next_before_id = rows[limit - 1]['id'] if len(rows) > limit else None
+        return jsonify({
+            'entries': [audit.describe(row) for row in rows[:limit]],
+            'next_before_id': next_before_id
+        }), 200
         
+    except ValueError:
+        return jsonify({'message': 'Invalid history parameters'}), 400
     except Exception as e:
-        logger.error(f"Get summary error: {e}")
-        return jsonify({'message': 'Failed to fetch summary'}), 500
+        logger.error(f"Get transaction history error: {e}")
+        return jsonify({'message': 'Failed to fetch transaction history'}), 500
 
-@app.route('/api/charts/category-spending', methods=['GET'])
-def get_category_spending():
-    """Get spending breakdown by category"""
+@app.route('/api/audit', methods=['GET'])
+@user_scoped
+def get_audit_feed(current_user_id):
+    """The user's audit trail newest first, keyset paginated on (created_at, id)"""
     try:
-        from_date = request.args.get('from_date')
-        to_date = request.args.get('to_date')
+        limit = guardrails.page_limit(request.args, 'get_audit_feed')
+        cursor_token = request.args.get('cursor')
         
-        connection = get_db_connection()
+        after = None
+        if cursor_token:
+            after = decode_cursor(cursor_token)
+            if not isinstance(after, list) or len(after) != 2:
+                return jsonify({'message': 'Invalid cursor'}), 400
+        
+        connection = get_db_connection(readonly=True, user_id=current_user_id)
         cursor = connection.cursor(dictionary=True)
         
-        query = """
-            SELECT 
-                c.name,
-                c.color,
-                c.icon,
-                COALESCE(SUM(t.debited), 0) as total_spent
-            FROM categories c
-            LEFT JOIN transactions t ON c.id = t.category_id AND t.status = 'active'
-            WHERE c.status = 'active'
+        # Served by idx_user_created_at (user_id, created_at, id)
+        query = f"""
+            SELECT {AUDIT_COLUMNS}
+            FROM audit_log
+            WHERE user_id <=> %s
         """
-        params = []
+        params = [current_user_id]
         
-        if from_date:
-            query += " AND (t.transaction_date IS NULL OR t.transaction_date >= %s)"
-            params.append(from_date)
+        for column in ('table_name', 'action'):
+            if request.args.get(column):
+                query += f" AND {column} = %s"
+                params.append(request.args[column])
+        
+        if request.args.get('from'):
+            query += " AND created_at >= %s"
+            params.append(datetime.fromisoformat(request.args['from']))
+        if request.args.get('to'):
+            query += " AND created_at <= %s"
+            params.append(datetime.fromisoformat(request.args['to']))
         
-        if to_date:
-            query += " AND (t.transaction_date IS NULL OR t.transaction_date <= %s)"
-            params.append(to_date)
+        if after:
+            created_at = datetime.fromisoformat(after[0])
+            query += " AND (created_at < %s OR (created_at = %s AND id < %s))"
+            params.extend([created_at, created_at, int(after[1])])
         
-        query += " GROUP BY c.id, c.name, c.color, c.icon HAVING total_spent > 0 ORDER BY total_spent DESC"
+        query += " ORDER BY created_at DESC, id DESC LIMIT %s"
+        params.append(limit + 1)
         
         cursor.execute(query, params)
-        data = cursor.fetchall()
+        rows = cursor.fetchall()
+        cursor.close()
+        connection.close()
+        
+        entries = [audit.describe(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = encode_cursor([audit.normalize(last['created_at']), last['id']])
+        
+        return jsonify({'entries': entries, 'next_cursor': next_cursor}), 200
+        
+    except ValueError:
+        return jsonify({'message': 'Invalid audit parameters'}), 400
+    except Exception as e:
+        logger.error(f"Get audit feed error: {e}")
+        return jsonify({'message': 'Failed to fetch audit log'}), 500
+
+# Trash Routes
+@app.route('/api/trash', methods=['GET'])
+@user_scoped
+def get_trash(current_user_id):
+    """List archived rows that can still be restored, newest first"""
+    try:
+        limit = guardrails.page_limit(request.args, 'get_trash')
+        before_id = request.args.get('before_id')
+        
+        connection = get_db_connection()
+        cursor = connection.cursor()
         
-        # Convert to float
+        query = """
+            SELECT id, table_name, record_id, original_data, deleted_at, restore_before
+            FROM trash_bin
+            WHERE user_id <=> %s AND (restore_before IS NULL OR restore_before >= CURRENT_TIMESTAMP)
+        """
+        params = [current_user_id]
+        
+        if before_id:
+            query += " AND id < %s"
+            params.append(int(before_id))
+        
+        query += " ORDER BY id DESC LIMIT %s"
+        params.append(limit)
+        
+        cursor.execute(query, params)
+        data = records(cursor.column_names, cursor.fetchall())
         for item in data:
-            item['total_spent'] = float(item['total_spent'])
+            item['original_data'] = json.loads(item['original_data'])
         
         cursor.close()
         connection.close()
         
         return jsonify(data), 200
         
+    except ValueError:
+        return jsonify({'message': 'Invalid trash parameters'}), 400
+    except Exception as e:
+        logger.error(f"Get trash error: {e}")
+        return jsonify({'message': 'Failed to fetch trash'}), 500
+
+@app.route('/api/trash/<int:trash_id>/restore', methods=['POST'])
+@user_scoped
+def restore_from_trash(current_user_id, trash_id):
+    """Reinsert an archived transaction or category and repair balances"""
+    connection = None
+    try:
+        connection = get_db_connection()
+        cursor = connection.cursor(dictionary=True)
+        connection.start_transaction()
+        
+        cursor.execute("""
+            SELECT * FROM trash_bin
+            WHERE id = %s AND user_id <=> %s
+                AND (restore_before IS NULL OR restore_before >= CURRENT_TIMESTAMP)
+            FOR UPDATE
+        """, (trash_id, current_user_id))
+        entry = cursor.fetchone()
+        
+        if not entry:
+            connection.rollback()
+            cursor.close()
+            return jsonify({'message': 'Trash entry not found'}), 404
+        
+        row = archiver.restore_row(cursor, entry)
+        
+        if entry['table_name'] == 'transactions':
+            attach_tags(cursor, [(row['id'], row.get('tags', ''))], current_user_id)
+            audit.record(cursor, current_user_id, 'transactions', row['id'], 'INSERT', new=row)
+            anomaly.observe_insert(
+                cursor, current_user_id, row['id'], row['category_id'],
+                row['transaction_date'], row['credited'], row['debited']
+            )
+            duplicates.index_transactions(cursor, current_user_id, [row])
+            categorizer.learn(cursor, current_user_id, added=[row])
+            recalculate_running_balances(cursor, current_user_id, row['transaction_date'])
+        elif entry['table_name'] == 'categories':
+            # Reattach below its parent in the hierarchy
+            category_tree.add_node(cursor, row['id'], row['parent_id'])
+        
+        connection.commit()
+        balance = current_balance(connection, current_user_id) if entry['table_name'] == 'transactions' else None
+        cursor.close()
+        
+        if entry['table_name'] == 'transactions':
+            notify_transaction_change(current_user_id, None, row, balance)
+        
+        return jsonify({
+            'message': 'Restored successfully',
+            'table_name': entry['table_name'],
+            'id': row['id']
+        }), 200
+        
+    except storage.IntegrityError as e:
+        logger.error(f"Restore conflict: {e}")
+        connection.rollback()
+        return jsonify({'message': 'Cannot restore: a referenced record no longer exists'}), 409
+    except Exception as e:
+        logger.error(f"Restore error: {e}")
+        if connection:
+            connection.rollback()
+        return jsonify({'message': 'Failed to restore'}), 500
+    finally:
+        if connection:
+            connection.close()
+
+@app.route('/api/changes', methods=['GET'])
+@user_scoped
+def stream_changes(current_user_id):
+    """Server-sent stream of this user's transaction changes"""
+    if not change_hub:
+        return jsonify({'message': 'Change feed is disabled'}), 404
+    
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    subscription = change_hub.subscribe(current_user_id, last_event_id)
+    if subscription is None:
+        return reject_request(503, 'Too many open change streams, please retry', CHANGE_FEED_HEARTBEAT_SECONDS)
+    
+    return Response(
+        change_hub.stream(subscription, CHANGE_FEED_HEARTBEAT_SECONDS, CHANGE_FEED_MAX_STREAM_SECONDS),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+# Summary and Analytics Routes
+# Optional in-memory copy of active transactions for summary/chart reads
+analytics_store = None
+if os.getenv('ANALYTICS_STORE_ENABLED', 'False').lower() == 'true':
+    analytics_store = AnalyticsStore(lambda: get_db_connection(readonly=True))
+
+def fetch_summary(user_id, args):
+    """Query income/expense totals for the user's filtered transactions"""
+    if analytics_store and analytics_store.serves(args):
+        return analytics_store.summary(user_id, args)
+    guardrails.check_range(args)
+    
+    connection = get_db_connection(readonly=True, user_id=user_id)
+    cursor = connection.cursor(dictionary=True)
+    
+    # Build query
+    query = """
+        SELECT 
+            COALESCE(SUM(t.credited), 0) as total_credited,
+            COALESCE(SUM(t.debited), 0) as total_debited,
+            COALESCE(SUM(t.credited - t.debited), 0) as net_balance,
+            COUNT(*) as transaction_count
+        FROM transactions t
+        WHERE t.status = 'active'
+    """
+    filter_query, params = build_transaction_filters(args, user_id)
+    query += filter_query
+    
+    cursor.execute(query, params)
+    summary = cursor.fetchone()
+    
+    cursor.close()
+    connection.close()
+    
+    return summary
+
+def fetch_category_spending(user_id, args):
+    """Query debited totals per category"""
+    if analytics_store and analytics_store.serves(args):
+        return shape_rows(*analytics_store.category_spending(user_id, args), args.get('format'))
+    guardrails.check_range(args)
+    
+    from_date = args.get('from_date')
+    to_date = args.get('to_date')
+    
+    connection = get_db_connection(readonly=True, user_id=user_id)
+    cursor = connection.cursor()
+    
+    # Aggregate the user's transactions first (idx_user_category_date), then
+    # join the few resulting categories; date predicates stay on transactions
+    date_filter = ""
+    params = [user_id]
+    
+    if from_date:
+        date_filter += " AND transaction_date >= %s"
+        params.append(from_date)
+    
+    if to_date:
+        date_filter += " AND transaction_date <= %s"
+        params.append(to_date)
+    
+    query = f"""
+        SELECT 
+            c.name,
+            c.color,
+            c.icon,
+            s.total_spent
+        FROM (
+            SELECT category_id, SUM(debited) as total_spent
+            FROM transactions
+            WHERE user_id <=> %s AND status = 'active'{date_filter}
+            GROUP BY category_id
+            HAVING SUM(debited) > 0
+        ) s
+        JOIN categories c ON c.id = s.category_id AND c.status = 'active'
+        ORDER BY s.total_spent DESC
+    """
+    
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+    columns = cursor.column_names
+    
+    cursor.close()
+    connection.close()
+    
+    return shape_rows(columns, rows, args.get('format'))
+
+def fetch_category_tree(user_id, args):
+    """Category spending nested by parent, with subtree totals"""
+    guardrails.check_range(args)
+    connection = get_db_connection(readonly=True, user_id=user_id)
+    cursor = connection.cursor(dictionary=True)
+    
+    totals = category_tree.spending_rollup(cursor, user_id, args.get('from_date'), args.get('to_date'))
+    categories = []
+    if totals:
+        placeholders = ', '.join(['%s'] * len(totals))
+        cursor.execute(f"""
+            SELECT id, parent_id, name, color, icon, sort_order
+            FROM categories
+            WHERE status = 'active' AND id IN ({placeholders})
+        """, list(totals))
+        categories = cursor.fetchall()
+    
+    cursor.close()
+    connection.close()
+    
+    return category_tree.build_tree(categories, totals)
+
+def fetch_monthly_trend(user_id, args):
+    """Query monthly income/expense totals, defaulting to the last 12 months"""
+    if analytics_store and analytics_store.serves(args):
+        return shape_rows(*analytics_store.monthly_trend(user_id, args), args.get('format'))
+    guardrails.check_range(args)
+    
+    from_date = args.get('from_date')
+    to_date = args.get('to_date')
+    
+    connection = get_db_connection(readonly=True, user_id=user_id)
+    cursor = connection.cursor()
+    
+    query = """
+        SELECT 
+            DATE_FORMAT(transaction_date, '%%Y-%%m') as month,
+            COALESCE(SUM(credited), 0) as total_income,
+            COALESCE(SUM(debited), 0) as total_expense
+        FROM transactions 
+        WHERE user_id <=> %s
+            AND status = 'active' 
+    """
+    params = [user_id]
+    
+    if from_date:
+        query += " AND transaction_date >= %s"
+        params.append(from_date)
+    else:
+        query += " AND transaction_date >= DATE_SUB(CURDATE(), INTERVAL 12 MONTH)"
+    
+    if to_date:
+        query += " AND transaction_date <= %s"
+        params.append(to_date)
+    
+    query += " GROUP BY DATE_FORMAT(transaction_date, '%%Y-%%m') ORDER BY month"
+    
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+    columns = cursor.column_names
+    
+    cursor.close()
+    connection.close()
+    
+    return shape_rows(columns, rows, args.get('format'))
+
+@app.route('/api/summary', methods=['GET'])
+@user_scoped
+def get_summary(current_user_id):
+    """Get transaction summary"""
+    try:
+        summary = fetch_summary(current_user_id, request.args)
+        
+        return jsonify(summary), 200
+        
+    except guardrails.RangeTooLarge as e:
+        return range_too_large(e)
+    except guardrails.QueryTimeout:
+        return query_timed_out()
+    except Exception as e:
+        logger.error(f"Get summary error: {e}")
+        return jsonify({'message': 'Failed to fetch summary'}), 500
+
+@app.route('/api/charts/category-spending', methods=['GET'])
+@user_scoped
+def get_category_spending(current_user_id):
+    """Get spending breakdown by category, flat or as a tree (?view=tree)"""
+    try:
+        if request.args.get('view') == 'tree':
+            data = fetch_category_tree(current_user_id, request.args)
+        else:
+            data = fetch_category_spending(current_user_id, request.args)
+        
+        return jsonify(data), 200
+        
+    except guardrails.RangeTooLarge as e:
+        return range_too_large(e)
+    except guardrails.QueryTimeout:
+        return query_timed_out()
     except Exception as e:
         logger.error(f"Get category spending error: {e}")
         return jsonify({'message': 'Failed to fetch category spending'}), 500
 
 @app.route('/api/charts/monthly-trend', methods=['GET'])
-def get_monthly_trend():
+@user_scoped
+def get_monthly_trend(current_user_id):
     """Get monthly spending trend"""
     try:
+        data = fetch_monthly_trend(current_user_id, request.args)
+        
+        return jsonify(data), 200
+        
+    except guardrails.RangeTooLarge as e:
+        return range_too_large(e)
+    except guardrails.QueryTimeout:
+        return query_timed_out()
+    except Exception as e:
+        logger.error(f"Get monthly trend error: {e}")
+        return jsonify({'message': 'Failed to fetch monthly trend'}), 500
+
+def load_daily_aggregates(user_id):
+    """Per-day, per-category totals feeding the time-series cache"""
+    connection = get_db_connection(readonly=True, user_id=user_id)
+    cursor = connection.cursor()
+    cursor.execute("""
+        SELECT transaction_date, category_id, SUM(credited), SUM(debited)
+        FROM transactions
+        WHERE user_id <=> %s AND status = 'active'
+        GROUP BY transaction_date, category_id
+        ORDER BY transaction_date
+    """, (user_id,))
+    rows = cursor.fetchall()
+    cursor.close()
+    connection.close()
+    return rows
+
+timeseries_cache = TimeSeriesCache(
+    load_daily_aggregates,
+    ttl=int(os.getenv('TIMESERIES_CACHE_TTL', 300)),
+    max_entries=int(os.getenv('TIMESERIES_CACHE_SIZE', 1000))
+)
+
+def update_timeseries_cache(user_id, old, new):
+    """Fold a transaction change into the cached daily aggregates"""
+    if old:
+        timeseries_cache.apply(user_id, old['transaction_date'], old['category_id'],
+                               old['credited'], old['debited'], sign=-1)
+    if new:
+        timeseries_cache.apply(user_id, new['transaction_date'], new['category_id'],
+                               new['credited'], new['debited'])
+
+transaction_listeners.append(update_timeseries_cache)
+
+@app.route('/api/charts/timeseries', methods=['GET'])
+@user_scoped
+def get_timeseries(current_user_id):
+    """Bucketed, optionally cumulative or rolling, per-category series"""
+    try:
+        granularity = request.args.get('granularity', 'month')
+        metric = request.args.get('metric', 'expense')
+        if granularity not in GRANULARITIES or metric not in METRICS:
+            return jsonify({'message': f'granularity must be one of {GRANULARITIES}, metric one of {METRICS}'}), 400
+        
+        to_date = parse_date(request.args.get('to_date') or datetime.utcnow().date())
+        from_date = parse_date(request.args.get('from_date') or to_date - timedelta(days=365))
+        if from_date > to_date:
+            return jsonify({'message': 'from_date must not be after to_date'}), 400
+        guardrails.check_range({'from_date': from_date, 'to_date': to_date},
+                               guardrails.series_max_days(granularity))
+        
+        category_ids = None
+        if request.args.get('category_ids'):
+            category_ids = [int(value) for value in request.args['category_ids'].split(',')]
+        
+        rolling = int(request.args['rolling']) if request.args.get('rolling') else None
+        if rolling is not None and rolling < 1:
+            return jsonify({'message': 'rolling must be a positive number of buckets'}), 400
+        
+        data = timeseries_cache.build_series(
+            current_user_id, from_date, to_date, granularity, metric,
+            category_ids=category_ids,
+            cumulative=request.args.get('cumulative', '').lower() in ('1', 'true'),
+            rolling=rolling
+        )
+        
+        return jsonify(data), 200
+        
+    except guardrails.RangeTooLarge as e:
+        return range_too_large(e)
+    except (ValueError, OverflowError):
+        # OverflowError: dates near date.min/date.max
+        return jsonify({'message': 'Invalid time-series parameters'}), 400
+    except guardrails.QueryTimeout:
+        return query_timed_out()
+    except Exception as e:
+        logger.error(f"Get timeseries error: {e}")
+        return jsonify({'message': 'Failed to fetch time series'}), 500
+
+BALANCE_HISTORY_DEFAULT_POINTS = 500
+BALANCE_HISTORY_MAX_POINTS = 5000
+
+@app.route('/api/charts/balance-history', methods=['GET'])
+@user_scoped
+def get_balance_history(current_user_id):
+    """End-of-day balances over a range, downsampled to at most `points`"""
+    try:
+        points = int(request.args.get('points', BALANCE_HISTORY_DEFAULT_POINTS))
+        if not 3 <= points <= BALANCE_HISTORY_MAX_POINTS:
+            return jsonify({'message': f'points must be between 3 and {BALANCE_HISTORY_MAX_POINTS}'}), 400
+        
+        to_value = request.args.get('to') or request.args.get('to_date')
+        from_value = request.args.get('from') or request.args.get('from_date')
+        to_date = parse_date(to_value or datetime.utcnow().date())
+        from_date = parse_date(from_value) if from_value else None
+        if from_date and from_date > to_date:
+            return jsonify({'message': 'from must not be after to'}), 400
+        # An explicit range over the cap is refused; a default one is shortened
+        if from_date:
+            guardrails.check_range({'from_date': from_date, 'to_date': to_date})
+        
+        data = timeseries_cache.balance_history(current_user_id, from_date, to_date, points,
+                                                max_days=guardrails.ANALYTICS_MAX_RANGE_DAYS)
+        
+        return jsonify(data), 200
+        
+    except guardrails.RangeTooLarge as e:
+        return range_too_large(e)
+    except (ValueError, OverflowError):
+        # OverflowError: dates near date.min/date.max
+        return jsonify({'message': 'Invalid balance-history parameters'}), 400
+    except guardrails.QueryTimeout:
+        return query_timed_out()
+    except Exception as e:
+        logger.error(f"Get balance history error: {e}")
+        return jsonify({'message': 'Failed to fetch balance history'}), 500
+
+# Forecasts learn from this much non-recurring history
+FORECAST_LOOKBACK_DAYS = int(os.getenv('FORECAST_LOOKBACK_DAYS', 730))
+MAX_FORECAST_DAYS = 730
+forecast_cache = forecast.ForecastCache(
+    max_entries=int(os.getenv('FORECAST_CACHE_SIZE', 1000)),
+    ttl=int(os.getenv('FORECAST_CACHE_SECONDS', 3600))
+)
+
+def invalidate_forecasts(user_id, old, new):
+    """Drop cached projections when history inside the lookback window changes"""
+    start = datetime.utcnow().date()
+    if forecast.change_in_window(old, start, FORECAST_LOOKBACK_DAYS) or \
+            forecast.change_in_window(new, start, FORECAST_LOOKBACK_DAYS):
+        forecast_cache.invalidate(user_id)
+
+transaction_listeners.append(invalidate_forecasts)
+
+@app.route('/api/forecast', methods=['GET'])
+@user_scoped
+def get_forecast(current_user_id):
+    """Project the daily balance from recurring rules and historical rates"""
+    try:
+        days = int(request.args.get('days', 90))
+        if not 1 <= days <= MAX_FORECAST_DAYS:
+            return jsonify({'message': f'days must be between 1 and {MAX_FORECAST_DAYS}'}), 400
+        confidence = float(request.args.get('confidence', 0.9))
+        
+        start = datetime.utcnow().date()
+        
         connection = get_db_connection()
         cursor = connection.cursor(dictionary=True)
         
         cursor.execute("""
-            SELECT 
-                DATE_FORMAT(transaction_date, '%Y-%m') as month,
-                COALESCE(SUM(credited), 0) as total_income,
-                COALESCE(SUM(debited), 0) as total_expense
-            FROM transactions 
-            WHERE status = 'active' 
-                AND transaction_date >= DATE_SUB(CURDATE(), INTERVAL 12 MONTH)
-            GROUP BY DATE_FORMAT(transaction_date, '%Y-%m')
-            ORDER BY month
-        """)
-        
-        data = cursor.fetchall()
-        
-        # Convert to float
-        for item in data:
-            item['total_income'] = float(item['total_income'])
-            item['total_expense'] = float(item['total_expense'])
+            SELECT id, amount, type, frequency, frequency_interval, next_execution,
+                end_date, execution_count, max_executions, updated_at
+            FROM recurring_transactions
+            WHERE user_id <=> %s AND status = 'active'
+        """, (current_user_id,))
+        rules = cursor.fetchall()
+        
+        cursor.execute("""
+            SELECT COALESCE(SUM(credited - debited), 0) as balance
+            FROM transactions
+            WHERE user_id <=> %s AND status = 'active'
+        """, (current_user_id,))
+        balance = cursor.fetchone()['balance']
+        
+        # Any worker may have written since the projection was cached: stamp
+        # the history window (soft deletes and date moves bump updated_at,
+        # restores and moves out of the window change the count)
+        cursor.execute("""
+            SELECT COUNT(*) AS row_count, MAX(updated_at) AS last_update
+            FROM transactions
+            WHERE user_id <=> %s AND transaction_date >= %s
+        """, (current_user_id, start - timedelta(days=FORECAST_LOOKBACK_DAYS)))
+        stamp = cursor.fetchone()
+        
+        # Rule edits happen outside this API, so the rule set itself is part of the fingerprint
+        fingerprint = (
+            tuple((rule['id'], str(rule['updated_at'])) for rule in rules),
+            stamp['row_count'], str(stamp['last_update'])
+        )
+        key = (start, days)
+        projection = forecast_cache.get(current_user_id, key, fingerprint)
+        
+        if projection is None:
+            cursor.execute("""
+                SELECT transaction_date, category_id, SUM(credited - debited) as net
+                FROM transactions
+                WHERE user_id <=> %s AND status = 'active' AND is_recurring = FALSE
+                    AND transaction_date >= %s AND transaction_date < %s
+                GROUP BY transaction_date, category_id
+            """, (current_user_id, start - timedelta(days=FORECAST_LOOKBACK_DAYS), start))
+            history = [(row['transaction_date'], row['category_id'], row['net']) for row in cursor.fetchall()]
+            
+            projection = forecast.project(
+                forecast.expand_recurring(rules, start, days),
+                forecast.seasonal_rates(history, start, FORECAST_LOOKBACK_DAYS),
+                start, days
+            )
+            forecast_cache.put(current_user_id, key, fingerprint, projection)
         
         cursor.close()
         connection.close()
         
-        return jsonify(data), 200
+        return jsonify(forecast.render(projection, balance, confidence)), 200
         
+    except ValueError:
+        return jsonify({'message': 'Invalid forecast parameters'}), 400
+    except guardrails.QueryTimeout:
+        return query_timed_out()
     except Exception as e:
-        logger.error(f"Get monthly trend error: {e}")
-        return jsonify({'message': 'Failed to fetch monthly trend'}), 500
+        logger.error(f"Get forecast error: {e}")
+        return jsonify({'message': 'Failed to compute forecast'}), 500
+
+# Dashboard sections run concurrently, each on its own pooled connection
+DASHBOARD_WORKERS = int(os.getenv('DASHBOARD_WORKERS', 4))
+dashboard_executor = ThreadPoolExecutor(max_workers=DASHBOARD_WORKERS, thread_name_prefix='dashboard')
+
+def timed_section(fetch, *args):
+    """Run one dashboard section, capturing its result, error and duration
+
+    Sections run without a request context, so each fetch passes readonly
+    and user_id to get_db_connection() itself.
+    """
+    started = time.perf_counter()
+    try:
+        with guardrails.query_class('analytics'):
+            return fetch(*args), None, (time.perf_counter() - started) * 1000
+    except Exception as e:
+        logger.error(f"Dashboard section {fetch.__name__} error: {e}")
+        return None, str(e), (time.perf_counter() - started) * 1000
+
+@app.route('/api/dashboard', methods=['GET'])
+@user_scoped
+def get_dashboard(current_user_id):
+    """Summary, charts and recent transactions in one round trip"""
+    started = time.perf_counter()
+    args = request.args.to_dict()
+    
+    # Monthly trend and category spending ignore the category/tag filters
+    range_args = {key: args[key] for key in ('from_date', 'to_date') if key in args}
+    sections = {
+        'summary': (fetch_summary, current_user_id, range_args),
+        'category_spending': (fetch_category_spending, current_user_id, range_args),
+        'monthly_trend': (fetch_monthly_trend, current_user_id, range_args),
+        'recent_transactions': (fetch_transactions, current_user_id, range_args, 10)
+    }
+    futures = {
+        name: dashboard_executor.submit(timed_section, *section)
+        for name, section in sections.items()
+    }
+    
+    payload = {'timings_ms': {}, 'errors': {}}
+    for name, future in futures.items():
+        data, error, elapsed = future.result()
+        payload[name] = data
+        payload['timings_ms'][name] = round(elapsed, 2)
+        if error:
+            payload['errors'][name] = error
+    payload['timings_ms']['total'] = round((time.perf_counter() - started) * 1000, 2)
+    
+    if len(payload['errors']) == len(sections):
+        return jsonify({'message': 'Failed to fetch dashboard', **payload}), 500
+    
+    return jsonify(payload), 200
 
 # Export Routes
 @app.route('/api/export/csv', methods=['GET'])
-def export_csv():
-    """Export transactions as CSV"""
+@user_scoped
+def export_csv(current_user_id):
+    """Export transactions as CSV, or queue a background export when the
+    request is over the synchronous caps"""
     try:
-        category_id = request.args.get('category_id')
-        from_date = request.args.get('from_date')
-        to_date = request.args.get('to_date')
+        days = guardrails.range_days(request.args)
+        if days is not None and days > guardrails.EXPORT_SYNC_MAX_DAYS:
+            return queue_export(current_user_id, 'csv', exports.normalize_filters(request.args),
+                                f'Date range over {guardrails.EXPORT_SYNC_MAX_DAYS} days; queued as a background export')
         
         connection = get_db_connection()
         cursor = connection.cursor(dictionary=True)
+        filter_query, params = build_transaction_filters(request.args, current_user_id)
+        
+        # Count at most one row past the cap, so the check stays cheap
+        cursor.execute(f"""
+            SELECT COUNT(*) AS row_count FROM (
+                SELECT 1 FROM transactions t
+                WHERE t.status = 'active'{filter_query}
+                LIMIT %s
+            ) capped
+        """, [*params, guardrails.EXPORT_SYNC_MAX_ROWS + 1])
+        if cursor.fetchone()['row_count'] > guardrails.EXPORT_SYNC_MAX_ROWS:
+            cursor.close()
+            connection.close()
+            return queue_export(current_user_id, 'csv', exports.normalize_filters(request.args),
+                                f'More than {guardrails.EXPORT_SYNC_MAX_ROWS} rows; queued as a background export')
         
         # Build query
         query = """
@@ -665,19 +2549,7 @@ def export_csv():
             LEFT JOIN categories c ON t.category_id = c.id
             WHERE t.status = 'active'
         """
-        params = []
-        
-        if category_id:
-            query += " AND t.category_id = %s"
-            params.append(category_id)
-        
-        if from_date:
-            query += " AND t.transaction_date >= %s"
-            params.append(from_date)
-        
-        if to_date:
-            query += " AND t.transaction_date <= %s"
-            params.append(to_date)
+        query += filter_query
         
         query += " ORDER BY t.transaction_date DESC"
         
@@ -709,37 +2581,239 @@ def export_csv():
         
         return response
         
+    except guardrails.QueryTimeout:
+        return query_timed_out()
     except Exception as e:
         logger.error(f"Export CSV error: {e}")
         return jsonify({'message': 'Failed to export CSV'}), 500
 
-# Health Check
-@app.route('/health', methods=['GET'])
-def health_check():
-    """Health check endpoint"""
+def export_query(user_id, filters):
+    """Rows of a transaction export, with the list filters applied"""
+    query = """
+        SELECT 
+            t.id,
+            t.transaction_date,
+            c.name as category,
+            t.description,
+            t.credited,
+            t.debited,
+            t.running_balance,
+            t.tags,
+            t.notes
+        FROM transactions t
+        LEFT JOIN categories c ON t.category_id = c.id
+        WHERE t.status = 'active'
+    """
+    filter_query, params = build_transaction_filters(filters, user_id)
+    return query + filter_query, params
+
+# Background export jobs, run by worker threads in every process
+EXPORT_WORKERS = int(os.getenv('EXPORT_WORKERS', 2))
+export_pool = exports.ExportWorkerPool(
+    lambda: get_db_connection(readonly=False), export_query, workers=EXPORT_WORKERS
+) if EXPORT_WORKERS > 0 else None
+
+def queue_export(user_id, export_format, filters, message=None):
+    """Queue (or reuse) an export job; 202 with its Location, or 200 when reused
+
+    Also reached from GET export_csv, so the connection is forced to the primary.
+    """
+    connection = get_db_connection(readonly=False, user_id=user_id)
+    cursor = connection.cursor(dictionary=True)
+    
+    job_id, reused = exports.enqueue(cursor, user_id, export_format, filters)
+    job = exports.get_job(cursor, job_id, user_id)
+    
+    cursor.close()
+    connection.close()
+    
+    if not reused and export_pool:
+        export_pool.notify()
+    
+    payload = dict(exports.describe(job), reused=reused)
+    if message:
+        payload['message'] = message
+    response = jsonify(payload)
+    response.status_code = 200 if reused else 202
+    response.headers['Location'] = f'/api/exports/{job_id}'
+    return response
+
+@app.route('/api/exports', methods=['POST'])
+@user_scoped
+def create_export(current_user_id):
+    """Queue an export of the filtered transactions, or reuse an identical recent one"""
+    try:
+        data = request.get_json(silent=True) or {}
+        export_format = data.get('format', 'csv')
+        if export_format not in exports.FORMATS:
+            return jsonify({'message': f'format must be one of {", ".join(exports.FORMATS)}'}), 400
+        filters = exports.normalize_filters(data.get('filters') or {})
+        
+        return queue_export(current_user_id, export_format, filters)
+        
+    except Exception as e:
+        logger.error(f"Create export error: {e}")
+        return jsonify({'message': 'Failed to create export'}), 500
+
+@app.route('/api/exports/<int:job_id>', methods=['GET'])
+@user_scoped
+def get_export(current_user_id, job_id):
+    """Status and progress of an export job"""
     try:
-        # Test database connection
         connection = get_db_connection()
-        cursor = connection.cursor()
-        cursor.execute("SELECT 1")
-        cursor.fetchone()
+        cursor = connection.cursor(dictionary=True)
+        job = exports.get_job(cursor, job_id, current_user_id)
+        cursor.close()
+        connection.close()
+        
+        if not job:
+            return jsonify({'message': 'Export not found'}), 404
+        
+        return jsonify(exports.describe(job)), 200
+        
+    except Exception as e:
+        logger.error(f"Get export error: {e}")
+        return jsonify({'message': 'Failed to fetch export'}), 500
+
+@app.route('/api/exports/<int:job_id>/download', methods=['GET'])
+@user_scoped
+def download_export(current_user_id, job_id):
+    """Stream a finished export from disk; supports Range and conditional requests"""
+    try:
+        connection = get_db_connection()
+        cursor = connection.cursor(dictionary=True)
+        job = exports.get_job(cursor, job_id, current_user_id)
         cursor.close()
         connection.close()
         
+        if not job:
+            return jsonify({'message': 'Export not found'}), 404
+        if job['status'] != 'done':
+            return jsonify({'message': f"Export is {job['status']}"}), 409
+        
+        path = exports.file_path(job)
+        if not os.path.exists(path):
+            return jsonify({'message': 'Export file has expired'}), 410
+        
+        return send_file(
+            path,
+            mimetype=exports.FORMATS[job['format']][0],
+            as_attachment=True,
+            download_name=exports.file_name(job),
+            conditional=True
+        )
+        
+    except Exception as e:
+        logger.error(f"Download export error: {e}")
+        return jsonify({'message': 'Failed to download export'}), 500
+
+# Health Checks
+STARTED_AT = time.monotonic()
+# Readiness probes share one database check per interval
+READINESS_CACHE_SECONDS = float(os.getenv('READINESS_CACHE_SECONDS', 5))
+readiness_lock = threading.Lock()
+readiness_state = {'checked_at': None, 'ready': False, 'error': 'not checked yet', 'timestamp': None}
+
+def check_readiness():
+    """Return the cached readiness result, refreshing it once per interval"""
+    now = time.monotonic()
+    with readiness_lock:
+        checked_at = readiness_state['checked_at']
+        if checked_at is not None and now - checked_at < READINESS_CACHE_SECONDS:
+            return dict(readiness_state)
+        # Concurrent probes keep returning the previous result meanwhile
+        readiness_state['checked_at'] = now
+    
+    ready, error = False, None
+    if db_breaker.is_open:
+        error = 'database circuit open'
+    elif connection_pool is None and not storage.is_sqlite():
+        error = 'connection pool not established'
+        init_worker()
+        ensure_pool_maintainer()
+    else:
+        try:
+            connection = get_db_connection(readonly=False)
+            cursor = connection.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            connection.close()
+            ready = True
+        except Exception as e:
+            error = str(e)
+    
+    with readiness_lock:
+        readiness_state.update(ready=ready, error=error, timestamp=datetime.utcnow().isoformat())
+        return dict(readiness_state)
+
+@app.route('/health/live', methods=['GET'])
+def liveness_check():
+    """Process liveness; never touches the database"""
+    return jsonify({
+        'status': 'alive',
+        'pid': os.getpid(),
+        'uptime_seconds': round(time.monotonic() - STARTED_AT, 1)
+    }), 200
+
+@app.route('/health/ready', methods=['GET'])
+def readiness_check():
+    """Whether this worker can serve database traffic (cached)"""
+    state = check_readiness()
+    return jsonify({
+        'status': 'ready' if state['ready'] else 'unready',
+        'checked_at': state['timestamp'],
+        'database': 'connected' if state['ready'] else state['error'],
+        'circuit': db_breaker.stats()['state']
+    }), 200 if state['ready'] else 503
+
+@app.route('/health', methods=['GET'])
+def health_check():
+    """Health check endpoint"""
+    state = check_readiness()
+    if state['ready']:
         return jsonify({
             'status': 'healthy',
             'timestamp': datetime.utcnow().isoformat(),
             'version': '1.0.0',
             'database': 'connected'
         }), 200
-        
-    except Exception as e:
-        logger.error(f"Health check failed: {e}")
-        return jsonify({
-            'status': 'unhealthy',
-            'timestamp': datetime.utcnow().isoformat(),
-            'error': str(e)
-        }), 500
+    
+    return jsonify({
+        'status': 'unhealthy',
+        'timestamp': datetime.utcnow().isoformat(),
+        'error': state['error']
+    }), 500
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Connection pool and routing counters"""
+    with routing_lock:
+        metrics = {
+            'db_pools': {section: dict(counters) for section, counters in pool_metrics.items()},
+            'replica': {
+                'configured': replica_pool is not None,
+                'lag_seconds': replica_state['lag'],
+                'healthy': replica_state['healthy']
+            }
+        }
+    metrics['database'] = {
+        'primary_pool': connection_pool is not None,
+        'replica_pool': replica_pool is not None,
+        'circuit_breaker': db_breaker.stats()
+    }
+    metrics['analytics_store'] = analytics_store.stats() if analytics_store else None
+    metrics['change_feed'] = change_hub.stats() if change_hub else None
+    metrics['exports'] = export_pool.stats() if export_pool else None
+    metrics['admission'] = {
+        'enabled': ADMISSION_CONTROL_ENABLED,
+        'rate_limits': rate_limiter.stats(),
+        'concurrency': admission_gate.stats()
+    }
+    return jsonify(metrics), 200
+
+# Move soft-deleted rows into trash_bin and purge expired trash in the background
+ARCHIVER_ENABLED = os.getenv('ARCHIVER_ENABLED', 'False').lower() == 'true'
 
 # Error Handlers
 @app.errorhandler(404)
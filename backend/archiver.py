@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Spend Tracker Trash Archiver
+
+Soft-deleted rows (status = 'inactive') are moved out of the hot tables into
+trash_bin, where they can be restored until restore_before and are purged
+afterwards. Work is done in small batches, each in its own short transaction
+using SKIP LOCKED, so several archivers (one per app worker, or cron) can run
+at once without blocking each other or live traffic.
+
+Run as a script for a one-off pass, or enable the in-process background
+thread with ARCHIVER_ENABLED=True.
+"""
+
+import mysql.connector
+from mysql.connector import Error
+import os
+import sys
+import json
+import threading
+from datetime import timedelta
+from dotenv import load_dotenv
+import logging
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', 200))
+TRASH_RETENTION_DAYS = int(os.getenv('TRASH_RETENTION_DAYS', 30))
+ARCHIVER_INTERVAL_SECONDS = int(os.getenv('ARCHIVER_INTERVAL_SECONDS', 300))
+
+# Inactive categories still referenced elsewhere stay in place, as do
+# parents of other categories (their children are archived first)
+ARCHIVABLE_CATEGORY_FILTER = """
+    AND NOT EXISTS (SELECT 1 FROM categories child WHERE child.parent_id = categories.id)
+    AND NOT EXISTS (SELECT 1 FROM transactions t WHERE t.category_id = categories.id)
+    AND NOT EXISTS (SELECT 1 FROM recurring_transactions r WHERE r.category_id = categories.id)
+    AND NOT EXISTS (SELECT 1 FROM goals g WHERE g.category_id = categories.id)
+"""
+
+ARCHIVED_TABLES = {
+    'transactions': "",
+    'categories': ARCHIVABLE_CATEGORY_FILTER
+}
+
+def archive_batch(connection, table, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move one batch of inactive rows from table into trash_bin
+
+    Returns the number of rows archived.
+    """
+    connection.start_transaction()
+    try:
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute(f"""
+            SELECT * FROM {table}
+            WHERE status = 'inactive'{ARCHIVED_TABLES[table]}
+            ORDER BY id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        """, (batch_size,))
+        rows = cursor.fetchall()
+
+        if rows:
+            cursor.executemany("""
+                INSERT INTO trash_bin (user_id, table_name, record_id, original_data, deleted_at, restore_before)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, [
+                (row['user_id'], table, row['id'], json.dumps(row, default=str),
+                 row['updated_at'], row['updated_at'] + timedelta(days=TRASH_RETENTION_DAYS))
+                for row in rows
+            ])
+            placeholders = ', '.join(['%s'] * len(rows))
+            cursor.execute(f"DELETE FROM {table} WHERE id IN ({placeholders})", [row['id'] for row in rows])
+
+        connection.commit()
+        cursor.close()
+        return len(rows)
+    except Exception:
+        connection.rollback()
+        raise
+
+def purge_batch(connection, batch_size=ARCHIVE_BATCH_SIZE):
+    """Permanently delete one batch of trash past restore_before"""
+    cursor = connection.cursor()
+    # The derived table keeps LIMIT legal in the IN subquery on MySQL and SQLite
+    cursor.execute("""
+        DELETE FROM trash_bin
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id FROM trash_bin
+                WHERE restore_before < CURRENT_TIMESTAMP
+                ORDER BY restore_before
+                LIMIT %s
+            ) expired
+        )
+    """, (batch_size,))
+    purged = cursor.rowcount
+    connection.commit()
+    cursor.close()
+    return purged
+
+def restore_row(cursor, trash_entry):
+    """Reinsert an archived row under its original id, marked active
+
+    Must run inside the caller's transaction; returns the restored row.
+    """
+    table = trash_entry['table_name']
+    if table not in ARCHIVED_TABLES:
+        raise ValueError(f"Cannot restore rows of table {table}")
+
+    row = trash_entry['original_data']
+    if isinstance(row, (str, bytes, bytearray)):
+        row = json.loads(row)
+
+    cursor.execute(f"SHOW COLUMNS FROM {table}")
+    columns = [column['Field'] if isinstance(column, dict) else column[0] for column in cursor.fetchall()]
+    row = {column: row[column] for column in columns if column in row}
+    row['status'] = 'active'
+    row.pop('updated_at', None)
+
+    names = ', '.join(row)
+    placeholders = ', '.join(['%s'] * len(row))
+    cursor.execute(f"INSERT INTO {table} ({names}) VALUES ({placeholders})", list(row.values()))
+    cursor.execute("DELETE FROM trash_bin WHERE id = %s", (trash_entry['id'],))
+    return row
+
+def run_once(connection, batch_size=ARCHIVE_BATCH_SIZE):
+    """Archive every table and purge expired trash, batch by batch"""
+    totals = {'purged': 0}
+    for table in ARCHIVED_TABLES:
+        totals[table] = 0
+        while True:
+            archived = archive_batch(connection, table, batch_size)
+            totals[table] += archived
+            if archived < batch_size:
+                break
+
+    while True:
+        purged = purge_batch(connection, batch_size)
+        totals['purged'] += purged
+        if purged < batch_size:
+            break
+    return totals
+
+def start_background_archiver(get_connection, interval=ARCHIVER_INTERVAL_SECONDS):
+    """Run run_once every interval seconds on a daemon thread"""
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(interval):
+            connection = None
+            try:
+                connection = get_connection()
+                totals = run_once(connection)
+                if any(totals.values()):
+                    logger.info(f"Archiver pass: {totals}")
+            except Exception as e:
+                logger.error(f"Archiver error: {e}")
+            finally:
+                if connection:
+                    connection.close()
+
+    threading.Thread(target=loop, name='trash-archiver', daemon=True).start()
+    return stop
+
+def main():
+    """Run a single archive and purge pass."""
+    from setup_database import get_database_config
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    config = get_database_config()
+    config['database'] = os.getenv('MYSQL_DATABASE', 'spend_tracker')
+
+    connection = None
+    try:
+        connection = mysql.connector.connect(**config)
+        totals = run_once(connection)
+        logger.info(f"Archived {totals['transactions']} transactions, {totals['categories']} categories; "
+                    f"purged {totals['purged']} expired trash rows")
+    except Error as e:
+        logger.error(f"Archiver failed: {e}")
+        sys.exit(1)
+    finally:
+        if connection:
+            connection.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Diff-based audit records
+
+audit_log rows hold JSON, not Python reprs. An INSERT stores a snapshot of
+the audited fields in new_values. An UPDATE or DELETE stores only the fields
+that changed: their previous values in old_values and their new values in
+new_values. An update that changes nothing writes no row.
+
+Any past version of a record can be rebuilt by replaying its rows in id
+order: start from the INSERT snapshot and overlay each new_values. The
+replay reads one record's rows from idx_table_record, so its cost does not
+depend on the size of the log.
+"""
+
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+AUDITED_FIELDS = {
+    'transactions': ('transaction_date', 'category_id', 'description', 'credited', 'debited',
+                     'tags', 'notes', 'status'),
+}
+
+def normalize(value):
+    """JSON-ready form of a column value, so equal values compare equal"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ', timespec='seconds')
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8')
+    return value
+
+def snapshot(table, row):
+    """The audited fields of a row"""
+    return {field: normalize(row[field]) for field in AUDITED_FIELDS[table] if field in row}
+
+def diff(table, old, new):
+    """(old_values, new_values) holding only the audited fields that changed
+
+    Fields missing from new are treated as unchanged.
+    """
+    before, after = {}, {}
+    for field in AUDITED_FIELDS[table]:
+        if field not in new:
+            continue
+        old_value, new_value = normalize(old.get(field)), normalize(new[field])
+        if isinstance(old_value, (int, float)) and isinstance(new_value, (int, float, str)):
+            try:
+                new_value = type(old_value)(new_value)
+            except ValueError:
+                pass
+        if old_value != new_value:
+            before[field] = old_value
+            after[field] = new_value
+    return before, after
+
+def entry(user_id, table, record_id, action, old=None, new=None):
+    """One audit_log row as insert parameters, or None when nothing changed
+
+    INSERT takes the new row; UPDATE and DELETE take the row before and
+    the changed (or deleted) values after. created_at is the database's
+    clock, like every other stamp the handlers write.
+    """
+    if action == 'INSERT':
+        old_values, new_values = None, snapshot(table, new)
+    else:
+        old_values, new_values = diff(table, old, new)
+        if not new_values:
+            return None
+    return (user_id, table, record_id, action,
+            json.dumps(old_values) if old_values is not None else None,
+            json.dumps(new_values))
+
+INSERT_ENTRY = """
+    INSERT INTO audit_log (user_id, table_name, record_id, action, old_values, new_values, created_at)
+    VALUES (%s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+"""
+
+def record(cursor, user_id, table, record_id, action, old=None, new=None):
+    """Write one audit row, skipping updates that changed nothing"""
+    params = entry(user_id, table, record_id, action, old, new)
+    if params:
+        cursor.execute(INSERT_ENTRY, params)
+
+def record_many(cursor, entries):
+    """Write prepared entry() rows in one batched statement"""
+    entries = [params for params in entries if params]
+    if entries:
+        cursor.executemany(INSERT_ENTRY, entries)
+
+def load_values(raw):
+    """Decode a stored old_values/new_values column"""
+    if raw is None:
+        return None
+    if isinstance(raw, dict):
+        return raw
+    if isinstance(raw, (bytes, bytearray)):
+        raw = raw.decode('utf-8')
+    try:
+        values = json.loads(raw)
+    except ValueError:
+        # Rows written before diffs were Python reprs; they carry no usable delta
+        return None
+    return values if isinstance(values, dict) else None
+
+def replay(entries):
+    """Versions of a record after each of its audit rows, oldest first
+
+    entries are dicts with id, action, new_values and created_at, in id
+    order. Each version maps field names to values.
+    """
+    state = {}
+    versions = []
+    for row in entries:
+        values = load_values(row['new_values']) or {}
+        if row['action'] == 'INSERT':
+            state = dict(values)
+        else:
+            state = dict(state, **values)
+        versions.append({'audit_id': row['id'], 'action': row['action'],
+                         'created_at': row['created_at'], 'values': state})
+    return versions
+
+def describe(row):
+    """API shape of one audit row: the changed fields as {field: {from, to}}"""
+    old_values = load_values(row['old_values']) or {}
+    new_values = load_values(row['new_values']) or {}
+    changes = {field: {'from': old_values.get(field), 'to': value} for field, value in new_values.items()}
+    return {
+        'id': row['id'],
+        'table_name': row['table_name'],
+        'record_id': row['record_id'],
+        'action': row['action'],
+        'changes': changes,
+        'created_at': row['created_at']
+    }
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Spend Tracker Duplicate Key Backfill Script
+
+This script fills duplicate_keys with the blocking keys of active
+transactions written before duplicate detection existed. It walks the table
+in primary-key batches, committing after each one. Keys already present are
+left alone, so it is safe to run more than once.
+"""
+
+import mysql.connector
+from mysql.connector import Error
+import os
+import sys
+import argparse
+from dotenv import load_dotenv
+import logging
+
+from setup_database import get_database_config
+from duplicates import index_transactions
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def backfill(batch_size):
+    """Walk active transactions in id order and index their keys"""
+    config = get_database_config()
+    config['database'] = os.getenv('MYSQL_DATABASE', 'spend_tracker')
+
+    try:
+        connection = mysql.connector.connect(**config)
+        cursor = connection.cursor(dictionary=True)
+
+        last_id = 0
+        total = 0
+        while True:
+            cursor.execute("""
+                SELECT id, user_id, transaction_date, description, credited, debited
+                FROM transactions
+                WHERE id > %s AND status = 'active'
+                ORDER BY id
+                LIMIT %s
+            """, (last_id, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            by_user = {}
+            for row in rows:
+                by_user.setdefault(row['user_id'], []).append(row)
+            for user_id, user_rows in by_user.items():
+                index_transactions(cursor, user_id, user_rows)
+            connection.commit()
+
+            total += len(rows)
+            last_id = rows[-1]['id']
+            logger.info(f"Indexed transactions up to id {last_id} ({total} transactions)")
+
+        cursor.close()
+        connection.close()
+        return True
+
+    except Error as e:
+        logger.error(f"Error backfilling duplicate keys: {e}")
+        return False
+
+def main():
+    """Main backfill function."""
+    parser = argparse.ArgumentParser(description='Backfill duplicate_keys from existing transactions')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Transactions per committed batch')
+    args = parser.parse_args()
+
+    logger.info("=== Spend Tracker Duplicate Key Backfill ===")
+
+    if not backfill(args.batch_size):
+        logger.error("Duplicate key backfill failed")
+        sys.exit(1)
+
+    logger.info("=== Duplicate Key Backfill Complete! ===")
+
+if __name__ == "__main__":
+    main()
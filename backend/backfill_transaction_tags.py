@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Spend Tracker Tag Backfill Script
+
+This script populates the transaction_tags junction table from the
+comma-separated transactions.tags column for rows written before tags were
+normalized. It walks the table in primary-key batches, committing after each
+one, and then recomputes tags.usage_count. It is safe to run more than once.
+"""
+
+import mysql.connector
+from mysql.connector import Error
+import os
+import sys
+import argparse
+from dotenv import load_dotenv
+import logging
+
+from setup_database import get_database_config
+from tag_index import parse_tags, resolve_tag_ids
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def backfill_batch(cursor, rows):
+    """Link one batch of (id, user_id, tags) rows to their tags"""
+    by_user = {}
+    for transaction_id, user_id, tags in rows:
+        by_user.setdefault(user_id, []).append((transaction_id, parse_tags(tags)))
+
+    links = []
+    for user_id, items in by_user.items():
+        names = sorted({name for _, transaction_names in items for name in transaction_names})
+        tag_ids = resolve_tag_ids(cursor, names, user_id)
+        links.extend(
+            (transaction_id, tag_ids[name])
+            for transaction_id, transaction_names in items
+            for name in transaction_names
+        )
+
+    if links:
+        cursor.executemany("INSERT IGNORE INTO transaction_tags (transaction_id, tag_id) VALUES (%s, %s)", links)
+    return len(links)
+
+def recompute_usage_counts(cursor):
+    """Set usage_count from the junction table for active transactions"""
+    cursor.execute("""
+        UPDATE tags tg
+        LEFT JOIN (
+            SELECT tt.tag_id, COUNT(*) AS usage_count
+            FROM transaction_tags tt
+            JOIN transactions t ON t.id = tt.transaction_id AND t.status = 'active'
+            GROUP BY tt.tag_id
+        ) counts ON counts.tag_id = tg.id
+        SET tg.usage_count = COALESCE(counts.usage_count, 0)
+    """)
+
+def backfill(batch_size):
+    """Walk transactions in id order and backfill the junction table"""
+    config = get_database_config()
+    config['database'] = os.getenv('MYSQL_DATABASE', 'spend_tracker')
+
+    try:
+        connection = mysql.connector.connect(**config)
+        cursor = connection.cursor()
+
+        last_id = 0
+        total_links = 0
+        while True:
+            cursor.execute("""
+                SELECT id, user_id, tags FROM transactions
+                WHERE id > %s AND status = 'active' AND tags <> ''
+                ORDER BY id
+                LIMIT %s
+            """, (last_id, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            total_links += backfill_batch(cursor, rows)
+            connection.commit()
+
+            last_id = rows[-1][0]
+            logger.info(f"Backfilled transactions up to id {last_id} ({total_links} links)")
+
+        recompute_usage_counts(cursor)
+        connection.commit()
+
+        cursor.close()
+        connection.close()
+        return True
+
+    except Error as e:
+        logger.error(f"Error backfilling tags: {e}")
+        return False
+
+def main():
+    """Main backfill function."""
+    parser = argparse.ArgumentParser(description='Backfill transaction_tags from transactions.tags')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Transactions per committed batch')
+    args = parser.parse_args()
+
+    logger.info("=== Spend Tracker Tag Backfill ===")
+
+    if not backfill(args.batch_size):
+        logger.error("Tag backfill failed")
+        sys.exit(1)
+
+    logger.info("=== Tag Backfill Complete! ===")
+
+if __name__ == "__main__":
+    main()
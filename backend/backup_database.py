@@ -0,0 +1,764 @@
+#!/usr/bin/env python3
+"""
+Spend Tracker Backup and Restore Script
+
+This script writes backups as directories of gzip-compressed NDJSON chunks,
+one JSON array per row, plus a manifest.json. Chunks are dumped by a pool of
+workers, each on its own connection. The workers' connections are read-only
+transactions sharing one consistent snapshot, so a backup is point-in-time
+across every table and chunk. The snapshots are opened under a LOCK TABLES
+... READ on the backed-up tables (the backup user needs the LOCK TABLES
+privilege), which holds writers off only while they are opened; the dump
+itself takes no locks. Without the privilege the snapshots are opened
+unsynchronized, a warning is logged and the manifest records
+"point_in_time": false. The snapshots stay open for the whole run, so a long
+backup holds back InnoDB purge as mysqldump --single-transaction does.
+
+A full backup splits each table into primary-key ranges that are dumped in
+parallel. An incremental backup reads only the rows changed since the
+previous run's watermark, walking the (updated_at, id) or (created_at, id)
+index. It also records the ids still present, so a restore can apply hard
+deletes. Watermarks are database time, and each scan starts
+BACKUP_WATERMARK_SLACK_SECONDS before the previous one. Writes committed
+while a backup runs are therefore picked up again by the next run. Every
+run is recorded in backup_info.
+
+A restore follows the chain of manifests from the full backup to the
+requested one. It creates any tables missing from the target database and
+drops the secondary indexes it can. It bulk loads the chunks in parallel
+with foreign key and unique checks off, then rebuilds the indexes once at
+the end. Restore into a fresh database (--database) and point the app at
+it; the live tables are never touched.
+
+Usage:
+    python backup_database.py backup --type full|incremental|transaction_only
+    python backup_database.py restore backups/20240101_020000_full --database spend_tracker_restore
+    python backup_database.py list
+"""
+
+import mysql.connector
+from mysql.connector import Error
+import os
+import sys
+import argparse
+import gzip
+import json
+import queue
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from dotenv import load_dotenv
+import logging
+
+from setup_database import get_database_config
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+BACKUP_DIR = os.getenv('BACKUP_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backups'))
+BACKUP_WORKERS = int(os.getenv('BACKUP_WORKERS', 4))
+BACKUP_CHUNK_ROWS = int(os.getenv('BACKUP_CHUNK_ROWS', 500000))
+BACKUP_BATCH_ROWS = int(os.getenv('BACKUP_BATCH_ROWS', 5000))
+BACKUP_WATERMARK_SLACK_SECONDS = int(os.getenv('BACKUP_WATERMARK_SLACK_SECONDS', 300))
+BACKUP_COMPRESS_LEVEL = int(os.getenv('BACKUP_COMPRESS_LEVEL', 6))
+BACKUP_LOCK_WAIT_SECONDS = int(os.getenv('BACKUP_LOCK_WAIT_SECONDS', 10))
+
+MANIFEST = 'manifest.json'
+BACKUP_LOCK = 'spend_tracker_backup'
+
+# How each table is backed up incrementally:
+#   since:    rows with this timestamp at or after the watermark, plus the
+#             ids still present so that deletes can be replayed
+#   children: rows belonging to transactions changed since the watermark;
+#             a restore replaces all rows of those transactions
+#   full:     small or derived tables, dumped whole every time
+# Sessions, export jobs, metrics and backup_info itself are not backed up.
+TABLES = {
+    'users': {'since': 'updated_at'},
+    'categories': {'since': 'updated_at'},
+    'category_closure': {'full': True},
+    'recurring_transactions': {'since': 'updated_at'},
+    'transactions': {'since': 'updated_at'},
+    'transaction_tags': {'children': 'transaction_id'},
+    'transaction_anomalies': {'children': 'transaction_id'},
+    'duplicate_keys': {'children': 'transaction_id'},
+    'goals': {'since': 'updated_at'},
+    'tags': {'since': 'updated_at'},
+    'audit_log': {'since': 'created_at'},
+    'category_stats': {'full': True},
+    'category_token_counts': {'full': True},
+    'exchange_rates': {'full': True},
+    'trash_bin': {'full': True},
+}
+TRANSACTION_TABLES = ('transactions', 'transaction_tags', 'transaction_anomalies', 'duplicate_keys')
+
+def connect(database=None):
+    """A connection in UTC, so TIMESTAMP values round-trip unchanged"""
+    config = get_database_config()
+    config['database'] = database or os.getenv('MYSQL_DATABASE', 'spend_tracker')
+    connection = mysql.connector.connect(**config)
+    cursor = connection.cursor()
+    cursor.execute("SET time_zone = '+00:00'")
+    cursor.close()
+    return connection
+
+def encode_value(value):
+    """JSON form of column values json cannot encode itself"""
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8')
+    if isinstance(value, timedelta):
+        return str(value)
+    raise TypeError(f"Cannot back up value of type {type(value).__name__}")
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+# ---------------------------------------------------------------------------
+# Table metadata
+
+def describe_table(cursor, database, table):
+    """Stored columns, primary key and CREATE statement of a table"""
+    cursor.execute("""
+        SELECT COLUMN_NAME, EXTRA FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s
+        ORDER BY ORDINAL_POSITION
+    """, (database, table))
+    # Generated columns are computed again on load
+    columns = [name for name, extra in cursor.fetchall() if 'GENERATED' not in (extra or '').upper()]
+
+    cursor.execute("""
+        SELECT COLUMN_NAME FROM information_schema.KEY_COLUMN_USAGE
+        WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND CONSTRAINT_NAME = 'PRIMARY'
+        ORDER BY ORDINAL_POSITION
+    """, (database, table))
+    key = [row[0] for row in cursor.fetchall()]
+
+    cursor.execute(f"SHOW CREATE TABLE `{table}`")
+    create = cursor.fetchone()[1]
+    return {'columns': columns, 'key': key, 'create': create}
+
+def has_integer_id(meta):
+    return meta['key'] == ['id']
+
+def column_list(columns):
+    return ', '.join(f"`{column}`" for column in columns)
+
+def keyset_after(key, after):
+    """WHERE fragment and params for rows after a key tuple"""
+    if after is None:
+        return "", []
+    if len(key) == 1:
+        return f" AND `{key[0]}` > %s", [after[0]]
+    return f" AND ({column_list(key)}) > ({', '.join(['%s'] * len(key))})", list(after)
+
+# ---------------------------------------------------------------------------
+# Backup
+
+class ChunkWriter:
+    """Writes rows to numbered gzip chunks, starting a new one every
+    BACKUP_CHUNK_ROWS rows. Chunks are renamed into place when closed."""
+
+    def __init__(self, directory, table, index=0):
+        self.directory = directory
+        self.table = table
+        self.index = index
+        self.file = None
+        self.rows = 0
+        self.chunks = []
+
+    def _open(self):
+        name = f"{self.table}.{self.index:05d}.ndjson.gz"
+        self.name = name
+        self.file = gzip.open(os.path.join(self.directory, name + '.part'), 'wt',
+                              encoding='utf-8', compresslevel=BACKUP_COMPRESS_LEVEL)
+        self.rows = 0
+
+    def _finish(self):
+        self.file.close()
+        path = os.path.join(self.directory, self.name)
+        os.replace(path + '.part', path)
+        self.chunks.append({'file': self.name, 'rows': self.rows, 'bytes': os.path.getsize(path)})
+        self.file = None
+        self.index += 1
+
+    def write(self, rows):
+        for row in rows:
+            if self.file is None:
+                self._open()
+            self.file.write(json.dumps(row, default=encode_value, separators=(',', ':')) + '\n')
+            self.rows += 1
+            if self.rows >= BACKUP_CHUNK_ROWS:
+                self._finish()
+
+    def close(self):
+        if self.file is not None:
+            self._finish()
+        return self.chunks
+
+class SnapshotReader:
+    """A read-only connection inside one consistent snapshot"""
+
+    def __init__(self):
+        self.connection = connect()
+        self.connection.start_transaction(consistent_snapshot=True, isolation_level='REPEATABLE READ',
+                                          readonly=True)
+        self.cursor = self.connection.cursor()
+
+    def close(self):
+        self.cursor.close()
+        self.connection.rollback()
+        self.connection.close()
+
+    def batches(self, table, columns, key, where="", params=()):
+        """Yield batches of rows in key order; key columns must be selected"""
+        positions = [columns.index(column) for column in key]
+        after = None
+        while True:
+            condition, after_params = keyset_after(key, after)
+            self.cursor.execute(f"""
+                SELECT {column_list(columns)} FROM `{table}`
+                WHERE 1 = 1{where}{condition}
+                ORDER BY {column_list(key)}
+                LIMIT %s
+            """, [*params, *after_params, BACKUP_BATCH_ROWS])
+            rows = self.cursor.fetchall()
+            if not rows:
+                return
+            yield rows
+            if len(rows) < BACKUP_BATCH_ROWS:
+                return
+            after = [rows[-1][position] for position in positions]
+
+class SharedSnapshot:
+    """Readers that all see the database as of the same instant
+
+    Every read view is opened while this session holds LOCK TABLES ... READ
+    on the given tables. Writers to them have committed or are waiting, so
+    all views see the same rows. Writers queue behind a pending lock, so it
+    waits at most BACKUP_LOCK_WAIT_SECONDS for open transactions before the
+    snapshots are opened without it. Worker threads borrow a reader per
+    task; a connection is never used by two threads at once.
+    """
+
+    def __init__(self, tables, count):
+        self.readers = queue.Queue()
+        self.point_in_time = True
+        barrier = connect()
+        cursor = barrier.cursor()
+        try:
+            try:
+                cursor.execute("SET SESSION lock_wait_timeout = %s", (BACKUP_LOCK_WAIT_SECONDS,))
+                cursor.execute("LOCK TABLES " + ', '.join(f"`{table}` READ" for table in tables))
+            except Error as e:
+                logger.warning(f"Cannot lock tables ({e}); chunks are not from one point in time")
+                self.point_in_time = False
+            for _ in range(count):
+                self.readers.put(SnapshotReader())
+        except Exception:
+            self.close()
+            raise
+        finally:
+            if self.point_in_time:
+                cursor.execute("UNLOCK TABLES")
+            cursor.close()
+            barrier.close()
+
+    @contextmanager
+    def borrow(self):
+        reader = self.readers.get()
+        try:
+            yield reader
+        finally:
+            self.readers.put(reader)
+
+    def close(self):
+        while not self.readers.empty():
+            self.readers.get().close()
+
+def dump_range(snapshot, directory, table, meta, index, low, high):
+    """Full dump of one primary-key range of an id table into one chunk"""
+    writer = ChunkWriter(directory, table, index)
+    with snapshot.borrow() as reader:
+        for rows in reader.batches(table, meta['columns'], ['id'], " AND id BETWEEN %s AND %s", (low, high)):
+            writer.write(rows)
+    return writer.close()
+
+def dump_table(snapshot, directory, table, meta):
+    """Full dump of a table in primary-key order"""
+    writer = ChunkWriter(directory, table)
+    # Key columns that are not stored (generated) are read for the keyset only
+    columns = meta['columns'] + [column for column in meta['key'] if column not in meta['columns']]
+    width = len(meta['columns'])
+    with snapshot.borrow() as reader:
+        for rows in reader.batches(table, columns, meta['key']):
+            writer.write([row[:width] for row in rows])
+    return writer.close()
+
+def write_ranges(path, ranges):
+    with gzip.open(path, 'wt', encoding='utf-8', compresslevel=BACKUP_COMPRESS_LEVEL) as file:
+        json.dump(ranges, file, separators=(',', ':'))
+
+def read_ranges(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as file:
+        return json.load(file)
+
+def collect_ranges(ranges, ids):
+    """Append sorted ids to a list of [first, last] runs"""
+    for value in ids:
+        if ranges and ranges[-1][1] == value - 1:
+            ranges[-1][1] = value
+        else:
+            ranges.append([value, value])
+    return ranges
+
+def dump_changed(snapshot, directory, table, meta, since_column, since):
+    """Rows changed since the watermark, then the ids still present"""
+    writer = ChunkWriter(directory, table)
+    ranges = []
+    with snapshot.borrow() as reader:
+        for rows in reader.batches(table, meta['columns'], [since_column, 'id'],
+                                   f" AND `{since_column}` >= %s", (since,)):
+            writer.write(rows)
+        for rows in reader.batches(table, ['id'], ['id']):
+            collect_ranges(ranges, [row[0] for row in rows])
+    keys = f"{table}.keys.json.gz"
+    write_ranges(os.path.join(directory, keys), ranges)
+    return writer.close(), keys
+
+def dump_children(snapshot, directory, table, meta, parent_column, since):
+    """All rows of the transactions changed since the watermark"""
+    writer = ChunkWriter(directory, table)
+    changed = []
+    with snapshot.borrow() as reader:
+        for parents in reader.batches('transactions', ['updated_at', 'id'], ['updated_at', 'id'],
+                                      " AND updated_at >= %s", (since,)):
+            parent_ids = sorted(row[1] for row in parents)
+            placeholders = ', '.join(['%s'] * len(parent_ids))
+            reader.cursor.execute(f"""
+                SELECT {column_list(meta['columns'])} FROM `{table}`
+                WHERE `{parent_column}` IN ({placeholders})
+            """, parent_ids)
+            writer.write(reader.cursor.fetchall())
+            changed.extend(parent_ids)
+    replaced = f"{table}.replaced.json.gz"
+    write_ranges(os.path.join(directory, replaced), collect_ranges([], sorted(changed)))
+    return writer.close(), replaced
+
+def find_parent(cursor):
+    """The newest completed full or incremental backup still on disk"""
+    cursor.execute("""
+        SELECT id, file_path, watermark FROM backup_info
+        WHERE status = 'completed' AND backup_type IN ('full', 'incremental')
+        ORDER BY id DESC
+        LIMIT 1
+    """)
+    parent = cursor.fetchone()
+    if parent and not os.path.isfile(os.path.join(parent['file_path'], MANIFEST)):
+        logger.warning(f"Previous backup {parent['file_path']} is missing")
+        return None
+    return parent
+
+def plan_tasks(pool, snapshot, directory, metas, since):
+    """Submit the dump tasks of every table; returns {table: [futures]}"""
+    futures = {}
+    for table, meta in metas.items():
+        spec = TABLES[table]
+        if since is not None and 'since' in spec:
+            futures[table] = [pool.submit(dump_changed, snapshot, directory, table, meta, spec['since'], since)]
+        elif since is not None and 'children' in spec:
+            futures[table] = [pool.submit(dump_children, snapshot, directory, table, meta, spec['children'], since)]
+        elif has_integer_id(meta):
+            # Ranges come from the snapshot, so no row it sees falls outside them
+            with snapshot.borrow() as reader:
+                reader.cursor.execute(f"SELECT MIN(id), MAX(id) FROM `{table}`")
+                low, high = reader.cursor.fetchone()
+            futures[table] = [
+                pool.submit(dump_range, snapshot, directory, table, meta, index, start,
+                            start + BACKUP_CHUNK_ROWS - 1)
+                for index, start in enumerate(range(low, high + 1, BACKUP_CHUNK_ROWS))
+            ] if low is not None else []
+        else:
+            futures[table] = [pool.submit(dump_table, snapshot, directory, table, meta)]
+    return futures
+
+def backup(backup_type, workers):
+    """Take one backup and record it in backup_info"""
+    database = os.getenv('MYSQL_DATABASE', 'spend_tracker')
+    connection = connect()
+    connection.autocommit = True
+    cursor = connection.cursor(dictionary=True)
+
+    # One backup at a time, across hosts
+    cursor.execute("SELECT GET_LOCK(%s, 0) AS acquired", (BACKUP_LOCK,))
+    if not cursor.fetchone()['acquired']:
+        logger.error("Another backup is running")
+        cursor.close()
+        connection.close()
+        return False
+
+    parent = None
+    if backup_type == 'incremental':
+        parent = find_parent(cursor)
+        if parent is None:
+            logger.warning("No completed backup to build on; taking a full backup instead")
+            backup_type = 'full'
+
+    # Read before the snapshot opens, so the next run re-reads rather than
+    # skips anything written in between
+    cursor.execute("SELECT NOW() AS now")
+    watermark = cursor.fetchone()['now']
+    since = parent['watermark'] - timedelta(seconds=BACKUP_WATERMARK_SLACK_SECONDS) if parent else None
+    directory = os.path.join(BACKUP_DIR, f"{watermark:%Y%m%d_%H%M%S}_{backup_type}")
+
+    cursor.execute("""
+        INSERT INTO backup_info (backup_type, parent_id, file_path, start_time, watermark, status)
+        VALUES (%s, %s, %s, %s, %s, 'running')
+    """, (backup_type, parent['id'] if parent else None, directory, watermark, watermark))
+    backup_id = cursor.lastrowid
+    logger.info(f"Backup {backup_id}: {backup_type} into {directory}"
+                + (f", changes since {since}" if since else ""))
+
+    snapshot = None
+    try:
+        os.makedirs(directory)
+        tables = TRANSACTION_TABLES if backup_type == 'transaction_only' else list(TABLES)
+        plain = connection.cursor()
+        metas = {table: describe_table(plain, database, table) for table in tables}
+        plain.close()
+        snapshot = SharedSnapshot(tables, workers)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = plan_tasks(pool, snapshot, directory, metas, since)
+            manifest_tables = {}
+            for table, table_futures in futures.items():
+                chunks, keys_file = [], None
+                for future in table_futures:
+                    result = future.result()
+                    if isinstance(result, tuple):
+                        result, keys_file = result
+                    chunks.extend(result)
+                entry = {
+                    'columns': metas[table]['columns'],
+                    'create': metas[table]['create'],
+                    'mode': 'full' if since is None or TABLES[table].get('full') else 'changes',
+                    'chunks': sorted(chunks, key=lambda chunk: chunk['file']),
+                    'rows': sum(chunk['rows'] for chunk in chunks)
+                }
+                if keys_file:
+                    entry['replaced' if 'children' in TABLES[table] else 'keys'] = keys_file
+                manifest_tables[table] = entry
+                logger.info(f"  {table}: {entry['rows']} rows in {len(chunks)} chunks")
+
+        row_count = sum(entry['rows'] for entry in manifest_tables.values())
+        manifest = {
+            'id': backup_id,
+            'type': backup_type,
+            'parent': os.path.basename(parent['file_path']) if parent else None,
+            'database': database,
+            'watermark': watermark.isoformat(sep=' '),
+            'since': since.isoformat(sep=' ') if since else None,
+            'point_in_time': snapshot.point_in_time,
+            'tables': manifest_tables
+        }
+        with open(os.path.join(directory, MANIFEST), 'w', encoding='utf-8') as file:
+            json.dump(manifest, file, indent=2)
+
+        file_size = directory_size(directory)
+        cursor.execute("""
+            UPDATE backup_info
+            SET status = 'completed', end_time = NOW(), file_size = %s, row_count = %s
+            WHERE id = %s
+        """, (file_size, row_count, backup_id))
+        logger.info(f"Backup {backup_id} completed: {row_count} rows, {file_size} bytes")
+        return True
+
+    except Exception as e:
+        logger.error(f"Backup {backup_id} failed: {e}")
+        cursor.execute("""
+            UPDATE backup_info SET status = 'failed', end_time = NOW(), error_message = %s
+            WHERE id = %s
+        """, (str(e), backup_id))
+        shutil.rmtree(directory, ignore_errors=True)
+        return False
+
+    finally:
+        if snapshot:
+            snapshot.close()
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (BACKUP_LOCK,))
+        cursor.fetchall()
+        cursor.close()
+        connection.close()
+
+# ---------------------------------------------------------------------------
+# Restore
+
+def load_chain(path):
+    """Manifests from the full backup up to the one at path, oldest first"""
+    chain = []
+    while path:
+        with open(os.path.join(path, MANIFEST), encoding='utf-8') as file:
+            manifest = json.load(file)
+        manifest['path'] = path
+        chain.append(manifest)
+        path = os.path.join(os.path.dirname(path), manifest['parent']) if manifest['parent'] else None
+    return list(reversed(chain))
+
+def deferrable_indexes(cursor, database, table):
+    """ALTER clauses to drop and to re-add the secondary indexes of a table
+
+    One index per foreign key column is kept, since InnoDB refuses to drop
+    the index a foreign key uses.
+    """
+    cursor.execute(f"SHOW INDEX FROM `{table}`")
+    names = [column[0] for column in cursor.description]
+    indexes = {}
+    for row in cursor.fetchall():
+        row = dict(zip(names, row))
+        index = indexes.setdefault(row['Key_name'], {
+            'unique': not row['Non_unique'], 'type': row['Index_type'], 'columns': []
+        })
+        index['columns'].append((row['Seq_in_index'], row['Column_name'], row['Sub_part']))
+    for index in indexes.values():
+        index['columns'].sort()
+
+    cursor.execute("""
+        SELECT COLUMN_NAME FROM information_schema.KEY_COLUMN_USAGE
+        WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND REFERENCED_TABLE_NAME IS NOT NULL
+    """, (database, table))
+    keep = {'PRIMARY'}
+    for (column,) in cursor.fetchall():
+        candidates = [(len(index['columns']), name) for name, index in indexes.items()
+                      if index['columns'][0][1] == column]
+        if candidates and not any(name in keep for _, name in candidates):
+            keep.add(min(candidates)[1])
+
+    drops, adds = [], []
+    for name, index in indexes.items():
+        if name in keep:
+            continue
+        parts = ', '.join(f"`{column}`" + (f"({sub_part})" if sub_part else "")
+                          for _, column, sub_part in index['columns'])
+        kind = 'FULLTEXT INDEX' if index['type'] == 'FULLTEXT' else ('UNIQUE INDEX' if index['unique'] else 'INDEX')
+        drops.append(f"DROP INDEX `{name}`")
+        adds.append(f"ADD {kind} `{name}` ({parts})")
+    return drops, adds
+
+def loader_connection(database):
+    connection = connect(database)
+    cursor = connection.cursor()
+    cursor.execute("SET SESSION foreign_key_checks = 0, unique_checks = 0")
+    cursor.close()
+    return connection
+
+def load_chunk(database, path, table, columns, upsert):
+    """Insert one chunk in BACKUP_BATCH_ROWS multi-row statements"""
+    query = f"INSERT INTO `{table}` ({column_list(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+    if upsert:
+        query += " ON DUPLICATE KEY UPDATE " + ', '.join(f"`{c}` = VALUES(`{c}`)" for c in columns)
+
+    connection = loader_connection(database)
+    try:
+        cursor = connection.cursor()
+        rows, loaded = [], 0
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            for line in file:
+                rows.append(json.loads(line))
+                if len(rows) >= BACKUP_BATCH_ROWS:
+                    cursor.executemany(query, rows)
+                    connection.commit()
+                    loaded += len(rows)
+                    rows = []
+        if rows:
+            cursor.executemany(query, rows)
+            connection.commit()
+            loaded += len(rows)
+        cursor.close()
+        return loaded
+    finally:
+        connection.close()
+
+def delete_outside(cursor, table, column, ranges):
+    """Delete rows whose column value lies outside the given runs"""
+    if not ranges:
+        cursor.execute(f"DELETE FROM `{table}`")
+        return
+    cursor.execute(f"DELETE FROM `{table}` WHERE `{column}` < %s OR `{column}` > %s",
+                   (ranges[0][0], ranges[-1][1]))
+    gaps = [(ranges[i][1] + 1, ranges[i + 1][0] - 1) for i in range(len(ranges) - 1)]
+    if gaps:
+        cursor.executemany(f"DELETE FROM `{table}` WHERE `{column}` BETWEEN %s AND %s", gaps)
+
+def delete_within(cursor, table, column, ranges):
+    if ranges:
+        cursor.executemany(f"DELETE FROM `{table}` WHERE `{column}` BETWEEN %s AND %s",
+                           [tuple(run) for run in ranges])
+
+def apply_backup(pool, connection, database, manifest):
+    """Load one backup of the chain on top of the tables"""
+    cursor = connection.cursor()
+    tables = manifest['tables']
+
+    # Clear what this backup replaces before loading it
+    for table, entry in tables.items():
+        if entry['mode'] == 'full' and manifest['parent']:
+            cursor.execute(f"DELETE FROM `{table}`")
+        elif entry.get('replaced'):
+            delete_within(cursor, table, TABLES[table]['children'],
+                          read_ranges(os.path.join(manifest['path'], entry['replaced'])))
+    connection.commit()
+
+    futures = [
+        pool.submit(load_chunk, database, os.path.join(manifest['path'], chunk['file']), table,
+                    entry['columns'], entry['mode'] == 'changes')
+        for table, entry in tables.items()
+        for chunk in entry['chunks']
+    ]
+    loaded = sum(future.result() for future in futures)
+
+    # Replay hard deletes: ids gone from a table, and rows of gone transactions
+    for table, entry in tables.items():
+        if entry.get('keys'):
+            delete_outside(cursor, table, 'id', read_ranges(os.path.join(manifest['path'], entry['keys'])))
+    transactions = tables.get('transactions', {})
+    if transactions.get('keys'):
+        live = read_ranges(os.path.join(manifest['path'], transactions['keys']))
+        for table, entry in tables.items():
+            if 'children' in TABLES[table] and entry['mode'] == 'changes':
+                delete_outside(cursor, table, TABLES[table]['children'], live)
+    connection.commit()
+    cursor.close()
+    return loaded
+
+def restore(path, database, workers, truncate):
+    """Restore the backup at path, and the backups it builds on, into database"""
+    path = os.path.abspath(path.rstrip('/'))
+    chain = load_chain(path)
+    tables = chain[-1]['tables']
+    logger.info(f"Restoring {len(chain)} backup(s) into {database}: "
+                + ', '.join(os.path.basename(manifest['path']) for manifest in chain))
+
+    config = get_database_config()
+    server = mysql.connector.connect(**config)
+    server_cursor = server.cursor()
+    server_cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{database}` CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
+    server_cursor.close()
+    server.close()
+
+    connection = loader_connection(database)
+    cursor = connection.cursor()
+    deferred = {}
+    try:
+        for table in tables:
+            cursor.execute("SHOW TABLES LIKE %s", (table,))
+            if not cursor.fetchall():
+                cursor.execute(tables[table]['create'])
+                continue
+            cursor.execute(f"SELECT 1 FROM `{table}` LIMIT 1")
+            if cursor.fetchall():
+                if not truncate:
+                    logger.error(f"Table {table} in {database} is not empty; use --truncate to replace its rows")
+                    return False
+                cursor.execute(f"TRUNCATE TABLE `{table}`")
+
+        # Defer secondary indexes; rebuilding once is far cheaper than
+        # maintaining them row by row
+        for table in tables:
+            drops, adds = deferrable_indexes(cursor, database, table)
+            if drops:
+                logger.info(f"  {table}: to rebuild by hand if interrupted: ALTER TABLE `{table}` {', '.join(adds)}")
+                cursor.execute(f"ALTER TABLE `{table}` {', '.join(drops)}")
+                deferred[table] = adds
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for manifest in chain:
+                loaded = apply_backup(pool, connection, database, manifest)
+                logger.info(f"Applied {os.path.basename(manifest['path'])}: {loaded} rows")
+        return True
+
+    except (Error, OSError) as e:
+        logger.error(f"Error restoring backup: {e}")
+        return False
+
+    finally:
+        for table, adds in deferred.items():
+            logger.info(f"Rebuilding indexes of {table}")
+            cursor.execute(f"ALTER TABLE `{table}` {', '.join(adds)}")
+        cursor.close()
+        connection.close()
+
+# ---------------------------------------------------------------------------
+
+def list_backups(limit):
+    connection = connect()
+    cursor = connection.cursor(dictionary=True)
+    cursor.execute("""
+        SELECT id, backup_type, parent_id, file_path, file_size, row_count, start_time, end_time, status
+        FROM backup_info
+        ORDER BY id DESC
+        LIMIT %s
+    """, (limit,))
+    for row in cursor.fetchall():
+        duration = (row['end_time'] - row['start_time']).total_seconds() if row['end_time'] else None
+        logger.info(f"#{row['id']} {row['backup_type']:<16} {row['status']:<9} {row['start_time']} "
+                    f"parent={row['parent_id']} rows={row['row_count']} bytes={row['file_size']} "
+                    f"seconds={duration} {row['file_path']}")
+    cursor.close()
+    connection.close()
+    return True
+
+def main():
+    """Main backup function."""
+    parser = argparse.ArgumentParser(description='Back up and restore the Spend Tracker database')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    backup_parser = commands.add_parser('backup', help='Take a backup')
+    backup_parser.add_argument('--type', choices=['full', 'incremental', 'transaction_only'], default='incremental',
+                               help='incremental falls back to full when there is nothing to build on')
+    backup_parser.add_argument('--workers', type=int, default=BACKUP_WORKERS)
+
+    restore_parser = commands.add_parser('restore', help='Restore a backup and the backups it builds on')
+    restore_parser.add_argument('path', help='Backup directory')
+    restore_parser.add_argument('--database', required=True, help='Target database, created if missing')
+    restore_parser.add_argument('--workers', type=int, default=BACKUP_WORKERS)
+    restore_parser.add_argument('--truncate', action='store_true', help='Replace rows already in the target tables')
+
+    list_parser = commands.add_parser('list', help='Show recent backups')
+    list_parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    if os.getenv('STORAGE_BACKEND', 'mysql').lower() == 'sqlite':
+        logger.error("This tool backs up MySQL; back up a SQLite database with sqlite3 .backup")
+        sys.exit(1)
+
+    logger.info("=== Spend Tracker Backup ===")
+
+    if args.command == 'backup':
+        ok = backup(args.type, args.workers)
+    elif args.command == 'restore':
+        ok = restore(args.path, args.database, args.workers, args.truncate)
+    else:
+        ok = list_backups(args.limit)
+
+    if not ok:
+        logger.error(f"{args.command.capitalize()} failed")
+        sys.exit(1)
+
+    logger.info("=== Done ===")
+
+if __name__ == "__main__":
+    main()
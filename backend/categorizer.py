@@ -0,0 +1,407 @@
+"""
+Automatic transaction categorization
+
+category_token_counts holds, per user, how often each description word
+appeared in each category, plus the number of transactions per category
+under the empty token. Every insert, correction and delete adjusts those
+counts with batched atomic UPDATEs, so the model retrains incrementally as
+users fix categories. rebuild_category_model.py recomputes it from history.
+
+A user's counts are loaded once into a Model: a multinomial naive Bayes
+over description words and the transaction's direction, plus compiled
+keyword rules. Words that almost always land in one category become rules
+of their own, and a built-in keyword list covers the system categories
+before a user has history. All rules are matched in one pass over the
+description's word n-grams through a dict. Predictions are cached per
+distinct description, so batch mode pays for each one once.
+
+Loaded models are kept for CATEGORIZER_CACHE_SECONDS. Writes from this
+process replace the cached model with an updated copy; those from other
+processes show up when it is reloaded.
+"""
+
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict, defaultdict
+
+from duplicates import STOPWORDS
+
+CATEGORIZER_MIN_CONFIDENCE = float(os.getenv('CATEGORIZER_MIN_CONFIDENCE', 0.6))
+CATEGORIZER_CACHE_SECONDS = int(os.getenv('CATEGORIZER_CACHE_SECONDS', 300))
+CATEGORIZER_CACHE_USERS = int(os.getenv('CATEGORIZER_CACHE_USERS', 256))
+# A word becomes a rule after this many transactions, nearly all in one category
+RULE_MIN_SUPPORT = 5
+RULE_MIN_PURITY = 0.95
+# Confidence of a built-in keyword match
+KEYWORD_CONFIDENCE = 0.75
+# Laplace smoothing of word counts
+ALPHA = 1.0
+MAX_TOKEN_LENGTH = 50
+MAX_FEATURES = 12
+MEMO_SIZE = 50000
+
+# The empty token counts transactions; direction tokens cannot clash with
+# words, which are letters only
+DOCUMENT = ''
+CREDIT = '~credit'
+DEBIT = '~debit'
+
+# Cold-start keywords for the system categories, matched as whole words
+KEYWORDS = {
+    'Salary': ['payroll', 'salary', 'wages', 'direct deposit'],
+    'Freelance': ['upwork', 'fiverr', 'invoice'],
+    'Investments': ['dividend', 'brokerage', 'vanguard', 'fidelity'],
+    'Food & Dining': ['restaurant', 'cafe', 'coffee', 'starbucks', 'mcdonald', 'pizza', 'bakery',
+                      'grocery', 'groceries', 'supermarket', 'doordash', 'grubhub', 'ubereats',
+                      'whole foods', 'trader joe', 'kroger', 'safeway'],
+    'Transportation': ['uber', 'lyft', 'taxi', 'fuel', 'gas station', 'shell', 'chevron', 'exxon',
+                       'parking', 'transit', 'metro', 'toll'],
+    'Shopping': ['amazon', 'walmart', 'target', 'ebay', 'ikea', 'best buy', 'costco'],
+    'Entertainment': ['netflix', 'spotify', 'hulu', 'disney', 'cinema', 'theater', 'steam'],
+    'Bills & Utilities': ['electric', 'electricity', 'utility', 'utilities', 'water bill', 'internet',
+                          'comcast', 'verizon', 'phone bill'],
+    'Healthcare': ['pharmacy', 'walgreens', 'cvs', 'dental', 'dentist', 'doctor', 'hospital', 'clinic'],
+    'Education': ['tuition', 'coursera', 'udemy', 'textbook', 'bookstore'],
+    'Travel': ['airline', 'airlines', 'hotel', 'airbnb', 'expedia', 'booking com'],
+    'Home & Garden': ['rent', 'mortgage', 'home depot', 'lowes'],
+    'Personal Care': ['salon', 'barber', 'gym', 'spa', 'fitness'],
+    'Gifts & Donations': ['donation', 'charity'],
+    'Taxes': ['irs', 'tax'],
+    'Insurance': ['insurance', 'geico', 'allstate'],
+    'Bank Fees': ['atm fee', 'overdraft', 'service charge', 'monthly fee'],
+}
+
+WORD = re.compile(r'[a-z]{2,}')
+
+def words(description):
+    """Lowercase letter-only words of a description, in order, without accents"""
+    text = str(description or '')
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode()
+    return WORD.findall(text.lower())
+
+def features(description_words):
+    """Distinct model words of a description: no stopwords, first seen first"""
+    seen = []
+    for word in description_words:
+        if word not in STOPWORDS and word not in seen:
+            seen.append(word[:MAX_TOKEN_LENGTH])
+            if len(seen) == MAX_FEATURES:
+                break
+    return seen
+
+def direction(credited, debited):
+    return CREDIT if float(credited or 0) > float(debited or 0) else DEBIT
+
+class KeywordMatcher:
+    """Many word and phrase patterns matched in one pass
+
+    patterns maps tuples of words to a target. Matching looks up every
+    n-gram of the description up to the longest pattern, so its cost depends
+    on the description's length, not on the number of patterns. The first,
+    then longest, match wins.
+    """
+
+    def __init__(self, patterns, lengths=None):
+        self.patterns = patterns
+        self.lengths = lengths or sorted({len(phrase) for phrase in patterns}, reverse=True)
+
+    def match(self, description_words):
+        for start in range(len(description_words)):
+            for length in self.lengths:
+                target = self.patterns.get(tuple(description_words[start:start + length]))
+                if target is not None:
+                    return target
+        return None
+
+class Model:
+    """A user's word counts, compiled for prediction
+
+    A category's score is log P(category) - k * norm[category] plus the
+    weights of the description's k known words in that category, which is
+    the smoothed naive Bayes log-likelihood up to a constant. Only the words
+    actually seen in a category carry a weight, so scoring reads a few short
+    postings.
+    """
+
+    def __init__(self, counts, categories):
+        # counts maps (token, category_id) to a count; categories maps the
+        # active category ids the user can see to is_income
+        self.categories = categories
+        self.documents = {}
+        self.postings = defaultdict(dict)
+        for (token, category_id), count in counts.items():
+            if count <= 0 or category_id not in categories:
+                continue
+            if token == DOCUMENT:
+                self.documents[category_id] = count
+            else:
+                self.postings[token][category_id] = count
+        self.postings = dict(self.postings)
+        self.totals = Counter()
+        for posting in self.postings.values():
+            for category_id, count in posting.items():
+                self.totals[category_id] += count
+        self.weights = {}
+        self.learned = {}
+        for token in self.postings:
+            self.compile_token(token)
+        self.compile_categories()
+        self.loaded_at = time.monotonic()
+
+    def compile_token(self, token):
+        """Weights of one word, and whether it is a rule"""
+        posting = self.postings.get(token)
+        self.learned.pop((token,), None)
+        if not posting:
+            self.weights.pop(token, None)
+            return
+        self.weights[token] = [(category_id, math.log((count + ALPHA) / ALPHA))
+                               for category_id, count in posting.items()]
+        if not token.startswith('~'):
+            support = sum(posting.values())
+            category_id, count = max(posting.items(), key=lambda item: item[1])
+            if support >= RULE_MIN_SUPPORT and count / support >= RULE_MIN_PURITY:
+                self.learned[(token,)] = (category_id, count / support)
+
+    def compile_categories(self):
+        """Priors and normalizers, which depend on every count"""
+        documents = sum(self.documents.values())
+        vocabulary = len(self.postings) or 1
+        self.prior = {category_id: math.log(count / documents) for category_id, count in self.documents.items()}
+        self.norm = {category_id: math.log(self.totals[category_id] + ALPHA * vocabulary)
+                     for category_id in self.prior}
+        self.rules = KeywordMatcher(self.learned, [1])
+        self.memo = {}
+
+    def updated(self, delta):
+        """A copy with a (token, category_id) -> change Counter applied
+
+        Models in use are never modified. Only the changed words are
+        recompiled; the rest of the tables are shared shallow copies.
+        """
+        model = Model.__new__(Model)
+        model.categories = self.categories
+        model.documents = dict(self.documents)
+        model.postings = dict(self.postings)
+        model.totals = Counter(self.totals)
+        model.weights = dict(self.weights)
+        model.learned = dict(self.learned)
+        model.loaded_at = self.loaded_at
+
+        changed = set()
+        for (token, category_id), change in delta.items():
+            if category_id not in self.categories:
+                continue
+            if token == DOCUMENT:
+                count = model.documents.get(category_id, 0) + change
+                if count > 0:
+                    model.documents[category_id] = count
+                else:
+                    model.documents.pop(category_id, None)
+                continue
+            posting = dict(model.postings.get(token, {}))
+            before = posting.get(category_id, 0)
+            after = max(before + change, 0)
+            if after:
+                posting[category_id] = after
+            else:
+                posting.pop(category_id, None)
+            model.totals[category_id] += after - before
+            if posting:
+                model.postings[token] = posting
+            else:
+                model.postings.pop(token, None)
+            changed.add(token)
+        for token in changed:
+            model.compile_token(token)
+        model.compile_categories()
+        return model
+
+    def rank(self, tokens):
+        """(category_id, probability) for every category, most likely first"""
+        known = [token for token in tokens if token in self.weights]
+        if not self.prior or not any(not token.startswith('~') for token in known):
+            return []
+        scores = {category_id: prior - len(known) * self.norm[category_id]
+                  for category_id, prior in self.prior.items()}
+        for token in known:
+            for category_id, weight in self.weights[token]:
+                if category_id in scores:
+                    scores[category_id] += weight
+        best = max(scores.values())
+        exponents = {category_id: math.exp(score - best) for category_id, score in scores.items()}
+        total = sum(exponents.values())
+        return sorted(((category_id, exponent / total) for category_id, exponent in exponents.items()),
+                      key=lambda item: -item[1])
+
+    def candidates(self, description_words, side):
+        """(category_id, confidence, source) in order of preference; a
+        generator, so callers wanting one answer skip the later steps"""
+        rule = self.rules.match(description_words)
+        if rule:
+            yield rule[0], rule[1], 'rule'
+        ranked = self.rank(features(description_words) + [side])
+        if ranked and ranked[0][1] >= CATEGORIZER_MIN_CONFIDENCE:
+            yield ranked[0][0], ranked[0][1], 'model'
+        keyword = default_keywords().match(description_words)
+        if keyword in self.categories and self.categories[keyword] == (side == CREDIT):
+            yield keyword, KEYWORD_CONFIDENCE, 'keyword'
+        for category_id, probability in ranked:
+            yield category_id, probability, 'model'
+
+    def suggest(self, description_words, side, limit):
+        found = []
+        seen = set()
+        for category_id, confidence, source in self.candidates(description_words, side):
+            if category_id not in seen:
+                seen.add(category_id)
+                found.append({'category_id': category_id, 'confidence': round(confidence, 4), 'source': source})
+                if len(found) == limit:
+                    break
+        return found
+
+    def suggestions(self, description, credited, debited, limit=3):
+        """Best categories for one transaction, as dicts, best first"""
+        return self.suggest(words(description), direction(credited, debited), limit)
+
+    def predict(self, description, credited, debited):
+        """The best suggestion for one transaction, or None
+
+        Memoized on the normalized words, so descriptions differing only in
+        digits or punctuation are scored once.
+        """
+        description_words = words(description)
+        side = direction(credited, debited)
+        key = (tuple(description_words), side)
+        if key not in self.memo:
+            if len(self.memo) >= MEMO_SIZE:
+                self.memo.clear()
+            found = self.suggest(description_words, side, 1)
+            self.memo[key] = found[0] if found else None
+        return self.memo[key]
+
+# Built-in keywords resolved to system category ids, once per process
+_keywords = None
+_keyword_lock = threading.Lock()
+
+def load_keywords(cursor):
+    global _keywords
+    with _keyword_lock:
+        if _keywords is not None:
+            return
+        cursor.execute("""
+            SELECT id, name FROM categories
+            WHERE user_id IS NULL AND status = 'active'
+        """)
+        ids = {name: category_id for category_id, name in (_values(row, ('id', 'name'))
+                                                           for row in cursor.fetchall())}
+        patterns = {}
+        for name, phrases in KEYWORDS.items():
+            for phrase in phrases:
+                if name in ids:
+                    patterns.setdefault(tuple(phrase.split()), ids[name])
+        _keywords = KeywordMatcher(patterns)
+
+def default_keywords():
+    return _keywords or KeywordMatcher({})
+
+def _values(row, keys):
+    return tuple(row[key] for key in keys) if isinstance(row, dict) else tuple(row)
+
+_models = OrderedDict()
+_models_lock = threading.Lock()
+
+def _user_key(user_id):
+    return user_id or 0
+
+def load_model(cursor, user_id):
+    """The user's model, from the cache or read from category_token_counts"""
+    key = _user_key(user_id)
+    with _models_lock:
+        model = _models.get(key)
+        if model and time.monotonic() - model.loaded_at < CATEGORIZER_CACHE_SECONDS:
+            _models.move_to_end(key)
+            return model
+
+    load_keywords(cursor)
+    cursor.execute("""
+        SELECT id, is_income FROM categories
+        WHERE status = 'active' AND (user_id IS NULL OR user_id <=> %s)
+    """, (user_id,))
+    categories = {category_id: bool(is_income)
+                  for category_id, is_income in (_values(row, ('id', 'is_income')) for row in cursor.fetchall())}
+    cursor.execute("""
+        SELECT token, category_id, count FROM category_token_counts
+        WHERE user_key = COALESCE(%s, 0)
+    """, (user_id,))
+    counts = {(token, category_id): count
+              for token, category_id, count in (_values(row, ('token', 'category_id', 'count'))
+                                                for row in cursor.fetchall())}
+    model = Model(counts, categories)
+
+    with _models_lock:
+        _models[key] = model
+        _models.move_to_end(key)
+        while len(_models) > CATEGORIZER_CACHE_USERS:
+            _models.popitem(last=False)
+    return model
+
+def suggest(cursor, user_id, description, credited=0, debited=0, limit=3):
+    """Ranked category suggestions for one transaction"""
+    return load_model(cursor, user_id).suggestions(description, credited, debited, limit)
+
+def categorize(cursor, user_id, rows):
+    """The best suggestion (or None) for each row dict with description,
+    credited and debited"""
+    model = load_model(cursor, user_id)
+    return [model.predict(row['description'], row.get('credited'), row.get('debited')) for row in rows]
+
+def contribution(row):
+    """The (token, category_id) counts one transaction adds"""
+    tokens = [DOCUMENT, direction(row.get('credited'), row.get('debited'))] + features(words(row['description']))
+    return Counter((token, row['category_id']) for token in tokens)
+
+def learn(cursor, user_id, added=(), removed=()):
+    """Add the counts of new or corrected transactions and subtract those of
+    deleted or replaced ones, then update a cached model"""
+    delta = Counter()
+    for row in added:
+        delta.update(contribution(row))
+    for row in removed:
+        delta.subtract(contribution(row))
+    delta = {pair: change for pair, change in delta.items() if change}
+    if not delta:
+        return
+
+    pairs = sorted(delta)
+    cursor.executemany("""
+        INSERT IGNORE INTO category_token_counts (user_id, token, category_id) VALUES (%s, %s, %s)
+    """, [(user_id, token, category_id) for token, category_id in pairs])
+    cursor.executemany("""
+        UPDATE category_token_counts SET count = count + %s
+        WHERE user_key = COALESCE(%s, 0) AND token = %s AND category_id = %s
+    """, [(delta[(token, category_id)], user_id, token, category_id) for token, category_id in pairs])
+
+    with _models_lock:
+        model = _models.get(_user_key(user_id))
+        if model:
+            _models[_user_key(user_id)] = model.updated(delta)
+
+def relearn(cursor, user_id, pairs):
+    """Move the counts of edited transactions, given (old, new) row pairs,
+    when their category, description or direction changed"""
+    changed = [(old, new) for old, new in pairs if contribution(old) != contribution(new)]
+    learn(cursor, user_id, added=[new for _, new in changed], removed=[old for old, _ in changed])
+
+def forget(user_id=None):
+    """Drop cached models, for one user or all of them"""
+    with _models_lock:
+        if user_id is None:
+            _models.clear()
+        else:
+            _models.pop(_user_key(user_id), None)
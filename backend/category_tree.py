@@ -0,0 +1,117 @@
+"""
+Category hierarchy helpers
+
+categories.parent_id is the source of truth. category_closure holds one row
+per (ancestor, descendant) pair, including each category paired with
+itself at depth 0. With it, a subtree is a single indexed lookup at any
+depth, with no recursive query. These helpers keep the closure rows in sync
+from every write path that creates, restores or re-parents a category, and
+build the hierarchical spending report on top of them.
+"""
+
+def _ids(rows, key):
+    return [row[key] if isinstance(row, dict) else row[0] for row in rows]
+
+def subtree_ids(cursor, category_id):
+    """The category and all of its descendants"""
+    cursor.execute("""
+        SELECT descendant_id FROM category_closure WHERE ancestor_id = %s
+    """, (category_id,))
+    return _ids(cursor.fetchall(), 'descendant_id')
+
+def add_node(cursor, category_id, parent_id=None):
+    """Link a new or restored leaf category below parent_id"""
+    cursor.execute("""
+        INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+        SELECT ancestor_id, %s, depth + 1
+        FROM category_closure
+        WHERE descendant_id = %s
+        UNION ALL
+        SELECT %s, %s, 0
+    """, (category_id, parent_id, category_id, category_id))
+
+def move_node(cursor, category_id, parent_id):
+    """Re-parent a category and its whole subtree
+
+    Raises ValueError if parent_id lies inside the moved subtree.
+    """
+    subtree = subtree_ids(cursor, category_id)
+    if parent_id in subtree:
+        raise ValueError('A category cannot be moved below itself')
+
+    placeholders = ', '.join(['%s'] * len(subtree))
+    # Cut every link from outside the subtree into it...
+    cursor.execute(f"""
+        DELETE FROM category_closure
+        WHERE descendant_id IN ({placeholders}) AND ancestor_id NOT IN ({placeholders})
+    """, [*subtree, *subtree])
+    # ...then connect each new ancestor to each subtree member
+    if parent_id is not None:
+        cursor.execute("""
+            INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+            SELECT above.ancestor_id, below.descendant_id, above.depth + below.depth + 1
+            FROM category_closure above
+            JOIN category_closure below ON below.ancestor_id = %s
+            WHERE above.descendant_id = %s
+        """, (category_id, parent_id))
+
+def spending_rollup(cursor, user_id, from_date=None, to_date=None):
+    """Own and subtree debited totals per category
+
+    Transactions are summed per category once, then joined to the closure
+    on idx_descendant, so every ancestor's subtree total comes out of the
+    same pass.
+    """
+    date_filter = ""
+    params = [user_id]
+    if from_date:
+        date_filter += " AND transaction_date >= %s"
+        params.append(from_date)
+    if to_date:
+        date_filter += " AND transaction_date <= %s"
+        params.append(to_date)
+
+    cursor.execute(f"""
+        SELECT
+            cc.ancestor_id,
+            SUM(CASE WHEN cc.depth = 0 THEN s.spent ELSE 0 END) as own_spent,
+            SUM(s.spent) as subtree_spent
+        FROM (
+            SELECT category_id, SUM(debited) as spent
+            FROM transactions
+            WHERE user_id <=> %s AND status = 'active'{date_filter}
+            GROUP BY category_id
+        ) s
+        JOIN category_closure cc ON cc.descendant_id = s.category_id
+        GROUP BY cc.ancestor_id
+    """, params)
+    keys = ('ancestor_id', 'own_spent', 'subtree_spent')
+    rows = [tuple(row[key] for key in keys) if isinstance(row, dict) else row for row in cursor.fetchall()]
+    return {category_id: (own_spent, subtree_spent) for category_id, own_spent, subtree_spent in rows}
+
+def build_tree(categories, totals):
+    """Nest categories with spending below their parents, largest first
+
+    categories are dicts with id, parent_id and display fields; totals maps
+    category id to (own_spent, subtree_spent). Categories whose parent is
+    not shown become roots.
+    """
+    nodes = {}
+    for category in categories:
+        own_spent, subtree_spent = totals.get(category['id'], (0, 0))
+        if subtree_spent and subtree_spent > 0:
+            nodes[category['id']] = dict(category, total_spent=own_spent,
+                                         subtree_spent=subtree_spent, children=[])
+
+    roots = []
+    for node in nodes.values():
+        parent = nodes.get(node['parent_id'])
+        (parent['children'] if parent else roots).append(node)
+
+    def order(siblings):
+        siblings.sort(key=lambda node: (-node['subtree_spent'], node['sort_order'], node['name']))
+        for node in siblings:
+            order(node['children'])
+        return siblings
+
+    return order(roots)
@@ -0,0 +1,267 @@
+"""
+Transaction change feed
+
+Write handlers publish one compact event per committed transaction change:
+what happened, the affected months and categories, and the user's new
+balance. A bulk edit publishes a single summarizing event instead of one per
+row. GET /api/changes streams each user's events as server-sent events,
+so a dashboard refetches only the summaries and charts an event touches
+instead of re-polling every endpoint. An idle stream runs no queries.
+
+ChangeHub fans events out to the streams open in this process. Each stream
+reads from its own bounded queue. A stream that falls too far behind is sent
+a resync event and closed instead of buffering without limit. Recent events
+are kept so a reconnecting client can resume from Last-Event-ID.
+
+With CHANGE_FEED_REDIS_URL set, RedisBridge relays events through Redis
+pub/sub so streams held by other workers see them too. Without it, a stream
+only sees writes handled by the same worker.
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - optional dependency
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+CHANGE_FEED_HISTORY = int(os.getenv('CHANGE_FEED_HISTORY', 1000))
+CHANGE_FEED_QUEUE_SIZE = int(os.getenv('CHANGE_FEED_QUEUE_SIZE', 100))
+CHANGE_FEED_CHANNEL = os.getenv('CHANGE_FEED_CHANNEL', 'spend_tracker:changes')
+
+# Browsers wait this long before reconnecting a closed stream
+SSE_RETRY_MS = 3000
+
+def month_of(value):
+    return str(value)[:7]
+
+def describe_change(old, new, balance=None):
+    """Build the event for a transaction change; old/new as given to listeners"""
+    if old is None:
+        kind, row = 'added', new
+    elif new is None:
+        kind, row = 'deleted', old
+    else:
+        kind, row = 'updated', new
+    rows = [r for r in (old, new) if r]
+    return {
+        'type': kind,
+        'transaction_id': row['id'],
+        'months': sorted({month_of(r['transaction_date']) for r in rows}),
+        'category_ids': sorted({int(r['category_id']) for r in rows}),
+        'balance': float(balance) if balance is not None else None
+    }
+
+def describe_bulk_change(kind, changes, balance=None):
+    """One event summarizing a bulk edit; changes are (old, new) pairs"""
+    rows = [row for change in changes for row in change if row]
+    return {
+        'type': kind,
+        'count': len(changes),
+        'months': sorted({month_of(r['transaction_date']) for r in rows}),
+        'category_ids': sorted({int(r['category_id']) for r in rows}),
+        'balance': float(balance) if balance is not None else None
+    }
+
+def format_sse(event_id, name, data):
+    """One server-sent event frame"""
+    return f"id: {event_id}\nevent: {name}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+def format_retry():
+    return f"retry: {SSE_RETRY_MS}\n\n"
+
+def format_heartbeat():
+    # Comment line: keeps proxies from closing an idle stream
+    return ": keep-alive\n\n"
+
+class Subscription:
+    """One open stream's view of the hub"""
+
+    def __init__(self, user_id, queue_size):
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def get(self, timeout):
+        """Next (event_id, name, data), or None after timeout seconds"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+class ChangeHub:
+    """In-process fan-out of change events to per-user subscriptions"""
+
+    def __init__(self, history_size=CHANGE_FEED_HISTORY, queue_size=CHANGE_FEED_QUEUE_SIZE, max_subscribers=None):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.instance = uuid.uuid4().hex[:8]
+        self.lock = threading.Lock()
+        self.sequence = 0
+        self.history = deque(maxlen=history_size)
+        self.subscribers = {}
+        self.bridge = None
+        self.counters = {'published': 0, 'delivered': 0, 'relayed': 0, 'overflows': 0, 'rejected': 0}
+
+    @property
+    def origin(self):
+        # Includes the pid: workers forked from a preloaded app share instance
+        return f"{self.instance}.{os.getpid()}"
+
+    def head_id(self):
+        return self.history[-1][0] if self.history else ''
+
+    def publish(self, user_id, event):
+        """Deliver an event locally and relay it to other workers"""
+        with self.lock:
+            self.sequence += 1
+            event_id = f"{self.origin}-{self.sequence}"
+            self.counters['published'] += 1
+        self.deliver(user_id, event_id, event)
+        if self.bridge:
+            self.bridge.publish(user_id, event_id, event)
+
+    def deliver(self, user_id, event_id, event, relayed=False):
+        """Record an event and hand it to this user's open streams"""
+        with self.lock:
+            self.history.append((event_id, user_id, event))
+            if relayed:
+                self.counters['relayed'] += 1
+            for subscription in list(self.subscribers.get(user_id, ())):
+                self._offer(subscription, (event_id, 'transaction', event))
+
+    def _offer(self, subscription, item):
+        if subscription.overflowed:
+            return
+        try:
+            subscription.queue.put_nowait(item)
+            self.counters['delivered'] += 1
+        except queue.Full:
+            # The client has to refetch everything anyway; stop queueing for it
+            subscription.overflowed = True
+            self.counters['overflows'] += 1
+
+    def subscribe(self, user_id, last_event_id=None):
+        """Open a subscription, replaying events after last_event_id
+
+        Returns None when the worker already holds max_subscribers streams.
+        """
+        with self.lock:
+            if self.max_subscribers is not None and self.subscriber_count() >= self.max_subscribers:
+                self.counters['rejected'] += 1
+                return None
+            subscription = Subscription(user_id, self.queue_size)
+            self.subscribers.setdefault(user_id, set()).add(subscription)
+
+            if last_event_id:
+                ids = [event_id for event_id, _, _ in self.history]
+                if last_event_id in ids:
+                    for event_id, event_user_id, event in list(self.history)[ids.index(last_event_id) + 1:]:
+                        if event_user_id == user_id:
+                            self._offer(subscription, (event_id, 'transaction', event))
+                else:
+                    # Too old (or from before a restart): the client must refetch
+                    subscription.overflowed = True
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            streams = self.subscribers.get(subscription.user_id)
+            if streams:
+                streams.discard(subscription)
+                if not streams:
+                    del self.subscribers[subscription.user_id]
+
+    def subscriber_count(self):
+        return sum(len(streams) for streams in self.subscribers.values())
+
+    def stream(self, subscription, heartbeat_seconds, max_seconds):
+        """Yield SSE frames for a subscription until it overflows or times out
+
+        Streams are closed after max_seconds so that a worker thread is not
+        held forever; the browser reconnects with Last-Event-ID and resumes.
+        """
+        deadline = time.monotonic() + max_seconds
+        try:
+            yield format_retry()
+            while True:
+                if subscription.overflowed and subscription.queue.empty():
+                    # Resume from the newest event after the client has refetched
+                    with self.lock:
+                        head_id = self.head_id()
+                    yield format_sse(head_id, 'resync', {'type': 'resync'})
+                    return
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                item = subscription.get(min(heartbeat_seconds, remaining))
+                yield format_sse(*item) if item else format_heartbeat()
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'subscribers': self.subscriber_count(),
+                'users': len(self.subscribers),
+                'history': len(self.history),
+                'bridge': self.bridge.stats() if self.bridge else None,
+                **self.counters
+            }
+
+class RedisBridge:
+    """Relay hub events between workers over Redis pub/sub"""
+
+    def __init__(self, hub, url, channel=CHANGE_FEED_CHANNEL, reconnect_seconds=2.0):
+        if redis is None:
+            raise RuntimeError("CHANGE_FEED_REDIS_URL is set but the redis package is not installed")
+        self.hub = hub
+        self.channel = channel
+        self.reconnect_seconds = reconnect_seconds
+        self.client = redis.Redis.from_url(url)
+        self.thread = None
+        self.counters = {'sent': 0, 'received': 0, 'errors': 0}
+        hub.bridge = self
+
+    def publish(self, user_id, event_id, event):
+        message = json.dumps({'origin': self.hub.origin, 'user_id': user_id, 'id': event_id, 'event': event})
+        try:
+            self.client.publish(self.channel, message)
+            self.counters['sent'] += 1
+        except redis.RedisError as e:
+            # Local streams already have the event; others miss it and resync on reconnect
+            self.counters['errors'] += 1
+            logger.error(f"Change feed publish error: {e}")
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    payload = json.loads(message['data'])
+                    if payload['origin'] == self.hub.origin:
+                        continue
+                    self.counters['received'] += 1
+                    self.hub.deliver(payload['user_id'], payload['id'], payload['event'], relayed=True)
+            except Exception as e:
+                self.counters['errors'] += 1
+                logger.error(f"Change feed subscriber error: {e}")
+                time.sleep(self.reconnect_seconds)
+
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._listen, name='change-feed-bridge', daemon=True)
+            self.thread.start()
+
+    def stats(self):
+        return dict(self.counters, channel=self.channel)
@@ -0,0 +1,84 @@
+"""
+Circuit breaker for database connection checkouts
+
+After failure_threshold consecutive connection failures the circuit opens.
+While it is open, callers fail immediately with CircuitOpenError instead of
+each waiting out a connect timeout. After reset_timeout one trial checkout
+is let through (half-open). Success closes the circuit; failure reopens it
+with the timeout doubled, up to max_reset_timeout.
+"""
+
+import threading
+import time
+
+class CircuitOpenError(Exception):
+    """Raised instead of attempting a connection while the circuit is open"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Database unavailable, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker around an unreliable dependency"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=2.0, max_reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.base_reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.lock = threading.Lock()
+        self.state = 'closed'
+        self.failures = 0
+        self.reset_timeout = reset_timeout
+        self.opened_at = 0.0
+        self.counters = {'opened': 0, 'rejected': 0, 'failures': 0}
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go ahead now"""
+        with self.lock:
+            if self.state == 'closed':
+                return
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if self.state == 'open' and remaining <= 0:
+                # Let exactly one trial through
+                self.state = 'half_open'
+                return
+            self.counters['rejected'] += 1
+            raise CircuitOpenError(max(remaining, 0.5))
+
+    def record_success(self):
+        with self.lock:
+            self.state = 'closed'
+            self.failures = 0
+            self.reset_timeout = self.base_reset_timeout
+
+    def record_failure(self):
+        with self.lock:
+            self.counters['failures'] += 1
+            self.failures += 1
+            if self.state == 'half_open':
+                self.reset_timeout = min(self.reset_timeout * 2, self.max_reset_timeout)
+                self._open()
+            elif self.state == 'closed' and self.failures >= self.failure_threshold:
+                self._open()
+
+    def _open(self):
+        self.state = 'open'
+        self.opened_at = time.monotonic()
+        self.counters['opened'] += 1
+
+    @property
+    def is_open(self):
+        """Whether calls are currently being rejected"""
+        with self.lock:
+            if self.state == 'half_open':
+                return True
+            return self.state == 'open' and time.monotonic() < self.opened_at + self.reset_timeout
+
+    def retry_after(self):
+        with self.lock:
+            return max(self.opened_at + self.reset_timeout - time.monotonic(), 0.5)
+
+    def stats(self):
+        with self.lock:
+            return {'state': self.state, 'consecutive_failures': self.failures,
+                    'reset_timeout': self.reset_timeout, **self.counters}
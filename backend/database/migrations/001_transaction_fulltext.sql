@@ -0,0 +1,5 @@
+-- Full-text index backing /api/transactions/search
+-- Prefix matching relies on BOOLEAN MODE wildcards (term*), so words shorter
+-- than innodb_ft_min_token_size (default 3) are not indexed.
+ALTER TABLE transactions
+    ADD FULLTEXT INDEX ft_transaction_search (description, notes, tags);
@@ -0,0 +1,5 @@
+-- Resolve tag filters from the tag side of the junction table
+-- Run backfill_transaction_tags.py afterwards to populate transaction_tags
+-- from the existing comma-separated transactions.tags column.
+ALTER TABLE transaction_tags
+    ADD INDEX idx_tag_transaction (tag_id, transaction_id);
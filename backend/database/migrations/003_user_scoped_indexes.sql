@@ -0,0 +1,5 @@
+-- Indexes leading with user_id so per-user reads and balance repairs only
+-- touch that user's rows
+ALTER TABLE transactions
+    ADD INDEX idx_user_status_date (user_id, status, transaction_date, created_at),
+    ADD INDEX idx_user_category_date (user_id, category_id, transaction_date);
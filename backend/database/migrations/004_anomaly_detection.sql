@@ -0,0 +1,30 @@
+-- Streaming statistics and flags for spending-anomaly detection
+-- Run rebuild_anomaly_stats.py afterwards to seed category_stats from history.
+CREATE TABLE IF NOT EXISTS category_stats (
+    user_id INT DEFAULT NULL,
+    user_key INT AS (COALESCE(user_id, 0)) STORED,
+    category_id INT NOT NULL,
+    n INT NOT NULL DEFAULT 0,
+    mean DOUBLE NOT NULL DEFAULT 0,
+    m2 DOUBLE NOT NULL DEFAULT 0,
+    short_count DOUBLE NOT NULL DEFAULT 0,
+    long_count DOUBLE NOT NULL DEFAULT 0,
+    last_event_date DATE DEFAULT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_key, category_id),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS transaction_anomalies (
+    transaction_id INT PRIMARY KEY,
+    user_id INT DEFAULT NULL,
+    category_id INT NOT NULL,
+    reasons VARCHAR(50) NOT NULL,
+    z_score DECIMAL(10, 4) DEFAULT NULL,
+    frequency_ratio DECIMAL(10, 4) DEFAULT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (transaction_id) REFERENCES transactions(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    INDEX idx_user_transaction (user_id, transaction_id)
+);
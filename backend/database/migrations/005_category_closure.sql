@@ -0,0 +1,39 @@
+-- Ancestor/descendant closure of the category hierarchy, so subtree
+-- rollups are a single indexed join at any depth. Each category is also
+-- its own ancestor at depth 0. The application maintains it on category
+-- create, move and restore.
+CREATE TABLE IF NOT EXISTS category_closure (
+    ancestor_id INT NOT NULL,
+    descendant_id INT NOT NULL,
+    depth INT NOT NULL,
+    PRIMARY KEY (ancestor_id, descendant_id),
+    INDEX idx_descendant (descendant_id, ancestor_id, depth),
+    FOREIGN KEY (ancestor_id) REFERENCES categories(id) ON DELETE CASCADE,
+    FOREIGN KEY (descendant_id) REFERENCES categories(id) ON DELETE CASCADE
+);
+
+-- Seed from the existing parent_id links
+INSERT IGNORE INTO category_closure (ancestor_id, descendant_id, depth)
+WITH RECURSIVE tree AS (
+    SELECT id AS ancestor_id, id AS descendant_id, 0 AS depth FROM categories
+    UNION ALL
+    SELECT tree.ancestor_id, c.id, tree.depth + 1
+    FROM tree
+    JOIN categories c ON c.parent_id = tree.descendant_id
+)
+SELECT ancestor_id, descendant_id, depth FROM tree;
+
+CREATE OR REPLACE VIEW category_tree_summary AS
+SELECT
+    c.id,
+    c.name,
+    c.parent_id,
+    COUNT(t.id) AS transaction_count,
+    COALESCE(SUM(t.credited), 0) AS total_income,
+    COALESCE(SUM(t.debited), 0) AS total_expenses,
+    COALESCE(SUM(t.credited - t.debited), 0) AS net_amount
+FROM categories c
+JOIN category_closure cc ON cc.ancestor_id = c.id
+LEFT JOIN transactions t ON t.category_id = cc.descendant_id AND t.status = 'active'
+WHERE c.status = 'active'
+GROUP BY c.id, c.name, c.parent_id;
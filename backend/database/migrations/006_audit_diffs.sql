@@ -0,0 +1,9 @@
+-- The application writes one diff-based audit row per change. These
+-- triggers duplicated it, and logged every running_balance repair as an
+-- update of each repaired row.
+DROP TRIGGER IF EXISTS transactions_audit_insert;
+DROP TRIGGER IF EXISTS transactions_audit_update;
+DROP TRIGGER IF EXISTS transactions_audit_delete;
+
+-- Keyset pagination of a user's audit feed on (created_at, id)
+CREATE INDEX idx_user_created_at ON audit_log (user_id, created_at);
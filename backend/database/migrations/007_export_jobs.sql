@@ -0,0 +1,23 @@
+-- Background export jobs; files are written under EXPORT_DIR
+CREATE TABLE IF NOT EXISTS export_jobs (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT DEFAULT NULL,
+    format VARCHAR(10) NOT NULL,
+    filters JSON NOT NULL,
+    fingerprint CHAR(64) NOT NULL, -- sha256 of user, format and filters
+    status ENUM('queued', 'running', 'done', 'failed', 'expired') NOT NULL DEFAULT 'queued',
+    total_rows INT DEFAULT NULL,
+    rows_written INT NOT NULL DEFAULT 0,
+    file_size BIGINT DEFAULT NULL,
+    error VARCHAR(255) DEFAULT NULL,
+    snapshot_at TIMESTAMP NULL DEFAULT NULL, -- when the worker started reading
+    heartbeat_at TIMESTAMP NULL DEFAULT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP NULL DEFAULT NULL,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    INDEX idx_status (status, id),
+    INDEX idx_fingerprint (fingerprint, created_at)
+);
+
+-- Finds writes since an export's snapshot without scanning the user's rows
+CREATE INDEX idx_user_updated_at ON transactions (user_id, updated_at);
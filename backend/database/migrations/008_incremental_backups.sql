@@ -0,0 +1,10 @@
+-- Incremental backups (backup_database.py): each run records the backup it
+-- builds on and the database time its changed-row scan starts from
+ALTER TABLE backup_info
+    ADD COLUMN parent_id INT DEFAULT NULL AFTER backup_type,
+    ADD COLUMN watermark TIMESTAMP NULL DEFAULT NULL AFTER end_time,
+    ADD COLUMN row_count BIGINT DEFAULT NULL AFTER file_size,
+    ADD CONSTRAINT fk_backup_parent FOREIGN KEY (parent_id) REFERENCES backup_info(id) ON DELETE SET NULL;
+
+-- Changed-row scans of the largest table read a range of this index
+CREATE INDEX idx_updated_at ON transactions (updated_at);
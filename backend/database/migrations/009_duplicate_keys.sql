@@ -0,0 +1,12 @@
+-- Blocking keys for near-duplicate detection (see duplicates.py)
+-- Run backfill_duplicate_keys.py afterwards to index existing transactions.
+CREATE TABLE IF NOT EXISTS duplicate_keys (
+    transaction_id INT NOT NULL,
+    block_key BIGINT NOT NULL,
+    user_id INT DEFAULT NULL,
+    day DATE NOT NULL,
+    PRIMARY KEY (transaction_id, block_key),
+    INDEX idx_user_block_day (user_id, block_key, day),
+    FOREIGN KEY (transaction_id) REFERENCES transactions(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
@@ -0,0 +1,12 @@
+-- Description word counts for auto-categorization (see categorizer.py)
+-- Run rebuild_category_model.py afterwards to learn from existing transactions.
+CREATE TABLE IF NOT EXISTS category_token_counts (
+    user_id INT DEFAULT NULL,
+    user_key INT AS (COALESCE(user_id, 0)) STORED,
+    token VARCHAR(50) NOT NULL,
+    category_id INT NOT NULL,
+    count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_key, token, category_id),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE CASCADE
+);
@@ -0,0 +1,25 @@
+-- Replace UpdateRunningBalances with the per-user version in schema.sql.
+-- Databases created earlier still run one balance across every user's
+-- transactions, and ProcessRecurringTransactions calls it after each run.
+DROP PROCEDURE IF EXISTS UpdateRunningBalances;
+
+DELIMITER //
+
+CREATE PROCEDURE UpdateRunningBalances()
+BEGIN
+    UPDATE transactions t
+    JOIN (
+        SELECT id, SUM(credited - debited) OVER (
+            PARTITION BY user_id
+            ORDER BY transaction_date, created_at, id
+        ) AS balance
+        FROM transactions
+        WHERE status = 'active'
+    ) b ON b.id = t.id
+    SET t.running_balance = b.balance;
+END //
+
+DELIMITER ;
+
+-- Repair balances the old procedure mixed across users
+CALL UpdateRunningBalances();
@@ -0,0 +1,14 @@
+-- First transaction date per category, so frequency spikes wait until the
+-- category's history spans the long horizon (see anomaly.py).
+-- Run rebuild_anomaly_stats.py afterwards: counts folded in before this
+-- change gave backdated transactions full weight.
+ALTER TABLE category_stats ADD COLUMN first_event_date DATE DEFAULT NULL AFTER long_count;
+
+UPDATE category_stats s
+JOIN (
+    SELECT COALESCE(user_id, 0) AS user_key, category_id, MIN(transaction_date) AS first_date
+    FROM transactions
+    WHERE status = 'active'
+    GROUP BY COALESCE(user_id, 0), category_id
+) f ON f.user_key = s.user_key AND f.category_id = s.category_id
+SET s.first_event_date = f.first_date;
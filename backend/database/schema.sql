@@ -8,6 +8,12 @@ USE spend_tracker;
 -- Drop tables if they exist (for clean setup)
 SET FOREIGN_KEY_CHECKS = 0;
 DROP TABLE IF EXISTS user_sessions;
+DROP TABLE IF EXISTS export_jobs;
+DROP TABLE IF EXISTS category_token_counts;
+DROP TABLE IF EXISTS duplicate_keys;
+DROP TABLE IF EXISTS transaction_anomalies;
+DROP TABLE IF EXISTS category_stats;
+DROP TABLE IF EXISTS category_closure;
 DROP TABLE IF EXISTS transaction_tags;
 DROP TABLE IF EXISTS tags;
 DROP TABLE IF EXISTS trash_bin;
@@ -67,6 +73,19 @@ CREATE TABLE categories (
     INDEX idx_sort_order (sort_order)
 );
 
+-- Category hierarchy closure: one row per ancestor/descendant pair,
+-- including each category with itself at depth 0
+CREATE TABLE category_closure (
+    ancestor_id INT NOT NULL,
+    descendant_id INT NOT NULL,
+    depth INT NOT NULL,
+    
+    PRIMARY KEY (ancestor_id, descendant_id),
+    INDEX idx_descendant (descendant_id, ancestor_id, depth),
+    FOREIGN KEY (ancestor_id) REFERENCES categories(id) ON DELETE CASCADE,
+    FOREIGN KEY (descendant_id) REFERENCES categories(id) ON DELETE CASCADE
+);
+
 -- Transactions table - main financial records
 CREATE TABLE transactions (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -102,7 +121,12 @@ CREATE TABLE transactions (
     INDEX idx_status (status),
     INDEX idx_amount (credited, debited),
     INDEX idx_date_user (transaction_date, user_id),
-    INDEX idx_recurring (recurring_id)
+    INDEX idx_recurring (recurring_id),
+    INDEX idx_user_status_date (user_id, status, transaction_date, created_at),
+    INDEX idx_user_category_date (user_id, category_id, transaction_date),
+    INDEX idx_user_updated_at (user_id, updated_at),
+    INDEX idx_updated_at (updated_at),
+    FULLTEXT INDEX ft_transaction_search (description, notes, tags)
 );
 
 -- Recurring transactions for automated entries
@@ -163,7 +187,8 @@ CREATE TABLE goals (
     INDEX idx_period (start_date, end_date)
 );
 
--- Audit log for tracking changes
+-- Audit log for tracking changes: JSON snapshots on insert, changed
+-- fields only on update/delete (written by the application, see audit.py)
 CREATE TABLE audit_log (
     id INT AUTO_INCREMENT PRIMARY KEY,
     user_id INT DEFAULT NULL,
@@ -180,7 +205,8 @@ CREATE TABLE audit_log (
     INDEX idx_user (user_id),
     INDEX idx_table_record (table_name, record_id),
     INDEX idx_action (action),
-    INDEX idx_created_at (created_at)
+    INDEX idx_created_at (created_at),
+    INDEX idx_user_created_at (user_id, created_at)
 );
 
 -- Tags for flexible categorization
@@ -208,10 +234,74 @@ CREATE TABLE transaction_tags (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     
     PRIMARY KEY (transaction_id, tag_id),
+    INDEX idx_tag_transaction (tag_id, transaction_id),
     FOREIGN KEY (transaction_id) REFERENCES transactions(id) ON DELETE CASCADE,
     FOREIGN KEY (tag_id) REFERENCES tags(id) ON DELETE CASCADE
 );
 
+-- Streaming per-category statistics for anomaly detection
+-- (Welford n/mean/m2 of amounts plus decayed transaction counts)
+CREATE TABLE category_stats (
+    user_id INT DEFAULT NULL,
+    user_key INT AS (COALESCE(user_id, 0)) STORED, -- 0 for single-user mode
+    category_id INT NOT NULL,
+    n INT NOT NULL DEFAULT 0,
+    mean DOUBLE NOT NULL DEFAULT 0,
+    m2 DOUBLE NOT NULL DEFAULT 0,
+    short_count DOUBLE NOT NULL DEFAULT 0,
+    long_count DOUBLE NOT NULL DEFAULT 0,
+    first_event_date DATE DEFAULT NULL,
+    last_event_date DATE DEFAULT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    
+    PRIMARY KEY (user_key, category_id),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE CASCADE
+);
+
+-- Transactions flagged as unusual for their category
+CREATE TABLE transaction_anomalies (
+    transaction_id INT PRIMARY KEY,
+    user_id INT DEFAULT NULL,
+    category_id INT NOT NULL,
+    reasons VARCHAR(50) NOT NULL, -- Comma-separated: amount, frequency
+    z_score DECIMAL(10, 4) DEFAULT NULL,
+    frequency_ratio DECIMAL(10, 4) DEFAULT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    
+    FOREIGN KEY (transaction_id) REFERENCES transactions(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    INDEX idx_user_transaction (user_id, transaction_id)
+);
+
+-- Blocking keys for near-duplicate detection (see duplicates.py): one row
+-- per active transaction for its amount and for each description token
+CREATE TABLE duplicate_keys (
+    transaction_id INT NOT NULL,
+    block_key BIGINT NOT NULL, -- 64-bit hash of the amount or a token
+    user_id INT DEFAULT NULL,
+    day DATE NOT NULL,
+    
+    PRIMARY KEY (transaction_id, block_key),
+    INDEX idx_user_block_day (user_id, block_key, day),
+    FOREIGN KEY (transaction_id) REFERENCES transactions(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- Description word counts per category for auto-categorization (see
+-- categorizer.py); the empty token counts the category's transactions
+CREATE TABLE category_token_counts (
+    user_id INT DEFAULT NULL,
+    user_key INT AS (COALESCE(user_id, 0)) STORED, -- 0 for single-user mode
+    token VARCHAR(50) NOT NULL,
+    category_id INT NOT NULL,
+    count INT NOT NULL DEFAULT 0,
+    
+    PRIMARY KEY (user_key, token, category_id),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE CASCADE
+);
+
 -- Exchange rates for multi-currency support
 CREATE TABLE exchange_rates (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -266,6 +356,28 @@ CREATE TABLE user_sessions (
     INDEX idx_status (status)
 );
 
+-- Background export jobs; files are written under EXPORT_DIR
+CREATE TABLE export_jobs (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT DEFAULT NULL,
+    format VARCHAR(10) NOT NULL,
+    filters JSON NOT NULL,
+    fingerprint CHAR(64) NOT NULL, -- sha256 of user, format and filters
+    status ENUM('queued', 'running', 'done', 'failed', 'expired') NOT NULL DEFAULT 'queued',
+    total_rows INT DEFAULT NULL,
+    rows_written INT NOT NULL DEFAULT 0,
+    file_size BIGINT DEFAULT NULL,
+    error VARCHAR(255) DEFAULT NULL,
+    snapshot_at TIMESTAMP NULL DEFAULT NULL, -- when the worker started reading
+    heartbeat_at TIMESTAMP NULL DEFAULT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP NULL DEFAULT NULL,
+    
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    INDEX idx_status (status, id),
+    INDEX idx_fingerprint (fingerprint, created_at)
+);
+
 -- Insert default categories
 INSERT INTO categories (name, description, color, icon, is_income, is_system, status) VALUES
 -- Income categories
@@ -293,6 +405,10 @@ INSERT INTO categories (name, description, color, icon, is_income, is_system, st
 ('Bank Fees', 'ATM fees, account fees, interest paid', '#f59e0b', '🏦', FALSE, TRUE, 'active'),
 ('Other Expenses', 'Miscellaneous expenses', '#6b7280', '📝', FALSE, TRUE, 'active');
 
+-- Default categories are all top-level
+INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+SELECT id, id, 0 FROM categories;
+
 -- Insert demo user (password: "demo123")
 INSERT INTO users (email, password_hash, name, status, email_verified) VALUES
 ('demo@spendtracker.app', 'pbkdf2:sha256:260000$YourHashedPassword', 'Demo User', 'active', TRUE);
@@ -348,41 +464,38 @@ WHERE c.status = 'active'
 GROUP BY c.id, c.name, c.color, c.icon, c.is_income
 ORDER BY c.name;
 
+-- Totals per category including all of its subcategories
+CREATE VIEW category_tree_summary AS
+SELECT 
+    c.id,
+    c.name,
+    c.parent_id,
+    COUNT(t.id) AS transaction_count,
+    COALESCE(SUM(t.credited), 0) AS total_income,
+    COALESCE(SUM(t.debited), 0) AS total_expenses,
+    COALESCE(SUM(t.credited - t.debited), 0) AS net_amount
+FROM categories c
+JOIN category_closure cc ON cc.ancestor_id = c.id
+LEFT JOIN transactions t ON t.category_id = cc.descendant_id AND t.status = 'active'
+WHERE c.status = 'active'
+GROUP BY c.id, c.name, c.parent_id;
+
 -- Create stored procedures for common operations
 DELIMITER //
 
 CREATE PROCEDURE UpdateRunningBalances()
 BEGIN
-    DECLARE done INT DEFAULT FALSE;
-    DECLARE trans_id INT;
-    DECLARE trans_credited DECIMAL(15,2);
-    DECLARE trans_debited DECIMAL(15,2);
-    DECLARE running_total DECIMAL(15,2) DEFAULT 0;
-    
-    DECLARE trans_cursor CURSOR FOR 
-        SELECT id, credited, debited 
-        FROM transactions 
-        WHERE status = 'active' 
-        ORDER BY transaction_date, created_at;
-    
-    DECLARE CONTINUE HANDLER FOR NOT FOUND SET done = TRUE;
-    
-    OPEN trans_cursor;
-    
-    read_loop: LOOP
-        FETCH trans_cursor INTO trans_id, trans_credited, trans_debited;
-        IF done THEN
-            LEAVE read_loop;
-        END IF;
-        
-        SET running_total = running_total + trans_credited - trans_debited;
-        
-        UPDATE transactions 
-        SET running_balance = running_total 
-        WHERE id = trans_id;
-    END LOOP;
-    
-    CLOSE trans_cursor;
+    -- Running balances are kept per user (NULL user_id = single-user mode)
+    UPDATE transactions t
+    JOIN (
+        SELECT id, SUM(credited - debited) OVER (
+            PARTITION BY user_id
+            ORDER BY transaction_date, created_at, id
+        ) AS balance
+        FROM transactions
+        WHERE status = 'active'
+    ) b ON b.id = t.id
+    SET t.running_balance = b.balance;
 END //
 
 CREATE PROCEDURE CleanupOldAuditLogs(IN days_to_keep INT)
@@ -451,41 +564,6 @@ END //
 
 DELIMITER ;
 
--- Create triggers for automatic audit logging
-DELIMITER //
-
-CREATE TRIGGER transactions_audit_insert
-    AFTER INSERT ON transactions
-    FOR EACH ROW
-BEGIN
-    INSERT INTO audit_log (user_id, table_name, record_id, action, new_values)
-    VALUES (NEW.user_id, 'transactions', NEW.id, 'INSERT', 
-            JSON_OBJECT('id', NEW.id, 'description', NEW.description, 'amount', NEW.credited - NEW.debited));
-END //
-
-CREATE TRIGGER transactions_audit_update
-    AFTER UPDATE ON transactions
-    FOR EACH ROW
-BEGIN
-    INSERT INTO audit_log (user_id, table_name, record_id, action, old_values, new_values)
-    VALUES (NEW.user_id, 'transactions', NEW.id, 'UPDATE',
-            JSON_OBJECT('description', OLD.description, 'amount', OLD.credited - OLD.debited),
-            JSON_OBJECT('description', NEW.description, 'amount', NEW.credited - NEW.debited));
-END //
-
-CREATE TRIGGER transactions_audit_delete
-    AFTER UPDATE ON transactions
-    FOR EACH ROW
-BEGIN
-    IF OLD.status = 'active' AND NEW.status = 'inactive' THEN
-        INSERT INTO audit_log (user_id, table_name, record_id, action, old_values)
-        VALUES (NEW.user_id, 'transactions', NEW.id, 'DELETE',
-                JSON_OBJECT('description', OLD.description, 'amount', OLD.credited - OLD.debited));
-    END IF;
-END //
-
-DELIMITER ;
-
 -- Create indexes for performance optimization
 CREATE INDEX idx_transactions_date_amount ON transactions(transaction_date, credited, debited);
 CREATE INDEX idx_transactions_category_date ON transactions(category_id, transaction_date);
@@ -511,15 +589,19 @@ CREATE TABLE performance_metrics (
 CREATE TABLE backup_info (
     id INT AUTO_INCREMENT PRIMARY KEY,
     backup_type ENUM('full', 'incremental', 'transaction_only') NOT NULL,
+    parent_id INT DEFAULT NULL, -- the backup an incremental applies on top of
     file_path VARCHAR(500) NOT NULL,
     file_size BIGINT DEFAULT NULL,
+    row_count BIGINT DEFAULT NULL,
     start_time TIMESTAMP NOT NULL,
     end_time TIMESTAMP DEFAULT NULL,
+    watermark TIMESTAMP NULL DEFAULT NULL, -- database time the run started reading
     status ENUM('running', 'completed', 'failed') DEFAULT 'running',
     error_message TEXT DEFAULT NULL,
     created_by INT DEFAULT NULL,
     
     FOREIGN KEY (created_by) REFERENCES users(id) ON DELETE SET NULL,
+    FOREIGN KEY (parent_id) REFERENCES backup_info(id) ON DELETE SET NULL,
     INDEX idx_backup_type (backup_type),
     INDEX idx_start_time (start_time),
     INDEX idx_status (status)
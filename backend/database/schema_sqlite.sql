@@ -0,0 +1,505 @@
+-- Spend Tracker Database Schema
+-- SQLite 3.35+ (embedded backend, STORAGE_BACKEND=sqlite)
+--
+-- Port of schema.sql. Differences from the MySQL schema:
+--   * ENUM columns are TEXT with CHECK constraints
+--   * index names are global in SQLite, so they are prefixed with the table
+--   * ON UPDATE CURRENT_TIMESTAMP is emulated with AFTER UPDATE triggers
+--   * the FULLTEXT index is an external-content FTS5 table kept in sync by
+--     triggers
+--   * category_stats.user_key and category_token_counts.user_key are
+--     generated columns; SQLite cannot use them in a PRIMARY KEY, so
+--     uniqueness is a UNIQUE index instead
+--   * stored procedures are not ported; the application repairs running
+--     balances itself
+-- Timestamps are UTC, as CURRENT_TIMESTAMP is in SQLite.
+
+PRAGMA journal_mode = WAL;
+PRAGMA foreign_keys = ON;
+
+-- Users table for authentication and multi-user support
+CREATE TABLE users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    email VARCHAR(255) NOT NULL UNIQUE,
+    password_hash VARCHAR(255) NOT NULL,
+    name VARCHAR(255) DEFAULT '',
+    avatar_url VARCHAR(500) DEFAULT '',
+    timezone VARCHAR(50) DEFAULT 'UTC',
+    currency VARCHAR(3) DEFAULT 'USD',
+    status TEXT DEFAULT 'active' CHECK (status IN ('active', 'inactive', 'suspended')),
+    email_verified BOOLEAN DEFAULT FALSE,
+    email_verification_token VARCHAR(255) DEFAULT NULL,
+    password_reset_token VARCHAR(255) DEFAULT NULL,
+    password_reset_expires TIMESTAMP NULL DEFAULT NULL,
+    last_login TIMESTAMP NULL DEFAULT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX idx_users_status ON users(status);
+CREATE INDEX idx_users_created_at ON users(created_at);
+
+-- Categories table for transaction categorization
+CREATE TABLE categories (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER DEFAULT NULL REFERENCES users(id) ON DELETE CASCADE, -- NULL for system categories
+    name VARCHAR(100) NOT NULL,
+    description TEXT,
+    color VARCHAR(7) DEFAULT '#3b82f6', -- Hex color code
+    icon VARCHAR(10) DEFAULT '📝', -- Emoji or icon reference
+    is_income BOOLEAN DEFAULT FALSE,
+    parent_id INTEGER DEFAULT NULL REFERENCES categories(id) ON DELETE SET NULL, -- For subcategories
+    sort_order INTEGER DEFAULT 0,
+    is_system BOOLEAN DEFAULT FALSE, -- System categories can't be deleted
+    status TEXT DEFAULT 'active' CHECK (status IN ('active', 'inactive')),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX idx_categories_user ON categories(user_id);
+CREATE INDEX idx_categories_status ON categories(status);
+CREATE INDEX idx_categories_parent ON categories(parent_id);
+CREATE INDEX idx_categories_sort_order ON categories(sort_order);
+
+-- Category hierarchy closure: one row per ancestor/descendant pair,
+-- including each category with itself at depth 0
+CREATE TABLE category_closure (
+    ancestor_id INTEGER NOT NULL REFERENCES categories(id) ON DELETE CASCADE,
+    descendant_id INTEGER NOT NULL REFERENCES categories(id) ON DELETE CASCADE,
+    depth INTEGER NOT NULL,
+    PRIMARY KEY (ancestor_id, descendant_id)
+);
+CREATE INDEX idx_category_closure_descendant ON category_closure(descendant_id, ancestor_id, depth);
+
+-- Transactions table - main financial records
+CREATE TABLE transactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER DEFAULT NULL REFERENCES users(id) ON DELETE CASCADE, -- NULL for single-user mode
+    transaction_date DATE NOT NULL,
+    category_id INTEGER NOT NULL REFERENCES categories(id) ON DELETE RESTRICT,
+    description VARCHAR(255) NOT NULL,
+    credited DECIMAL(15, 2) DEFAULT 0.00,
+    debited DECIMAL(15, 2) DEFAULT 0.00,
+    running_balance DECIMAL(15, 2) DEFAULT 0.00,
+    currency VARCHAR(3) DEFAULT 'USD',
+    exchange_rate DECIMAL(10, 6) DEFAULT 1.000000,
+    original_amount DECIMAL(15, 2) DEFAULT NULL,
+    original_currency VARCHAR(3) DEFAULT NULL,
+    reference_number VARCHAR(100) DEFAULT '',
+    payment_method TEXT DEFAULT 'cash'
+        CHECK (payment_method IN ('cash', 'card', 'bank_transfer', 'check', 'digital_wallet', 'other')),
+    location VARCHAR(255) DEFAULT '',
+    tags VARCHAR(500) DEFAULT '',
+    notes TEXT,
+    receipt_url VARCHAR(500) DEFAULT '',
+    is_recurring BOOLEAN DEFAULT FALSE,
+    recurring_id INTEGER DEFAULT NULL REFERENCES recurring_transactions(id) ON DELETE SET NULL,
+    status TEXT DEFAULT 'active' CHECK (status IN ('active', 'inactive', 'pending', 'cancelled')),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX idx_transactions_date ON transactions(transaction_date);
+CREATE INDEX idx_transactions_category ON transactions(category_id);
+CREATE INDEX idx_transactions_user ON transactions(user_id);
+CREATE INDEX idx_transactions_status ON transactions(status);
+CREATE INDEX idx_transactions_amount ON transactions(credited, debited);
+CREATE INDEX idx_transactions_date_user ON transactions(transaction_date, user_id);
+CREATE INDEX idx_transactions_recurring ON transactions(recurring_id);
+CREATE INDEX idx_transactions_user_status_date ON transactions(user_id, status, transaction_date, created_at);
+CREATE INDEX idx_transactions_user_category_date ON transactions(user_id, category_id, transaction_date);
+CREATE INDEX idx_transactions_updated_at ON transactions(updated_at);
+CREATE INDEX idx_transactions_user_updated_at ON transactions(user_id, updated_at);
+
+-- Full-text search over description, notes and tags
+CREATE VIRTUAL TABLE transactions_fts USING fts5(
+    description, notes, tags,
+    content = 'transactions', content_rowid = 'id'
+);
+
+-- Recurring transactions for automated entries
+CREATE TABLE recurring_transactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER DEFAULT NULL REFERENCES users(id) ON DELETE CASCADE,
+    category_id INTEGER NOT NULL REFERENCES categories(id) ON DELETE RESTRICT,
+    description VARCHAR(255) NOT NULL,
+    amount DECIMAL(15, 2) NOT NULL,
+    type TEXT NOT NULL CHECK (type IN ('income', 'expense')),
+    frequency TEXT NOT NULL CHECK (frequency IN ('daily', 'weekly', 'monthly', 'quarterly', 'yearly')),
+    frequency_interval INTEGER DEFAULT 1, -- Every X days/weeks/months
+    start_date DATE NOT NULL,
+    end_date DATE DEFAULT NULL,
+    next_execution DATE NOT NULL,
+    last_execution DATE DEFAULT NULL,
+    execution_count INTEGER DEFAULT 0,
+    max_executions INTEGER DEFAULT NULL,
+    auto_execute BOOLEAN DEFAULT TRUE,
+    tags VARCHAR(500) DEFAULT '',
+    notes TEXT,
+    status TEXT DEFAULT 'active' CHECK (status IN ('active', 'inactive', 'completed')),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX idx_recurring_user ON recurring_transactions(user_id);
+CREATE INDEX idx_recurring_next_execution ON recurring_transactions(next_execution);
+CREATE INDEX idx_recurring_status ON recurring_transactions(status);
+CREATE INDEX idx_recurring_auto_execute ON recurring_transactions(auto_execute);
+
+-- Budget goals and tracking
+CREATE TABLE goals (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER DEFAULT NULL REFERENCES users(id) ON DELETE CASCADE,
+    category_id INTEGER DEFAULT NULL REFERENCES categories(id) ON DELETE CASCADE, -- NULL for overall budget
+    name VARCHAR(255) NOT NULL,
+    description TEXT,
+    goal_type TEXT NOT NULL CHECK (goal_type IN ('spending_limit', 'savings_target', 'income_target')),
+    target_amount DECIMAL(15, 2) NOT NULL,
+    current_amount DECIMAL(15, 2) DEFAULT 0.00,
+    period_type TEXT NOT NULL
+        CHECK (period_type IN ('daily', 'weekly', 'monthly', 'quarterly', 'yearly', 'one_time')),
+    start_date DATE NOT NULL,
+    end_date DATE DEFAULT NULL,
+    alert_threshold DECIMAL(5, 2) DEFAULT 80.00, -- Alert at 80% of target
+    alert_enabled BOOLEAN DEFAULT TRUE,
+    status TEXT DEFAULT 'active' CHECK (status IN ('active', 'inactive', 'completed', 'exceeded')),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX idx_goals_user ON goals(user_id);
+CREATE INDEX idx_goals_category ON goals(category_id);
+CREATE INDEX idx_goals_status ON goals(status);
+CREATE INDEX idx_goals_period ON goals(start_date, end_date);
+
+-- Audit log for tracking changes: JSON snapshots on insert, changed
+-- fields only on update/delete (written by the application, see audit.py)
+CREATE TABLE audit_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER DEFAULT NULL REFERENCES users(id) ON DELETE SET NULL,
+    table_name VARCHAR(50) NOT NULL,
+    record_id INTEGER NOT NULL,
+    action TEXT NOT NULL CHECK (action IN ('INSERT', 'UPDATE', 'DELETE')),
+    old_values JSON DEFAULT NULL,
+    new_values JSON DEFAULT NULL,
+    ip_address VARCHAR(45) DEFAULT NULL,
+    user_agent TEXT DEFAULT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX idx_audit_log_user ON audit_log(user_id);
+CREATE INDEX idx_audit_log_table_record ON audit_log(table_name, record_id);
+CREATE INDEX idx_audit_log_action ON audit_log(action);
+CREATE INDEX idx_audit_log_created_at ON audit_log(created_at);
+CREATE INDEX idx_audit_log_user_created_at ON audit_log(user_id, created_at);
+
+-- Tags for flexible categorization
+CREATE TABLE tags (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER DEFAULT NULL REFERENCES users(id) ON DELETE CASCADE,
+    name VARCHAR(50) NOT NULL,
+    color VARCHAR(7) DEFAULT '#6b7280',
+    usage_count INTEGER DEFAULT 0,
+    status TEXT DEFAULT 'active' CHECK (status IN ('active', 'inactive')),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (user_id, name)
+);
+CREATE INDEX idx_tags_user ON tags(user_id);
+CREATE INDEX idx_tags_name ON tags(name);
+CREATE INDEX idx_tags_usage_count ON tags(usage_count);
+
+-- Junction table for transaction-tag relationships
+CREATE TABLE transaction_tags (
+    transaction_id INTEGER NOT NULL REFERENCES transactions(id) ON DELETE CASCADE,
+    tag_id INTEGER NOT NULL REFERENCES tags(id) ON DELETE CASCADE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (transaction_id, tag_id)
+);
+CREATE INDEX idx_transaction_tags_tag_transaction ON transaction_tags(tag_id, transaction_id);
+
+-- Streaming per-category statistics for anomaly detection
+-- (Welford n/mean/m2 of amounts plus decayed transaction counts)
+CREATE TABLE category_stats (
+    user_id INTEGER DEFAULT NULL REFERENCES users(id) ON DELETE CASCADE,
+    user_key INTEGER GENERATED ALWAYS AS (COALESCE(user_id, 0)) STORED, -- 0 for single-user mode
+    category_id INTEGER NOT NULL REFERENCES categories(id) ON DELETE CASCADE,
+    n INTEGER NOT NULL DEFAULT 0,
+    mean DOUBLE NOT NULL DEFAULT 0,
+    m2 DOUBLE NOT NULL DEFAULT 0,
+    short_count DOUBLE NOT NULL DEFAULT 0,
+    long_count DOUBLE NOT NULL DEFAULT 0,
+    first_event_date DATE DEFAULT NULL,
+    last_event_date DATE DEFAULT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE UNIQUE INDEX idx_category_stats_key ON category_stats(user_key, category_id);
+
+-- Transactions flagged as unusual for their category
+CREATE TABLE transaction_anomalies (
+    transaction_id INTEGER PRIMARY KEY REFERENCES transactions(id) ON DELETE CASCADE,
+    user_id INTEGER DEFAULT NULL REFERENCES users(id) ON DELETE CASCADE,
+    category_id INTEGER NOT NULL,
+    reasons VARCHAR(50) NOT NULL, -- Comma-separated: amount, frequency
+    z_score DECIMAL(10, 4) DEFAULT NULL,
+    frequency_ratio DECIMAL(10, 4) DEFAULT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX idx_transaction_anomalies_user_transaction ON transaction_anomalies(user_id, transaction_id);
+
+-- Blocking keys for near-duplicate detection (see duplicates.py)
+CREATE TABLE duplicate_keys (
+    transaction_id INTEGER NOT NULL REFERENCES transactions(id) ON DELETE CASCADE,
+    block_key BIGINT NOT NULL,
+    user_id INTEGER DEFAULT NULL REFERENCES users(id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    PRIMARY KEY (transaction_id, block_key)
+);
+CREATE INDEX idx_duplicate_keys_user_block_day ON duplicate_keys(user_id, block_key, day);
+
+-- Description word counts per category for auto-categorization (see categorizer.py)
+CREATE TABLE category_token_counts (
+    user_id INTEGER DEFAULT NULL REFERENCES users(id) ON DELETE CASCADE,
+    user_key INTEGER GENERATED ALWAYS AS (COALESCE(user_id, 0)) STORED, -- 0 for single-user mode
+    token VARCHAR(50) NOT NULL,
+    category_id INTEGER NOT NULL REFERENCES categories(id) ON DELETE CASCADE,
+    count INTEGER NOT NULL DEFAULT 0
+);
+CREATE UNIQUE INDEX idx_category_token_counts_key ON category_token_counts(user_key, token, category_id);
+
+-- Exchange rates for multi-currency support
+CREATE TABLE exchange_rates (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    base_currency VARCHAR(3) NOT NULL,
+    target_currency VARCHAR(3) NOT NULL,
+    rate DECIMAL(10, 6) NOT NULL,
+    date DATE NOT NULL,
+    source VARCHAR(50) DEFAULT 'manual',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (base_currency, target_currency, date)
+);
+CREATE INDEX idx_exchange_rates_currencies ON exchange_rates(base_currency, target_currency);
+CREATE INDEX idx_exchange_rates_date ON exchange_rates(date);
+
+-- Soft delete storage (trash bin)
+CREATE TABLE trash_bin (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER DEFAULT NULL REFERENCES users(id) ON DELETE CASCADE,
+    table_name VARCHAR(50) NOT NULL,
+    record_id INTEGER NOT NULL,
+    original_data JSON NOT NULL,
+    deleted_by INTEGER DEFAULT NULL REFERENCES users(id) ON DELETE SET NULL,
+    deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    restore_before TIMESTAMP DEFAULT NULL -- Auto-delete after this date
+);
+CREATE INDEX idx_trash_bin_user ON trash_bin(user_id);
+CREATE INDEX idx_trash_bin_table_record ON trash_bin(table_name, record_id);
+CREATE INDEX idx_trash_bin_deleted_at ON trash_bin(deleted_at);
+CREATE INDEX idx_trash_bin_restore_before ON trash_bin(restore_before);
+
+-- User sessions for JWT token management
+CREATE TABLE user_sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    token_hash VARCHAR(255) NOT NULL,
+    refresh_token_hash VARCHAR(255) DEFAULT NULL,
+    device_info TEXT DEFAULT NULL,
+    ip_address VARCHAR(45) DEFAULT NULL,
+    expires_at TIMESTAMP NOT NULL,
+    last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    status TEXT DEFAULT 'active' CHECK (status IN ('active', 'expired', 'revoked')),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX idx_user_sessions_user ON user_sessions(user_id);
+CREATE INDEX idx_user_sessions_token ON user_sessions(token_hash);
+CREATE INDEX idx_user_sessions_expires_at ON user_sessions(expires_at);
+CREATE INDEX idx_user_sessions_status ON user_sessions(status);
+CREATE INDEX idx_user_sessions_activity ON user_sessions(last_activity);
+
+-- Performance monitoring
+CREATE TABLE performance_metrics (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    metric_name VARCHAR(100) NOT NULL,
+    metric_value DECIMAL(15, 4) NOT NULL,
+    unit VARCHAR(20) DEFAULT 'ms',
+    endpoint VARCHAR(255) DEFAULT NULL,
+    user_id INTEGER DEFAULT NULL,
+    recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX idx_performance_metrics_name ON performance_metrics(metric_name);
+CREATE INDEX idx_performance_metrics_recorded_at ON performance_metrics(recorded_at);
+CREATE INDEX idx_performance_metrics_endpoint ON performance_metrics(endpoint);
+
+-- Backup runs
+CREATE TABLE backup_info (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    backup_type TEXT NOT NULL CHECK (backup_type IN ('full', 'incremental', 'transaction_only')),
+    parent_id INTEGER DEFAULT NULL REFERENCES backup_info(id) ON DELETE SET NULL,
+    file_path VARCHAR(500) NOT NULL,
+    file_size BIGINT DEFAULT NULL,
+    row_count BIGINT DEFAULT NULL,
+    start_time TIMESTAMP NOT NULL,
+    end_time TIMESTAMP DEFAULT NULL,
+    watermark TIMESTAMP DEFAULT NULL,
+    status TEXT DEFAULT 'running' CHECK (status IN ('running', 'completed', 'failed')),
+    error_message TEXT DEFAULT NULL,
+    created_by INTEGER DEFAULT NULL REFERENCES users(id) ON DELETE SET NULL
+);
+CREATE INDEX idx_backup_info_type ON backup_info(backup_type);
+CREATE INDEX idx_backup_info_start_time ON backup_info(start_time);
+CREATE INDEX idx_backup_info_status ON backup_info(status);
+
+-- Additional performance indexes
+CREATE INDEX idx_transactions_date_amount ON transactions(transaction_date, credited, debited);
+CREATE INDEX idx_transactions_category_date ON transactions(category_id, transaction_date);
+
+-- updated_at maintenance (MySQL: ON UPDATE CURRENT_TIMESTAMP)
+CREATE TRIGGER users_touch AFTER UPDATE ON users FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at
+BEGIN UPDATE users SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id; END;
+CREATE TRIGGER categories_touch AFTER UPDATE ON categories FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at
+BEGIN UPDATE categories SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id; END;
+CREATE TRIGGER transactions_touch AFTER UPDATE ON transactions FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at
+BEGIN UPDATE transactions SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id; END;
+CREATE TRIGGER recurring_transactions_touch AFTER UPDATE ON recurring_transactions FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at
+BEGIN UPDATE recurring_transactions SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id; END;
+CREATE TRIGGER goals_touch AFTER UPDATE ON goals FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at
+BEGIN UPDATE goals SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id; END;
+CREATE TRIGGER tags_touch AFTER UPDATE ON tags FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at
+BEGIN UPDATE tags SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id; END;
+CREATE TRIGGER category_stats_touch AFTER UPDATE ON category_stats FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at
+BEGIN UPDATE category_stats SET updated_at = CURRENT_TIMESTAMP WHERE rowid = NEW.rowid; END;
+
+-- Full-text index maintenance
+CREATE TRIGGER transactions_fts_insert AFTER INSERT ON transactions
+BEGIN
+    INSERT INTO transactions_fts (rowid, description, notes, tags)
+    VALUES (NEW.id, NEW.description, NEW.notes, NEW.tags);
+END;
+CREATE TRIGGER transactions_fts_delete AFTER DELETE ON transactions
+BEGIN
+    INSERT INTO transactions_fts (transactions_fts, rowid, description, notes, tags)
+    VALUES ('delete', OLD.id, OLD.description, OLD.notes, OLD.tags);
+END;
+CREATE TRIGGER transactions_fts_update AFTER UPDATE OF description, notes, tags ON transactions
+BEGIN
+    INSERT INTO transactions_fts (transactions_fts, rowid, description, notes, tags)
+    VALUES ('delete', OLD.id, OLD.description, OLD.notes, OLD.tags);
+    INSERT INTO transactions_fts (rowid, description, notes, tags)
+    VALUES (NEW.id, NEW.description, NEW.notes, NEW.tags);
+END;
+
+-- Background export jobs; files are written under EXPORT_DIR
+CREATE TABLE export_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER DEFAULT NULL REFERENCES users(id) ON DELETE CASCADE,
+    format VARCHAR(10) NOT NULL,
+    filters JSON NOT NULL,
+    fingerprint CHAR(64) NOT NULL, -- sha256 of user, format and filters
+    status TEXT NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'running', 'done', 'failed', 'expired')),
+    total_rows INTEGER DEFAULT NULL,
+    rows_written INTEGER NOT NULL DEFAULT 0,
+    file_size INTEGER DEFAULT NULL,
+    error VARCHAR(255) DEFAULT NULL,
+    snapshot_at TIMESTAMP DEFAULT NULL, -- when the worker started reading
+    heartbeat_at TIMESTAMP DEFAULT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP DEFAULT NULL
+);
+CREATE INDEX idx_export_jobs_status ON export_jobs(status, id);
+CREATE INDEX idx_export_jobs_fingerprint ON export_jobs(fingerprint, created_at);
+
+-- Insert default categories
+INSERT INTO categories (name, description, color, icon, is_income, is_system, status) VALUES
+-- Income categories
+('Salary', 'Regular employment income', '#10b981', '💼', TRUE, TRUE, 'active'),
+('Freelance', 'Freelance and contract work', '#3b82f6', '💻', TRUE, TRUE, 'active'),
+('Business', 'Business income and profits', '#8b5cf6', '🏢', TRUE, TRUE, 'active'),
+('Investments', 'Dividends, interest, capital gains', '#f59e0b', '📈', TRUE, TRUE, 'active'),
+('Gifts', 'Money received as gifts', '#ec4899', '🎁', TRUE, TRUE, 'active'),
+('Other Income', 'Miscellaneous income', '#6b7280', '💰', TRUE, TRUE, 'active'),
+
+-- Expense categories
+('Food & Dining', 'Restaurants, groceries, food delivery', '#ef4444', '🍽️', FALSE, TRUE, 'active'),
+('Transportation', 'Gas, public transport, rideshare', '#3b82f6', '🚗', FALSE, TRUE, 'active'),
+('Shopping', 'Clothing, electronics, general shopping', '#f59e0b', '🛒', FALSE, TRUE, 'active'),
+('Entertainment', 'Movies, games, hobbies, subscriptions', '#8b5cf6', '🎮', FALSE, TRUE, 'active'),
+('Bills & Utilities', 'Electricity, water, internet, phone', '#ef4444', '📋', FALSE, TRUE, 'active'),
+('Healthcare', 'Medical, dental, pharmacy, insurance', '#10b981', '🏥', FALSE, TRUE, 'active'),
+('Education', 'Tuition, books, courses, training', '#3b82f6', '📚', FALSE, TRUE, 'active'),
+('Travel', 'Flights, hotels, vacation expenses', '#f59e0b', '✈️', FALSE, TRUE, 'active'),
+('Home & Garden', 'Rent, mortgage, home improvement', '#10b981', '🏠', FALSE, TRUE, 'active'),
+('Personal Care', 'Haircuts, cosmetics, gym, wellness', '#ec4899', '💅', FALSE, TRUE, 'active'),
+('Gifts & Donations', 'Gifts given, charitable donations', '#8b5cf6', '🎁', FALSE, TRUE, 'active'),
+('Taxes', 'Income tax, property tax, other taxes', '#6b7280', '📄', FALSE, TRUE, 'active'),
+('Insurance', 'Life, auto, home insurance premiums', '#ef4444', '🛡️', FALSE, TRUE, 'active'),
+('Bank Fees', 'ATM fees, account fees, interest paid', '#f59e0b', '🏦', FALSE, TRUE, 'active'),
+('Other Expenses', 'Miscellaneous expenses', '#6b7280', '📝', FALSE, TRUE, 'active');
+
+-- Default categories are all top-level
+INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+SELECT id, id, 0 FROM categories;
+
+-- Insert demo user (password: "demo123")
+INSERT INTO users (email, password_hash, name, status, email_verified) VALUES
+('demo@spendtracker.app', 'pbkdf2:sha256:260000$YourHashedPassword', 'Demo User', 'active', TRUE);
+
+-- Insert some default tags
+INSERT INTO tags (name, color, usage_count) VALUES
+('work', '#3b82f6', 0),
+('personal', '#10b981', 0),
+('urgent', '#ef4444', 0),
+('recurring', '#f59e0b', 0),
+('cash', '#6b7280', 0),
+('online', '#8b5cf6', 0),
+('subscription', '#ec4899', 0);
+
+-- Insert sample exchange rates (USD base)
+INSERT INTO exchange_rates (base_currency, target_currency, rate, date, source) VALUES
+('USD', 'EUR', 0.85, date('now'), 'manual'),
+('USD', 'GBP', 0.75, date('now'), 'manual'),
+('USD', 'JPY', 110.00, date('now'), 'manual'),
+('USD', 'CAD', 1.25, date('now'), 'manual'),
+('USD', 'AUD', 1.35, date('now'), 'manual'),
+('USD', 'CHF', 0.92, date('now'), 'manual'),
+('USD', 'CNY', 6.45, date('now'), 'manual'),
+('USD', 'INR', 75.00, date('now'), 'manual');
+
+-- Create views for common queries
+CREATE VIEW transaction_summary AS
+SELECT
+    strftime('%Y-%m', transaction_date) AS month,
+    SUM(credited) AS total_income,
+    SUM(debited) AS total_expenses,
+    SUM(credited - debited) AS net_amount,
+    COUNT(*) AS transaction_count
+FROM transactions
+WHERE status = 'active'
+GROUP BY strftime('%Y-%m', transaction_date)
+ORDER BY month DESC;
+
+CREATE VIEW category_summary AS
+SELECT
+    c.id,
+    c.name,
+    c.color,
+    c.icon,
+    c.is_income,
+    COUNT(t.id) AS transaction_count,
+    COALESCE(SUM(t.credited), 0) AS total_income,
+    COALESCE(SUM(t.debited), 0) AS total_expenses,
+    COALESCE(SUM(t.credited - t.debited), 0) AS net_amount
+FROM categories c
+LEFT JOIN transactions t ON c.id = t.category_id AND t.status = 'active'
+WHERE c.status = 'active'
+GROUP BY c.id, c.name, c.color, c.icon, c.is_income
+ORDER BY c.name;
+
+-- Totals per category including all of its subcategories
+CREATE VIEW category_tree_summary AS
+SELECT
+    c.id,
+    c.name,
+    c.parent_id,
+    COUNT(t.id) AS transaction_count,
+    COALESCE(SUM(t.credited), 0) AS total_income,
+    COALESCE(SUM(t.debited), 0) AS total_expenses,
+    COALESCE(SUM(t.credited - t.debited), 0) AS net_amount
+FROM categories c
+JOIN category_closure cc ON cc.ancestor_id = c.id
+LEFT JOIN transactions t ON t.category_id = cc.descendant_id AND t.status = 'active'
+WHERE c.status = 'active'
+GROUP BY c.id, c.name, c.parent_id;
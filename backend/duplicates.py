@@ -0,0 +1,268 @@
+"""
+Near-duplicate transaction detection
+
+Imports and manual entry produce near-duplicates: the same amount within a
+few days, with a description that differs in store numbers, card suffixes
+or casing. Comparing each new transaction with all of history is O(n^2).
+Instead every active transaction has a few blocking keys in
+duplicate_keys: one for its signed amount and one for each normalized
+description token, stored with its date. Finding candidates is one range
+read of idx_user_block_day: the new row's keys, within
+DUPLICATE_WINDOW_DAYS of its date. The cost depends on how many
+transactions share a key in that window, not on the size of history.
+
+Candidates are scored on amount, date distance and description
+similarity. The confidence lies between 0 and 1, and matches at or above
+DUPLICATE_THRESHOLD are reported. A key shared through the description
+finds a near-duplicate whose amount was mistyped. A key shared through the
+amount finds one whose description was rewritten.
+"""
+
+import hashlib
+import os
+import re
+import unicodedata
+from collections import defaultdict
+from datetime import timedelta
+from difflib import SequenceMatcher
+
+from timeseries import parse_date, to_cents
+
+DUPLICATE_WINDOW_DAYS = int(os.getenv('DUPLICATE_WINDOW_DAYS', 2))
+DUPLICATE_THRESHOLD = float(os.getenv('DUPLICATE_THRESHOLD', 0.8))
+DUPLICATE_SCAN_MAX_PAIRS = int(os.getenv('DUPLICATE_SCAN_MAX_PAIRS', 20000))
+# Keys per transaction beyond the amount key, and matches kept per row
+MAX_KEY_TOKENS = 6
+MAX_MATCHES = 5
+# Rows sharing a key inside the window that are scored, most shared keys first
+MAX_CANDIDATES = 50
+LOOKUP_CHUNK = 500
+
+WEIGHTS = {'amount': 0.4, 'description': 0.4, 'date': 0.2}
+
+# Words that appear in most bank descriptions and tell rows apart poorly
+STOPWORDS = {
+    'the', 'and', 'for', 'of', 'to', 'at', 'in', 'on', 'from', 'pos', 'purchase', 'payment',
+    'debit', 'credit', 'card', 'online', 'ref', 'inc', 'llc', 'ltd', 'co', 'com', 'www'
+}
+TOKEN = re.compile(r'[a-z]{2,}')
+
+def tokens(description):
+    """Normalized description words: lowercase letters only, without
+    accents, digits (store and card numbers) or stopwords, first seen first"""
+    text = unicodedata.normalize('NFKD', str(description or '')).encode('ascii', 'ignore').decode().lower()
+    seen = []
+    for token in TOKEN.findall(text):
+        if token not in STOPWORDS and token not in seen:
+            seen.append(token)
+    return seen
+
+def amount_cents(credited, debited):
+    """Signed amount in cents; income and spending never match"""
+    return to_cents(credited) - to_cents(debited)
+
+def block_key(kind, value):
+    """64-bit signed hash of one blocking key"""
+    digest = hashlib.blake2b(f"{kind}:{value}".encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+def prepare(row):
+    """Comparable form of a transaction dict"""
+    words = tokens(row['description'])
+    cents = amount_cents(row.get('credited'), row.get('debited'))
+    return {
+        'id': row.get('id'),
+        'day': parse_date(row['transaction_date']),
+        'cents': cents,
+        'tokens': words,
+        'keys': [block_key('a', cents)] + [block_key('t', word) for word in words[:MAX_KEY_TOKENS]],
+        'row': row
+    }
+
+def description_similarity(first, second):
+    if not first['tokens'] and not second['tokens']:
+        return SequenceMatcher(None, str(first['row']['description']).lower(),
+                               str(second['row']['description']).lower()).ratio()
+    a, b = set(first['tokens']), set(second['tokens'])
+    jaccard = len(a & b) / len(a | b) if a | b else 0.0
+    # Catches misspellings and words run together, which share no token
+    ratio = SequenceMatcher(None, ' '.join(first['tokens']), ' '.join(second['tokens'])).ratio()
+    return max(jaccard, ratio)
+
+def confidence(first, second):
+    """How likely two prepared transactions are the same one, from 0 to 1"""
+    if first['cents'] == second['cents']:
+        amount = 1.0
+    elif first['cents'] * second['cents'] <= 0:
+        amount = 0.0
+    else:
+        # A mistyped amount: fades out at 20% apart
+        difference = abs(first['cents'] - second['cents']) / max(abs(first['cents']), abs(second['cents']))
+        amount = max(0.0, 1.0 - difference * 5)
+    days = abs((first['day'] - second['day']).days)
+    date = max(0.0, 1.0 - days / (DUPLICATE_WINDOW_DAYS + 1))
+    score = (WEIGHTS['amount'] * amount + WEIGHTS['description'] * description_similarity(first, second)
+             + WEIGHTS['date'] * date)
+    return round(score, 4)
+
+def _values(row, keys):
+    return tuple(row[key] for key in keys) if isinstance(row, dict) else tuple(row)
+
+def _chunks(items, size=LOOKUP_CHUNK):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def index_transactions(cursor, user_id, rows):
+    """Store the blocking keys of inserted transactions (dicts with id)"""
+    keyed = [(row['id'], key, user_id, item['day'])
+             for row in rows for item in [prepare(row)] for key in item['keys']]
+    if keyed:
+        cursor.executemany("""
+            INSERT IGNORE INTO duplicate_keys (transaction_id, block_key, user_id, day)
+            VALUES (%s, %s, %s, %s)
+        """, keyed)
+
+def remove_transactions(cursor, transaction_ids):
+    """Drop the keys of deleted transactions"""
+    for chunk in _chunks(sorted(set(transaction_ids))):
+        placeholders = ', '.join(['%s'] * len(chunk))
+        cursor.execute(f"DELETE FROM duplicate_keys WHERE transaction_id IN ({placeholders})", chunk)
+
+def reindex_transactions(cursor, user_id, rows):
+    """Replace the keys of edited transactions"""
+    remove_transactions(cursor, [row['id'] for row in rows])
+    index_transactions(cursor, user_id, rows)
+
+def fetch_transactions(cursor, transaction_ids):
+    """Active transactions by id, prepared for scoring"""
+    found = {}
+    columns = ('id', 'transaction_date', 'description', 'credited', 'debited', 'category_id')
+    for chunk in _chunks(sorted(transaction_ids)):
+        placeholders = ', '.join(['%s'] * len(chunk))
+        cursor.execute(f"""
+            SELECT {', '.join(columns)} FROM transactions
+            WHERE id IN ({placeholders}) AND status = 'active'
+        """, chunk)
+        for row in cursor.fetchall():
+            row = dict(zip(columns, _values(row, columns)))
+            found[row['id']] = prepare(row)
+    return found
+
+def describe(item, score):
+    row = item['row']
+    return {
+        'id': item['id'],
+        'transaction_date': str(item['day']),
+        'description': row['description'],
+        'credited': float(row.get('credited') or 0),
+        'debited': float(row.get('debited') or 0),
+        'confidence': score
+    }
+
+def find_duplicates(cursor, user_id, rows, threshold=DUPLICATE_THRESHOLD):
+    """Likely duplicates of new transactions, one list per row
+
+    Each row is matched against indexed transactions and against the rows
+    before it in the same batch. A row may carry an id when it is already
+    inserted; it is never matched with itself. A match with an earlier
+    batch row also carries that row's 'index'.
+    """
+    if not rows:
+        return []
+    items = [prepare(row) for row in rows]
+    window = timedelta(days=DUPLICATE_WINDOW_DAYS)
+    first_day = min(item['day'] for item in items) - window
+    last_day = max(item['day'] for item in items) + window
+
+    # Every stored posting of the batch's keys inside its date span
+    postings = defaultdict(list)
+    for chunk in _chunks(sorted({key for item in items for key in item['keys']})):
+        placeholders = ', '.join(['%s'] * len(chunk))
+        cursor.execute(f"""
+            SELECT block_key, day, transaction_id FROM duplicate_keys
+            WHERE user_id <=> %s AND block_key IN ({placeholders}) AND day BETWEEN %s AND %s
+        """, [user_id, *chunk, first_day, last_day])
+        for key, day, transaction_id in (_values(row, ('block_key', 'day', 'transaction_id'))
+                                         for row in cursor.fetchall()):
+            postings[key].append((parse_date(day), transaction_id))
+
+    shared = []
+    for item in items:
+        counts = defaultdict(int)
+        for key in item['keys']:
+            for day, transaction_id in postings.get(key, ()):
+                if transaction_id != item['id'] and abs((day - item['day']).days) <= DUPLICATE_WINDOW_DAYS:
+                    counts[transaction_id] += 1
+        shared.append(sorted(counts, key=lambda transaction_id: -counts[transaction_id])[:MAX_CANDIDATES])
+
+    stored = fetch_transactions(cursor, {transaction_id for ids in shared for transaction_id in ids})
+
+    results = []
+    batch_postings = defaultdict(list)
+    for index, item in enumerate(items):
+        matches = []
+        for transaction_id in shared[index]:
+            if transaction_id in stored:
+                score = confidence(item, stored[transaction_id])
+                if score >= threshold:
+                    matches.append(describe(stored[transaction_id], score))
+        earlier = {other for key in item['keys'] for other in batch_postings[key]
+                   if abs((items[other]['day'] - item['day']).days) <= DUPLICATE_WINDOW_DAYS}
+        for other in earlier:
+            score = confidence(item, items[other])
+            if score >= threshold:
+                matches.append(dict(describe(items[other], score), index=other))
+        for key in item['keys']:
+            batch_postings[key].append(index)
+        matches.sort(key=lambda match: -match['confidence'])
+        results.append(matches[:MAX_MATCHES])
+    return results
+
+def scan(cursor, user_id, from_date=None, to_date=None, threshold=DUPLICATE_THRESHOLD, limit=100):
+    """Likely duplicate pairs among a user's transactions, most confident first
+
+    Pairs come from a self-join of duplicate_keys on shared keys inside the
+    window, so only blocked pairs are ever scored. A pair is found when
+    either of its transactions is dated inside from_date..to_date. Returns (pairs,
+    truncated); truncated is set when more than DUPLICATE_SCAN_MAX_PAIRS
+    candidate pairs were found and the rest were not scored.
+    """
+    date_filter = ""
+    params = [DUPLICATE_WINDOW_DAYS, DUPLICATE_WINDOW_DAYS, user_id, user_id]
+    if from_date:
+        date_filter += " AND a.day >= %s"
+        params.append(from_date)
+    if to_date:
+        date_filter += " AND a.day <= %s"
+        params.append(to_date)
+    params.append(DUPLICATE_SCAN_MAX_PAIRS + 1)
+
+    cursor.execute(f"""
+        SELECT DISTINCT a.transaction_id AS first_id, b.transaction_id AS second_id
+        FROM duplicate_keys a
+        JOIN duplicate_keys b ON b.block_key = a.block_key
+            AND b.day BETWEEN DATE_SUB(a.day, INTERVAL %s DAY) AND DATE_ADD(a.day, INTERVAL %s DAY)
+            AND b.transaction_id <> a.transaction_id
+            AND b.user_id <=> %s
+        WHERE a.user_id <=> %s{date_filter}
+        LIMIT %s
+    """, params)
+    rows = cursor.fetchall()
+    truncated = len(rows) > DUPLICATE_SCAN_MAX_PAIRS
+    # Each pair appears once from each side when both lie in the range
+    pairs = sorted({tuple(sorted(_values(row, ('first_id', 'second_id'))))
+                    for row in rows[:DUPLICATE_SCAN_MAX_PAIRS]})
+
+    stored = fetch_transactions(cursor, {transaction_id for pair in pairs for transaction_id in pair})
+    results = []
+    for first_id, second_id in pairs:
+        if first_id in stored and second_id in stored:
+            score = confidence(stored[first_id], stored[second_id])
+            if score >= threshold:
+                results.append({
+                    'confidence': score,
+                    'transactions': [describe(stored[first_id], score), describe(stored[second_id], score)]
+                })
+    results.sort(key=lambda pair: (-pair['confidence'], pair['transactions'][0]['id']))
+    return results[:limit], truncated
@@ -0,0 +1,347 @@
+"""
+Background export jobs
+
+POST /api/exports records a job in export_jobs and returns at once. Worker
+threads in every app process claim queued jobs with SKIP LOCKED, the same
+way the trash archiver takes its batches. Each job reads its transactions in
+keyset-paginated batches on short-lived connections and appends them to a
+file under EXPORT_DIR, updating rows_written as it goes so clients can poll
+progress. The file is written as <name>.part and renamed when complete, so a
+download never sees a partial export.
+
+A request matching a recent job (same user, format and filters) reuses that
+job, and its file, when no transaction of the user has changed since the
+job read its data. A worker heartbeats before each of its queries, so a
+job whose heartbeat is older than the longest background query plus a
+margin (EXPORT_STALE_SECONDS, never less) lost its worker and is
+reclaimed. Finished files are deleted after EXPORT_RETENTION_HOURS.
+
+EXPORT_DIR must be shared by all app servers when there is more than one.
+"""
+
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+from guardrails import QUERY_TIMEOUTS_MS
+from serialization import json_default
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = os.getenv('EXPORT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'exports'))
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 5000))
+EXPORT_POLL_SECONDS = float(os.getenv('EXPORT_POLL_SECONDS', 2))
+# Below this a worker still inside one slow query could lose its job
+EXPORT_MIN_STALE_SECONDS = QUERY_TIMEOUTS_MS['background'] // 1000 + 60
+EXPORT_STALE_SECONDS = int(os.getenv('EXPORT_STALE_SECONDS', EXPORT_MIN_STALE_SECONDS))
+if EXPORT_STALE_SECONDS < EXPORT_MIN_STALE_SECONDS:
+    logger.warning(f"EXPORT_STALE_SECONDS raised to {EXPORT_MIN_STALE_SECONDS}, "
+                   f"past the background query timeout")
+    EXPORT_STALE_SECONDS = EXPORT_MIN_STALE_SECONDS
+EXPORT_REUSE_SECONDS = int(os.getenv('EXPORT_REUSE_SECONDS', 3600))
+EXPORT_RETENTION_HOURS = int(os.getenv('EXPORT_RETENTION_HOURS', 24))
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+# The filters an export accepts, as for GET /api/transactions
+FILTER_KEYS = ('category_id', 'include_subcategories', 'from_date', 'to_date', 'tags', 'match')
+COLUMNS = ['transaction_date', 'category', 'description', 'credited', 'debited',
+           'running_balance', 'tags', 'notes']
+
+def normalize_filters(args):
+    """The export filters present in args, as a plain dict of strings"""
+    return {key: str(args[key]) for key in FILTER_KEYS if args.get(key) not in (None, '')}
+
+def fingerprint(user_id, export_format, filters):
+    """Identity of an export request, for reusing identical recent jobs"""
+    key = json.dumps([user_id, export_format, filters], sort_keys=True)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+def file_name(job):
+    return f"transactions_{job['id']}.{FORMATS[job['format']][1]}"
+
+def file_path(job):
+    return os.path.join(EXPORT_DIR, file_name(job))
+
+def encode_rows(rows, export_format, header=False):
+    """Serialize a batch of row dicts"""
+    if export_format == 'ndjson':
+        return ''.join(json.dumps(row, default=json_default) + '\n' for row in rows)
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=COLUMNS)
+    if header:
+        writer.writeheader()
+    writer.writerows(rows)
+    return output.getvalue()
+
+JOB_COLUMNS = """id, user_id, format, filters, fingerprint, status, total_rows, rows_written,
+    file_size, error, snapshot_at, created_at, finished_at"""
+
+def find_reusable(cursor, user_id, key):
+    """A recent queued, running or finished job for the same export whose
+    data has not changed since it was read, or None"""
+    cursor.execute(f"""
+        SELECT {JOB_COLUMNS}
+        FROM export_jobs
+        WHERE fingerprint = %s AND user_id <=> %s AND created_at >= DATE_SUB(NOW(), INTERVAL %s SECOND)
+            AND status IN ('queued', 'running', 'done')
+        ORDER BY id DESC
+        LIMIT 1
+    """, (key, user_id, EXPORT_REUSE_SECONDS))
+    job = cursor.fetchone()
+    if job is None or job['snapshot_at'] is None:
+        return job
+
+    # Any write after the snapshot (idx_user_updated_at) makes it stale
+    cursor.execute("""
+        SELECT 1 FROM transactions
+        WHERE user_id <=> %s AND updated_at >= %s
+        LIMIT 1
+    """, (user_id, job['snapshot_at']))
+    return None if cursor.fetchone() else job
+
+def enqueue(cursor, user_id, export_format, filters):
+    """Reuse a matching job or queue a new one; returns (job_id, reused)"""
+    key = fingerprint(user_id, export_format, filters)
+    job = find_reusable(cursor, user_id, key)
+    if job:
+        return job['id'], True
+    cursor.execute("""
+        INSERT INTO export_jobs (user_id, format, filters, fingerprint, status, created_at)
+        VALUES (%s, %s, %s, %s, 'queued', NOW())
+    """, (user_id, export_format, json.dumps(filters), key))
+    return cursor.lastrowid, False
+
+def get_job(cursor, job_id, user_id):
+    cursor.execute(f"""
+        SELECT {JOB_COLUMNS}
+        FROM export_jobs
+        WHERE id = %s AND user_id <=> %s
+    """, (job_id, user_id))
+    return cursor.fetchone()
+
+def describe(job):
+    """API shape of a job"""
+    total = job['total_rows']
+    return {
+        'id': job['id'],
+        'format': job['format'],
+        'filters': json.loads(job['filters']) if isinstance(job['filters'], (str, bytes)) else job['filters'],
+        'status': job['status'],
+        'rows_written': job['rows_written'],
+        'total_rows': total,
+        'progress': 1.0 if job['status'] == 'done' else (round(job['rows_written'] / total, 4) if total else 0.0),
+        'file_size': job['file_size'],
+        'error': job['error'],
+        'created_at': job['created_at'],
+        'finished_at': job['finished_at'],
+        'download_url': f"/api/exports/{job['id']}/download" if job['status'] == 'done' else None
+    }
+
+class ExportWorkerPool:
+    """Threads that claim and run queued export jobs
+
+    build_query(user_id, filters) returns (select_sql, params) for the
+    transactions to export, with the list filters applied. The SQL must
+    select t.id and t.transaction_date. The pool adds the keyset ordering.
+    """
+
+    def __init__(self, get_connection, build_query, workers=2):
+        self.get_connection = get_connection
+        self.build_query = build_query
+        self.workers = workers
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.threads = []
+        self.last_cleanup = datetime.min
+        self.counters = {'completed': 0, 'failed': 0, 'rows': 0}
+
+    def start(self):
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        for n in range(self.workers):
+            thread = threading.Thread(target=self._loop, name=f'export-worker-{n}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def notify(self):
+        """Wake the workers after a job was queued in this process"""
+        self.wakeup.set()
+
+    def stop(self):
+        """Let the workers exit once their current job is done"""
+        self.stopping.set()
+        self.wakeup.set()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def _loop(self):
+        while not self.stopping.is_set():
+            try:
+                job = self.claim()
+                if job:
+                    self.run(job)
+                    continue
+                self.cleanup()
+            except Exception as e:
+                logger.error(f"Export worker error: {e}")
+            self.wakeup.wait(EXPORT_POLL_SECONDS)
+            self.wakeup.clear()
+
+    def claim(self):
+        """Take the oldest queued (or abandoned running) job, or None"""
+        connection = self.get_connection()
+        try:
+            connection.start_transaction()
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute(f"""
+                SELECT {JOB_COLUMNS}
+                FROM export_jobs
+                WHERE status = 'queued'
+                    OR (status = 'running' AND heartbeat_at < DATE_SUB(NOW(), INTERVAL %s SECOND))
+                ORDER BY id
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            """, (EXPORT_STALE_SECONDS,))
+            job = cursor.fetchone()
+            if job:
+                # The snapshot time bounds which writes can make the result
+                # stale; it is compared with updated_at, so both come from
+                # the database's clock
+                cursor.execute("""
+                    UPDATE export_jobs
+                    SET status = 'running', rows_written = 0, snapshot_at = NOW(), heartbeat_at = NOW()
+                    WHERE id = %s
+                """, (job['id'],))
+            connection.commit()
+            cursor.close()
+            return job
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+    def _update(self, job_id, assignments, params):
+        connection = self.get_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(f"UPDATE export_jobs SET {assignments} WHERE id = %s", [*params, job_id])
+            cursor.close()
+        finally:
+            connection.close()
+
+    def run(self, job):
+        """Write one job's file batch by batch"""
+        filters = json.loads(job['filters']) if isinstance(job['filters'], (str, bytes)) else job['filters']
+        select, params = self.build_query(job['user_id'], filters)
+        path = file_path(job)
+        partial = path + '.part'
+
+        try:
+            connection = self.get_connection()
+            try:
+                cursor = connection.cursor()
+                cursor.execute(f"SELECT COUNT(*) FROM ({select}) export_rows", params)
+                total = cursor.fetchone()[0]
+                cursor.close()
+            finally:
+                connection.close()
+            # Every batch query below is preceded by a heartbeat, as the
+            # count was by the claim
+            self._update(job['id'], 'total_rows = %s, heartbeat_at = NOW()', [total])
+
+            written = 0
+            after = None
+            with open(partial, 'w', encoding='utf-8', newline='') as output:
+                while True:
+                    rows = self._fetch_batch(select, params, after)
+                    if not rows:
+                        break
+                    after = (rows[-1]['transaction_date'], rows[-1]['id'])
+                    output.write(encode_rows(
+                        [{column: row[column] for column in COLUMNS} for row in rows],
+                        job['format'], header=(written == 0 and job['format'] == 'csv')
+                    ))
+                    written += len(rows)
+                    self._update(job['id'], 'rows_written = %s, heartbeat_at = NOW()', [written])
+                    if len(rows) < EXPORT_BATCH_SIZE:
+                        break
+                if written == 0 and job['format'] == 'csv':
+                    output.write(encode_rows([], 'csv', header=True))
+
+            os.replace(partial, path)
+            self._update(job['id'], "status = 'done', file_size = %s, finished_at = NOW()",
+                         [os.path.getsize(path)])
+            with self.lock:
+                self.counters['completed'] += 1
+                self.counters['rows'] += written
+        except Exception as e:
+            logger.error(f"Export job {job['id']} error: {e}")
+            if os.path.exists(partial):
+                os.remove(partial)
+            self._update(job['id'], "status = 'failed', error = %s, finished_at = NOW()",
+                         [str(e)[:255]])
+            with self.lock:
+                self.counters['failed'] += 1
+
+    def _fetch_batch(self, select, params, after):
+        """Next batch in (transaction_date DESC, id DESC) order after the key"""
+        query = f"SELECT * FROM ({select}) export_rows"
+        batch_params = list(params)
+        if after:
+            query += " WHERE transaction_date < %s OR (transaction_date = %s AND id < %s)"
+            batch_params.extend([after[0], after[0], after[1]])
+        query += " ORDER BY transaction_date DESC, id DESC LIMIT %s"
+        batch_params.append(EXPORT_BATCH_SIZE)
+
+        connection = self.get_connection()
+        try:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute(query, batch_params)
+            rows = cursor.fetchall()
+            cursor.close()
+            return rows
+        finally:
+            connection.close()
+
+    def cleanup(self):
+        """Delete files of jobs past retention, at most once a minute"""
+        now = datetime.utcnow()
+        if now - self.last_cleanup < timedelta(minutes=1):
+            return
+        self.last_cleanup = now
+
+        connection = self.get_connection()
+        try:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute(f"""
+                SELECT {JOB_COLUMNS}
+                FROM export_jobs
+                WHERE status = 'done' AND finished_at < DATE_SUB(NOW(), INTERVAL %s HOUR)
+                ORDER BY id
+                LIMIT 100
+            """, (EXPORT_RETENTION_HOURS,))
+            expired = cursor.fetchall()
+            for job in expired:
+                if os.path.exists(file_path(job)):
+                    os.remove(file_path(job))
+            if expired:
+                placeholders = ', '.join(['%s'] * len(expired))
+                cursor.execute(f"UPDATE export_jobs SET status = 'expired' WHERE id IN ({placeholders})",
+                               [job['id'] for job in expired])
+            cursor.close()
+        finally:
+            connection.close()
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, workers=self.workers)
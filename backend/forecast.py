@@ -0,0 +1,195 @@
+"""
+Cash-flow forecasting
+
+A forecast combines two sources of expected daily cash flow:
+
+* recurring_transactions rules, expanded into their exact future dates
+* per-category historical rates for non-recurring activity, taken per
+  month of year (so December spending projects December-like days) and
+  falling back to the category's overall daily rate for thin months
+
+Daily expectations and variances are summed per day, then accumulated once
+into balance offsets with a normal-approximation confidence band. The
+projection is cached relative to a zero opening balance, so edits to old
+transactions only shift it by the new current balance.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from itertools import accumulate
+
+from dateutil.relativedelta import relativedelta
+
+from timeseries import parse_date, to_cents
+
+Z_SCORES = {0.8: 1.2816, 0.9: 1.6449, 0.95: 1.96, 0.99: 2.5758}
+
+# Months with fewer observed days than this use the category's overall rate
+MIN_SEASONAL_DAYS = 28
+
+def rule_step(frequency, interval, k):
+    """Offset of the k-th occurrence after a rule's anchor date"""
+    interval = interval or 1
+    if frequency == 'daily':
+        return relativedelta(days=k * interval)
+    if frequency == 'weekly':
+        return relativedelta(weeks=k * interval)
+    if frequency == 'monthly':
+        return relativedelta(months=k * interval)
+    if frequency == 'quarterly':
+        return relativedelta(months=3 * k * interval)
+    return relativedelta(years=k * interval)
+
+def expand_recurring(rules, start, days):
+    """Daily net cents contributed by recurring rules over [start, start + days)"""
+    deltas = [0] * days
+    end = start + timedelta(days=days - 1)
+    for rule in rules:
+        anchor = parse_date(rule['next_execution'])
+        last = parse_date(rule['end_date']) if rule.get('end_date') else end
+        remaining = None
+        if rule.get('max_executions') is not None:
+            remaining = rule['max_executions'] - (rule.get('execution_count') or 0)
+        amount = to_cents(rule['amount'])
+        if rule['type'] == 'expense':
+            amount = -amount
+
+        k = 0
+        while remaining is None or k < remaining:
+            day = anchor + rule_step(rule['frequency'], rule.get('frequency_interval'), k)
+            if day > end or day > last:
+                break
+            if day >= start:
+                deltas[(day - start).days] += amount
+            k += 1
+    return deltas
+
+def seasonal_rates(history, start, lookback_days):
+    """Per-category (mean, variance) of daily net cents by month of year
+
+    history holds (transaction_date, category_id, net) rows for days in
+    [start - lookback_days, start). Days without activity count as zero.
+    """
+    history_start = start - timedelta(days=lookback_days)
+    observed_days = [0] * 13
+    day = history_start
+    while day < start:
+        observed_days[day.month] += 1
+        day += timedelta(days=1)
+
+    totals = {}
+    for day, category_id, net in history:
+        day = parse_date(day)
+        cents = to_cents(net)
+        sums = totals.setdefault(category_id, [[0, 0] for _ in range(13)])
+        sums[day.month][0] += cents
+        sums[day.month][1] += cents * cents
+
+    rates = {}
+    for category_id, sums in totals.items():
+        all_days = sum(observed_days) or 1
+        all_sum = sum(s for s, _ in sums)
+        all_squares = sum(q for _, q in sums)
+        overall = (all_sum / all_days, max(all_squares / all_days - (all_sum / all_days) ** 2, 0))
+
+        monthly = [overall] * 13
+        for month in range(1, 13):
+            n = observed_days[month]
+            if n >= MIN_SEASONAL_DAYS:
+                mean = sums[month][0] / n
+                monthly[month] = (mean, max(sums[month][1] / n - mean * mean, 0))
+        rates[category_id] = monthly
+    return rates
+
+def project(recurring, rates, start, days):
+    """Accumulate expected daily flows into balance offsets and deviations
+
+    The result is relative to a zero opening balance so it can be cached
+    independently of the current balance; render() adds the balance.
+    """
+    months = [(start + timedelta(days=i)).month for i in range(days)]
+
+    expected = list(recurring)
+    variance = [0.0] * days
+    for monthly in rates.values():
+        for i, month in enumerate(months):
+            mean, var = monthly[month]
+            expected[i] += mean
+            variance[i] += var
+
+    return {
+        'start': start,
+        'recurring': recurring,
+        'offsets': list(accumulate(expected)),
+        'deviations': [math.sqrt(v) for v in accumulate(variance)]
+    }
+
+def render(projection, balance, confidence=0.9):
+    """Turn a cached projection into a balance path with a confidence band"""
+    if confidence not in Z_SCORES:
+        confidence = 0.9
+    z = Z_SCORES[confidence]
+    opening = to_cents(balance)
+    start = projection['start']
+    path = [opening + offset for offset in projection['offsets']]
+    spread = [z * deviation for deviation in projection['deviations']]
+
+    return {
+        'opening_balance': round(opening / 100, 2),
+        'confidence': confidence,
+        'dates': [(start + timedelta(days=i)).isoformat() for i in range(len(path))],
+        'expected': [round(p / 100, 2) for p in path],
+        'lower': [round((p - s) / 100, 2) for p, s in zip(path, spread)],
+        'upper': [round((p + s) / 100, 2) for p, s in zip(path, spread)],
+        'recurring': [round(r / 100, 2) for r in projection['recurring']]
+    }
+
+class ForecastCache:
+    """Projections keyed by (user, start, days) and a fingerprint
+
+    The fingerprint covers the rules and a stamp of the history window
+    read from the database, so writes made through other processes are
+    noticed too. Entries expire after ttl seconds, and the least recently
+    used are evicted beyond max_entries; keys for past start dates simply
+    age out.
+    """
+
+    def __init__(self, max_entries=1000, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, user_id, key, fingerprint):
+        """Return a cached projection if its fingerprint still matches"""
+        with self.lock:
+            entry = self.entries.get((user_id, key))
+            if entry is None:
+                return None
+            stored_at, stored_fingerprint, forecast = entry
+            if time.monotonic() - stored_at >= self.ttl or stored_fingerprint != fingerprint:
+                del self.entries[(user_id, key)]
+                return None
+            self.entries.move_to_end((user_id, key))
+            return forecast
+
+    def put(self, user_id, key, fingerprint, forecast):
+        """Store a projection computed under the given fingerprint"""
+        with self.lock:
+            self.entries[(user_id, key)] = (time.monotonic(), fingerprint, forecast)
+            self.entries.move_to_end((user_id, key))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        """Drop every cached projection for a user"""
+        with self.lock:
+            for cached in [cached for cached in self.entries if cached[0] == user_id]:
+                del self.entries[cached]
+
+def change_in_window(change, start, lookback_days):
+    """Whether a transaction change falls inside a forecast's history window"""
+    return change is not None and parse_date(change['transaction_date']) >= start - timedelta(days=lookback_days)
@@ -0,0 +1,201 @@
+"""
+Query guardrails
+
+Three bounds keep one request from holding the database for minutes:
+
+* Page sizes: page_limit() clamps ?limit to between 1 and the endpoint's
+  maximum in PAGE_LIMITS.
+* Statement time: connections handed out by get_db_connection() are
+  wrapped so every SELECT carries a MAX_EXECUTION_TIME optimizer hint. The
+  budget is set by the endpoint class of the request (QUERY_TIMEOUTS_MS);
+  work outside a request uses the 'background' budget. MySQL aborts a
+  SELECT that runs past it with error 3024. SQLite connections get the
+  same deadline through a progress handler. Killed statements are logged
+  with their parameters and raised as QueryTimeout.
+* Work per request: synchronous analytics refuse explicit date ranges
+  longer than ANALYTICS_MAX_RANGE_DAYS with RangeTooLarge. Time series are
+  further held to TIMESERIES_MAX_BUCKETS buckets (series_max_days). The
+  synchronous CSV export hands large requests to the background export
+  jobs (see export_csv in app.py).
+
+Writes carry no hint: MySQL only bounds read-only SELECTs this way, and a
+write interrupted halfway would be worse than a slow one.
+"""
+
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import mysql.connector
+
+import storage
+from timeseries import BUCKET_MIN_DAYS, parse_date
+
+logger = logging.getLogger(__name__)
+
+QUERY_CLASSES = ('read', 'analytics', 'export', 'write', 'background')
+
+# Milliseconds per SELECT, by endpoint class
+DEFAULT_QUERY_TIMEOUTS = 'read=2000,analytics=10000,export=30000,write=5000,background=300000'
+
+ANALYTICS_MAX_RANGE_DAYS = int(os.getenv('ANALYTICS_MAX_RANGE_DAYS', 1830))
+EXPORT_SYNC_MAX_DAYS = int(os.getenv('EXPORT_SYNC_MAX_DAYS', 1830))
+EXPORT_SYNC_MAX_ROWS = int(os.getenv('EXPORT_SYNC_MAX_ROWS', 50000))
+TIMESERIES_MAX_BUCKETS = int(os.getenv('TIMESERIES_MAX_BUCKETS', 1000))
+
+# (default, maximum) ?limit per endpoint
+PAGE_LIMITS = {
+    'get_transactions': (100, int(os.getenv('MAX_PAGE_SIZE', 500))),
+    'search_transactions': (20, 100),
+    'suggest_category': (3, 10),
+    'get_duplicates': (50, 200),
+    'get_anomalies': (50, 200),
+    'get_transaction_history': (50, 200),
+    'get_audit_feed': (50, 200),
+    'get_trash': (50, 200),
+}
+
+# ER_QUERY_TIMEOUT: maximum statement execution time exceeded
+MYSQL_QUERY_TIMEOUT = 3024
+SELECT = re.compile(r'^(\s*SELECT)\b', re.IGNORECASE)
+# SQLite checks the deadline every this many virtual machine instructions
+SQLITE_PROGRESS_STEPS = 10000
+# Characters of the statement and of its parameters kept in the log
+LOGGED_CHARS = 1000
+
+class QueryTimeout(Exception):
+    """A statement ran past its class's time budget and was killed"""
+
+class RangeTooLarge(ValueError):
+    """A synchronous request asked for more days than it may scan"""
+
+    def __init__(self, days, max_days):
+        super().__init__(f'Date range of {days} days exceeds the {max_days}-day limit for this endpoint')
+        self.days = days
+        self.max_days = max_days
+
+def parse_query_timeouts(spec):
+    """Parse 'class=milliseconds,...' into {class: milliseconds}"""
+    timeouts = {}
+    for item in spec.split(','):
+        if not item.strip():
+            continue
+        name, value = item.split('=')
+        name = name.strip()
+        if name not in QUERY_CLASSES:
+            raise ValueError(f"Unknown query class {name}")
+        timeouts[name] = int(value)
+    return timeouts
+
+QUERY_TIMEOUTS_MS = dict(parse_query_timeouts(DEFAULT_QUERY_TIMEOUTS),
+                         **parse_query_timeouts(os.getenv('QUERY_TIMEOUTS', '')))
+
+_local = threading.local()
+
+class query_class:
+    """Run the block's queries under a class, e.g. in executor threads that
+    work for a request but have no request context"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.previous = getattr(_local, 'query_class', None)
+        _local.query_class = self.name
+
+    def __exit__(self, *exc):
+        _local.query_class = self.previous
+
+def current_query_class():
+    return getattr(_local, 'query_class', None)
+
+def page_limit(args, endpoint):
+    """The endpoint's ?limit, clamped to 1..maximum; raises ValueError when
+    it is not a number"""
+    default, maximum = PAGE_LIMITS[endpoint]
+    return max(1, min(int(args.get('limit', default)), maximum))
+
+def range_days(args):
+    """Days spanned by from_date..to_date (to_date defaults to today), or
+    None when from_date is missing"""
+    if not args.get('from_date'):
+        return None
+    to_date = parse_date(args['to_date']) if args.get('to_date') else datetime.utcnow().date()
+    return (to_date - parse_date(args['from_date'])).days + 1
+
+def check_range(args, max_days=ANALYTICS_MAX_RANGE_DAYS):
+    """Raise RangeTooLarge when an explicit range exceeds max_days"""
+    days = range_days(args)
+    if days is not None and days > max_days:
+        raise RangeTooLarge(days, max_days)
+
+def series_max_days(granularity):
+    """Longest time-series range at a granularity: the analytics range cap,
+    lowered so the range splits into at most TIMESERIES_MAX_BUCKETS buckets"""
+    return min(ANALYTICS_MAX_RANGE_DAYS, TIMESERIES_MAX_BUCKETS * BUCKET_MIN_DAYS[granularity])
+
+def _clip(value):
+    text = value if isinstance(value, str) else repr(value)
+    return text if len(text) <= LOGGED_CHARS else text[:LOGGED_CHARS] + '...'
+
+class GuardedCursor:
+    """Cursor proxy that bounds SELECT time and logs killed statements"""
+
+    def __init__(self, cursor, connection):
+        self._cursor = cursor
+        self._connection = connection
+
+    def execute(self, query, params=None, *args, **kwargs):
+        guard = self._connection
+        if not SELECT.match(query):
+            return self._cursor.execute(query, params, *args, **kwargs)
+        if guard.raw_sqlite is None:
+            query = SELECT.sub(rf'\1 /*+ MAX_EXECUTION_TIME({guard.timeout_ms}) */', query, count=1)
+        else:
+            deadline = time.monotonic() + guard.timeout_ms / 1000
+            guard.raw_sqlite.set_progress_handler(lambda: time.monotonic() > deadline, SQLITE_PROGRESS_STEPS)
+        try:
+            return self._cursor.execute(query, params, *args, **kwargs)
+        except (mysql.connector.Error, sqlite3.OperationalError) as e:
+            if getattr(e, 'errno', None) == MYSQL_QUERY_TIMEOUT or \
+                    (isinstance(e, sqlite3.OperationalError) and 'interrupted' in str(e)):
+                guard.log_timeout(query, params)
+                raise QueryTimeout(f'Query exceeded {guard.timeout_ms} ms') from e
+            raise
+        finally:
+            if guard.raw_sqlite is not None:
+                guard.raw_sqlite.set_progress_handler(None, SQLITE_PROGRESS_STEPS)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+class GuardedConnection:
+    """Connection proxy whose cursors are GuardedCursors"""
+
+    def __init__(self, connection, query_class_name, endpoint=None, user_id=None):
+        self._connection = connection
+        self.query_class = query_class_name
+        self.timeout_ms = QUERY_TIMEOUTS_MS[query_class_name]
+        self.endpoint = endpoint
+        self.user_id = user_id
+        self.raw_sqlite = connection.raw if isinstance(connection, storage.SQLiteConnection) else None
+
+    def cursor(self, *args, **kwargs):
+        return GuardedCursor(self._connection.cursor(*args, **kwargs), self)
+
+    def log_timeout(self, query, params):
+        statement = ' '.join(query.split())
+        logger.warning(
+            f"Query killed after {self.timeout_ms} ms ({self.query_class}, endpoint {self.endpoint}, "
+            f"user {self.user_id}): {_clip(statement)} params={_clip(params)}"
+        )
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
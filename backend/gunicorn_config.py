@@ -0,0 +1,68 @@
+"""
+Gunicorn configuration for the Spend Tracker API
+
+    gunicorn --config gunicorn_config.py app:app
+
+GUNICORN_WORKER_CLASS selects the worker mode:
+
+* gthread (default): a few processes, each running one thread per pooled
+  database connection. More threads than connections would only queue on
+  the pool. A change-feed stream (GET /api/changes) holds its thread for as
+  long as it is open, so each worker also gets one thread per stream it
+  accepts: CHANGE_FEED_MAX_STREAMS, 4 by default here. Further streams are
+  refused with 503, and streams never take the request threads.
+* gevent: cooperative workers for many slow or idle clients. The standard
+  library is monkey-patched here, before the app or mysql.connector is
+  imported, and the pure-Python driver is selected so that pool checkouts
+  and queries yield instead of blocking the worker. Streams are greenlets,
+  so the app's default of 100 streams per worker applies; use gevent when
+  many dashboards keep the change feed open.
+* sync: one request per process at a time (gunicorn's default), kept for
+  comparison; see load_test.py. A stream would block its worker, so the
+  change feed is off unless CHANGE_FEED_ENABLED is set.
+
+Connection pools and background threads are created in post_worker_init,
+inside each worker after fork, so a preloaded app never shares sockets
+between processes.
+"""
+
+import multiprocessing
+import os
+
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+
+if worker_class == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+    os.environ.setdefault('MYSQL_USE_PURE', 'True')
+
+bind = os.getenv('GUNICORN_BIND', f"0.0.0.0:{os.getenv('PORT', 5000)}")
+
+# Each worker holds DB_POOL_SIZE connections (twice that with a replica),
+# so workers * pool size must stay below MySQL's max_connections
+workers = int(os.getenv('GUNICORN_WORKERS', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+threads = int(os.getenv('GUNICORN_THREADS', os.getenv('DB_POOL_SIZE', 5)))
+if worker_class == 'gthread':
+    # Read by app.py when it is imported, after this file
+    os.environ.setdefault('CHANGE_FEED_MAX_STREAMS', '4')
+    threads += int(os.environ['CHANGE_FEED_MAX_STREAMS'])
+elif worker_class == 'sync':
+    os.environ.setdefault('CHANGE_FEED_ENABLED', 'False')
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 200))
+
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True').lower() == 'true'
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers periodically to bound memory growth of in-process caches
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = 500
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+def post_worker_init(worker):
+    """Create this worker's pools and background threads"""
+    from app import init_worker
+    init_worker()
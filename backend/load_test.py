@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Spend Tracker Load Test Script
+
+This script drives concurrent keep-alive clients against read endpoints for
+a fixed duration and reports throughput, latency percentiles and status
+codes. Point it at a running server with --url, or let it start gunicorn
+once per worker class with --compare to measure each mode on the same
+machine and data.
+"""
+
+import argparse
+import http.client
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+from urllib.request import urlopen
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATHS = '/api/transactions?limit=50,/api/summary,/api/charts/category-spending,/api/charts/monthly-trend'
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+def run_load(base_url, paths, concurrency, duration, token=None):
+    """Hit paths round-robin from concurrency clients for duration seconds"""
+    target = urlsplit(base_url)
+    headers = {'Authorization': f'Bearer {token}'} if token else {}
+    deadline = time.monotonic() + duration
+    lock = threading.Lock()
+    latencies = []
+    statuses = {}
+
+    def client(offset):
+        connection = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=30)
+        local_latencies = []
+        local_statuses = {}
+        i = offset
+        while time.monotonic() < deadline:
+            path = paths[i % len(paths)]
+            i += 1
+            started = time.perf_counter()
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=30)
+                status = 'error'
+            local_latencies.append(time.perf_counter() - started)
+            local_statuses[status] = local_statuses.get(status, 0) + 1
+        connection.close()
+        with lock:
+            latencies.extend(local_latencies)
+            for status, count in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'throughput': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'statuses': statuses
+    }
+
+def start_server(worker_class, port, workers, admission):
+    """Start gunicorn with one worker class and wait until it is healthy"""
+    env = dict(
+        os.environ,
+        GUNICORN_WORKER_CLASS=worker_class,
+        GUNICORN_BIND=f'127.0.0.1:{port}',
+        GUNICORN_WORKERS=str(workers),
+        GUNICORN_ACCESS_LOG='',
+        ADMISSION_CONTROL_ENABLED='True' if admission else 'False'
+    )
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn_config.py', 'app:app'],
+        cwd=backend_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            with urlopen(f'http://127.0.0.1:{port}/health', timeout=2) as response:
+                if response.status == 200:
+                    return server
+        except OSError:
+            time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError(f"{worker_class} server did not become healthy")
+
+def report(label, result):
+    statuses = ', '.join(f'{status}: {count}' for status, count in sorted(result['statuses'].items(), key=str))
+    logger.info(f"{label:<10} {result['throughput']:8.1f} req/s  p50 {result['p50_ms']:7.1f} ms  "
+                f"p95 {result['p95_ms']:7.1f} ms  p99 {result['p99_ms']:7.1f} ms  [{statuses}]")
+
+def main():
+    """Main load test function."""
+    parser = argparse.ArgumentParser(description='Load test the Spend Tracker API')
+    parser.add_argument('--url', help='Test an already running server instead of starting gunicorn')
+    parser.add_argument('--compare', nargs='+', default=['sync', 'gthread', 'gevent'],
+                        help='Worker classes to start and compare')
+    parser.add_argument('--workers', type=int, default=4, help='Gunicorn workers per run')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--paths', default=DEFAULT_PATHS, help='Comma-separated request paths')
+    parser.add_argument('--token', default=os.getenv('LOAD_TEST_TOKEN'), help='Bearer token for multi-user mode')
+    parser.add_argument('--with-admission', action='store_true',
+                        help='Keep rate limiting and load shedding on during the runs')
+    args = parser.parse_args()
+
+    paths = [path.strip() for path in args.paths.split(',') if path.strip()]
+
+    logger.info("=== Spend Tracker Load Test ===")
+    logger.info(f"{args.concurrency} clients for {args.duration:g}s over {len(paths)} endpoints")
+
+    if args.url:
+        report('server', run_load(args.url, paths, args.concurrency, args.duration, args.token))
+        return
+
+    results = {}
+    for worker_class in args.compare:
+        try:
+            server = start_server(worker_class, args.port, args.workers, args.with_admission)
+        except RuntimeError as e:
+            logger.error(e)
+            continue
+        try:
+            results[worker_class] = run_load(f'http://127.0.0.1:{args.port}', paths,
+                                             args.concurrency, args.duration, args.token)
+            report(worker_class, results[worker_class])
+        finally:
+            server.terminate()
+            server.wait()
+
+    if 'sync' in results:
+        baseline = results['sync']['throughput'] or 1
+        for worker_class, result in results.items():
+            logger.info(f"{worker_class}: {result['throughput'] / baseline:.2f}x sync throughput")
+
+    if not results:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
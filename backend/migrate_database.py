@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Spend Tracker Database Migration Script
+
+This script applies the numbered SQL files in database/migrations to an
+existing database. Applied migrations are recorded in schema_migrations,
+so running it again only applies new files.
+"""
+
+import mysql.connector
+from mysql.connector import Error
+import os
+import sys
+from dotenv import load_dotenv
+import logging
+
+from setup_database import get_database_config
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database', 'migrations')
+
+def get_migration_files():
+    """Return migration file names in the order they should be applied."""
+    if not os.path.isdir(MIGRATIONS_DIR):
+        return []
+    return sorted(name for name in os.listdir(MIGRATIONS_DIR) if name.endswith('.sql'))
+
+def split_statements(sql):
+    """Split a migration file into individual statements.
+
+    As in the mysql client, a DELIMITER line changes the terminator, so
+    stored procedure bodies can contain ';'.
+    """
+    statements = []
+    current_statement = []
+    delimiter = ';'
+
+    for line in sql.split('\n'):
+        line = line.strip()
+
+        # Skip empty lines and comments
+        if not line or line.startswith('--'):
+            continue
+
+        if line.upper().startswith('DELIMITER'):
+            delimiter = line.split()[-1]
+            continue
+
+        current_statement.append(line)
+        if line.endswith(delimiter):
+            statement = ' '.join(current_statement)[:-len(delimiter)].strip()
+            if statement:
+                statements.append(statement)
+            current_statement = []
+
+    if current_statement:
+        statements.append(' '.join(current_statement))
+
+    return statements
+
+def apply_migrations():
+    """Apply all pending migrations."""
+    config = get_database_config()
+    config['database'] = os.getenv('MYSQL_DATABASE', 'spend_tracker')
+
+    try:
+        connection = mysql.connector.connect(**config)
+        cursor = connection.cursor()
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                name VARCHAR(255) PRIMARY KEY,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        connection.commit()
+
+        cursor.execute("SELECT name FROM schema_migrations")
+        applied = {row[0] for row in cursor.fetchall()}
+
+        pending = [name for name in get_migration_files() if name not in applied]
+        if not pending:
+            logger.info("Database is up to date")
+
+        for name in pending:
+            logger.info(f"Applying migration: {name}")
+            with open(os.path.join(MIGRATIONS_DIR, name), 'r', encoding='utf-8') as file:
+                statements = split_statements(file.read())
+
+            for statement in statements:
+                cursor.execute(statement)
+
+            cursor.execute("INSERT INTO schema_migrations (name) VALUES (%s)", (name,))
+            connection.commit()
+
+        cursor.close()
+        connection.close()
+        return True
+
+    except Error as e:
+        logger.error(f"Error applying migrations: {e}")
+        return False
+
+def main():
+    """Main migration function."""
+    logger.info("=== Spend Tracker Database Migration ===")
+
+    if not apply_migrations():
+        logger.error("Migration failed")
+        sys.exit(1)
+
+    logger.info("=== Migration Complete! ===")
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,10 @@ from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import logging
 
+from tag_index import attach_tags
+from duplicates import index_transactions
+from categorizer import learn
+
 # Load environment variables
 load_dotenv()
 
@@ -288,6 +292,8 @@ def populate_transactions():
         # Insert transactions
         logger.info(f"Inserting {len(transactions)} transactions...")
         
+        inserted_tags = []
+        inserted = []
         for transaction in transactions:
             cursor.execute("""
                 INSERT INTO transactions 
@@ -304,6 +310,13 @@ def populate_transactions():
                 transaction['notes'],
                 datetime.utcnow()
             ))
+            inserted_tags.append((cursor.lastrowid, transaction['tags']))
+            inserted.append(dict(transaction, id=cursor.lastrowid, transaction_date=transaction['date']))
+        
+        # Link tags through the junction table in one batch
+        attach_tags(cursor, inserted_tags)
+        index_transactions(cursor, None, inserted)
+        learn(cursor, None, added=inserted)
         
         connection.commit()
         cursor.close()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Spend Tracker Anomaly Statistics Rebuild Script
+
+This script recomputes category_stats from transaction history with one
+set-based query. Run it after the anomaly migration, after bulk data fixes,
+or whenever the streaming statistics are suspected to have drifted.
+"""
+
+import mysql.connector
+from mysql.connector import Error
+import os
+import sys
+import argparse
+from dotenv import load_dotenv
+import logging
+
+from setup_database import get_database_config
+from anomaly import SHORT_HORIZON_DAYS, LONG_HORIZON_DAYS
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def rebuild(user_id=None):
+    """Replace category_stats for one user (or everyone) from history"""
+    config = get_database_config()
+    config['database'] = os.getenv('MYSQL_DATABASE', 'spend_tracker')
+
+    user_filter = ""
+    params = [SHORT_HORIZON_DAYS, LONG_HORIZON_DAYS]
+    if user_id is not None:
+        user_filter = " AND user_id = %s"
+        params.extend([user_id, user_id])
+
+    try:
+        connection = mysql.connector.connect(**config)
+        cursor = connection.cursor()
+
+        if user_id is None:
+            cursor.execute("DELETE FROM category_stats")
+        else:
+            cursor.execute("DELETE FROM category_stats WHERE user_id = %s", (user_id,))
+
+        cursor.execute(f"""
+            INSERT INTO category_stats
+            (user_id, category_id, n, mean, m2, short_count, long_count, first_event_date, last_event_date)
+            SELECT
+                t.user_id,
+                t.category_id,
+                COUNT(*),
+                AVG(t.amount),
+                VAR_POP(t.amount) * COUNT(*),
+                SUM(EXP(-DATEDIFF(m.last_date, t.transaction_date) / %s)),
+                SUM(EXP(-DATEDIFF(m.last_date, t.transaction_date) / %s)),
+                MIN(t.transaction_date),
+                m.last_date
+            FROM (
+                SELECT user_id, category_id, transaction_date, GREATEST(credited, debited) AS amount
+                FROM transactions
+                WHERE status = 'active'{user_filter}
+            ) t
+            JOIN (
+                SELECT user_id, category_id, MAX(transaction_date) AS last_date
+                FROM transactions
+                WHERE status = 'active'{user_filter}
+                GROUP BY user_id, category_id
+            ) m ON m.user_id <=> t.user_id AND m.category_id = t.category_id
+            GROUP BY t.user_id, t.category_id, m.last_date
+        """, params)
+        logger.info(f"Rebuilt statistics for {cursor.rowcount} categories")
+
+        connection.commit()
+        cursor.close()
+        connection.close()
+        return True
+
+    except Error as e:
+        logger.error(f"Error rebuilding anomaly statistics: {e}")
+        return False
+
+def main():
+    """Main rebuild function."""
+    parser = argparse.ArgumentParser(description='Rebuild category_stats from transaction history')
+    parser.add_argument('--user-id', type=int, default=None, help='Only rebuild this user')
+    args = parser.parse_args()
+
+    logger.info("=== Spend Tracker Anomaly Statistics Rebuild ===")
+
+    if not rebuild(args.user_id):
+        logger.error("Rebuild failed")
+        sys.exit(1)
+
+    logger.info("=== Rebuild Complete! ===")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Spend Tracker Category Model Rebuild Script
+
+This script recomputes category_token_counts, the auto-categorizer's word
+counts, from the descriptions and categories of active transactions. Run it
+after the categorizer migration, after bulk data fixes, or whenever the
+counts are suspected to have drifted. It walks the table in primary-key
+batches, committing after each one; edits made by the app while it runs
+can skew the counts slightly, so prefer a quiet period.
+"""
+
+import mysql.connector
+from mysql.connector import Error
+import os
+import sys
+import argparse
+from dotenv import load_dotenv
+import logging
+
+from setup_database import get_database_config
+from categorizer import learn
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def rebuild(batch_size, user_id=None):
+    """Replace category_token_counts for one user (or everyone) from history"""
+    config = get_database_config()
+    config['database'] = os.getenv('MYSQL_DATABASE', 'spend_tracker')
+
+    user_filter = ""
+    user_params = []
+    if user_id is not None:
+        user_filter = " AND user_id = %s"
+        user_params = [user_id]
+
+    try:
+        connection = mysql.connector.connect(**config)
+        cursor = connection.cursor(dictionary=True)
+
+        if user_id is None:
+            cursor.execute("DELETE FROM category_token_counts")
+        else:
+            cursor.execute("DELETE FROM category_token_counts WHERE user_id = %s", (user_id,))
+        connection.commit()
+
+        last_id = 0
+        total = 0
+        while True:
+            cursor.execute(f"""
+                SELECT id, user_id, category_id, description, credited, debited
+                FROM transactions
+                WHERE id > %s AND status = 'active'{user_filter}
+                ORDER BY id
+                LIMIT %s
+            """, [last_id, *user_params, batch_size])
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            by_user = {}
+            for row in rows:
+                by_user.setdefault(row['user_id'], []).append(row)
+            for owner, user_rows in by_user.items():
+                learn(cursor, owner, added=user_rows)
+            connection.commit()
+
+            total += len(rows)
+            last_id = rows[-1]['id']
+            logger.info(f"Learned transactions up to id {last_id} ({total} transactions)")
+
+        cursor.close()
+        connection.close()
+        return True
+
+    except Error as e:
+        logger.error(f"Error rebuilding category model: {e}")
+        return False
+
+def main():
+    """Main rebuild function."""
+    parser = argparse.ArgumentParser(description='Rebuild category_token_counts from transaction history')
+    parser.add_argument('--user-id', type=int, help='Only rebuild this user')
+    parser.add_argument('--batch-size', type=int, default=5000, help='Transactions per committed batch')
+    args = parser.parse_args()
+
+    logger.info("=== Spend Tracker Category Model Rebuild ===")
+
+    if not rebuild(args.batch_size, args.user_id):
+        logger.error("Category model rebuild failed")
+        sys.exit(1)
+
+    logger.info("=== Category Model Rebuild Complete! ===")
+
+if __name__ == "__main__":
+    main()
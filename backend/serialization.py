@@ -0,0 +1,59 @@
+"""
+JSON serialization helpers
+
+Rows are fetched with plain tuple cursors and encoded directly: Decimal,
+date and datetime values are handled by the encoder, so handlers no longer
+convert every row by hand before calling jsonify. orjson is used when it is
+installed, with the standard library encoder as a fallback.
+"""
+
+import json
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+def json_default(value):
+    """Encode the non-JSON types MySQL hands back"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8')
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson when available"""
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and 'indent' not in kwargs:
+            return orjson.dumps(obj, default=json_default, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+        kwargs.setdefault('default', json_default)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        return json.dumps(obj, **kwargs)
+
+def records(columns, rows):
+    """Turn tuple rows into a list of dicts"""
+    return [dict(zip(columns, row)) for row in rows]
+
+def columnar(columns, rows):
+    """Turn tuple rows into one array per column"""
+    if rows:
+        arrays = {column: list(values) for column, values in zip(columns, zip(*rows))}
+    else:
+        arrays = {column: [] for column in columns}
+    return {'count': len(rows), 'columns': arrays}
+
+def shape_rows(columns, rows, response_format=None):
+    """Shape rows as records, or as columns when ?format=columnar was requested"""
+    if response_format == 'columnar':
+        return columnar(columns, rows)
+    return records(columns, rows)
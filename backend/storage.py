@@ -0,0 +1,251 @@
+"""
+Storage backends
+
+Handlers talk to whatever get_db_connection() returns through the small
+DB-API surface mysql.connector offers: cursor(dictionary=...), execute with
+%s placeholders, column_names, lastrowid, start_transaction, commit and
+rollback. STORAGE_BACKEND selects the engine behind it:
+
+* mysql (default): pooled mysql.connector connections, set up in app.py.
+* sqlite: an embedded database file in WAL mode (SQLITE_PATH), for
+  single-user and edge deployments and for hermetic local runs. Schema:
+  database/schema_sqlite.sql.
+
+SQLite connections are wrapped so that the MySQL dialect used by the
+handlers works unchanged where a mechanical rewrite is enough:
+placeholders, <=>, INSERT IGNORE, FOR UPDATE, SHOW COLUMNS and
+INTERVAL arithmetic are rewritten, and DATE_FORMAT, DATE_SUB/DATE_ADD,
+DATEDIFF, CURDATE, NOW, GREATEST, LEAST and EXP are registered as
+functions. The few statements whose shape differs (full-text search, the
+UPDATE ... JOIN balance repair) branch on is_sqlite().
+"""
+
+import math
+import os
+import re
+import sqlite3
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+
+import mysql.connector
+from dateutil.relativedelta import relativedelta
+
+BACKEND = os.getenv('STORAGE_BACKEND', 'mysql').lower()
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'spend_tracker.db')
+SQLITE_SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database', 'schema_sqlite.sql')
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+
+# Catch either engine's constraint violations
+IntegrityError = (mysql.connector.IntegrityError, sqlite3.IntegrityError)
+
+def is_sqlite():
+    return BACKEND == 'sqlite'
+
+# Values bound into and read back from SQLite in the same Python types
+# mysql.connector uses
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(sep=' ', timespec='seconds'))
+sqlite3.register_converter('DATE', lambda raw: date.fromisoformat(raw.decode()[:10]))
+sqlite3.register_converter('TIMESTAMP', lambda raw: datetime.fromisoformat(raw.decode()))
+sqlite3.register_converter('DECIMAL', lambda raw: Decimal(raw.decode()))
+
+INTERVAL_UNITS = {
+    'SECOND': 'seconds', 'MINUTE': 'minutes', 'HOUR': 'hours', 'DAY': 'days',
+    'WEEK': 'weeks', 'MONTH': 'months', 'QUARTER': 'quarters', 'YEAR': 'years'
+}
+
+# MySQL DATE_FORMAT specifiers that differ from strftime
+DATE_FORMAT_CODES = {'%i': '%M', '%s': '%S', '%M': '%B', '%W': '%A', '%e': '%-d'}
+DATE_FORMAT_CODE = re.compile(r'%[a-zA-Z]')
+
+REWRITES = [
+    (re.compile(r'<=>'), ' IS '),
+    (re.compile(r'\bINSERT\s+IGNORE\b', re.IGNORECASE), 'INSERT OR IGNORE'),
+    (re.compile(r'\bFOR\s+UPDATE(\s+SKIP\s+LOCKED)?\b', re.IGNORECASE), ''),
+    (re.compile(r'\bSHOW\s+COLUMNS\s+FROM\s+(\w+)', re.IGNORECASE),
+     r"SELECT name AS Field FROM pragma_table_info('\1')"),
+    (re.compile(r'\bINTERVAL\s+(\(.+?\)|\S+)\s+(' + '|'.join(INTERVAL_UNITS) + r')\b', re.IGNORECASE),
+     r"(\1 || ' \2')"),
+]
+PLACEHOLDER = re.compile(r'%(s|%)')
+
+def translate(query, has_params):
+    """Rewrite a MySQL statement for SQLite"""
+    for pattern, replacement in REWRITES:
+        query = pattern.sub(replacement, query)
+    if has_params:
+        query = PLACEHOLDER.sub(lambda match: '?' if match.group(1) == 's' else '%', query)
+    return query
+
+def _as_datetime(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    return datetime.fromisoformat(str(value))
+
+def _shift(value, spec, sign):
+    moment = _as_datetime(value)
+    if moment is None or spec is None:
+        return None
+    amount, unit = str(spec).split()
+    amount = float(amount) if '.' in amount else int(amount)
+    unit = INTERVAL_UNITS[unit.upper()]
+    if unit == 'quarters':
+        delta = relativedelta(months=3 * amount)
+    else:
+        delta = relativedelta(**{unit: amount})
+    moment = moment + delta if sign > 0 else moment - delta
+    # Date arithmetic on a date stays a date, as in MySQL
+    if moment.time() == datetime.min.time() and len(str(value)) <= 10:
+        return moment.date().isoformat()
+    return moment.isoformat(sep=' ', timespec='seconds')
+
+def _date_format(value, fmt):
+    moment = _as_datetime(value)
+    if moment is None:
+        return None
+    return moment.strftime(DATE_FORMAT_CODE.sub(lambda match: DATE_FORMAT_CODES.get(match.group(0), match.group(0)), fmt))
+
+def _datediff(first, second):
+    if first is None or second is None:
+        return None
+    return (_as_datetime(first).date() - _as_datetime(second).date()).days
+
+def _greatest(*values):
+    return None if any(value is None for value in values) else max(values)
+
+def _least(*values):
+    return None if any(value is None for value in values) else min(values)
+
+def _register_functions(raw):
+    raw.create_function('DATE_FORMAT', 2, _date_format, deterministic=True)
+    raw.create_function('DATE_SUB', 2, lambda value, spec: _shift(value, spec, -1), deterministic=True)
+    raw.create_function('DATE_ADD', 2, lambda value, spec: _shift(value, spec, 1), deterministic=True)
+    raw.create_function('DATEDIFF', 2, _datediff, deterministic=True)
+    raw.create_function('GREATEST', -1, _greatest, deterministic=True)
+    raw.create_function('LEAST', -1, _least, deterministic=True)
+    raw.create_function('EXP', 1, lambda value: None if value is None else math.exp(value), deterministic=True)
+    raw.create_function('CURDATE', 0, lambda: date.today().isoformat())
+    raw.create_function('NOW', 0, lambda: datetime.utcnow().isoformat(sep=' ', timespec='seconds'))
+
+class SQLiteCursor:
+    """mysql.connector-style cursor over a sqlite3 cursor"""
+
+    def __init__(self, raw, dictionary=False):
+        self.raw = raw
+        self.dictionary = dictionary
+
+    def execute(self, query, params=None):
+        self.raw.execute(translate(query, params is not None), tuple(params) if params is not None else ())
+
+    def executemany(self, query, seq_of_params):
+        self.raw.executemany(translate(query, True), [tuple(params) for params in seq_of_params])
+
+    def _shape(self, row):
+        if row is None or not self.dictionary:
+            return row
+        return dict(zip(self.column_names, row))
+
+    def fetchone(self):
+        return self._shape(self.raw.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._shape(row) for row in self.raw.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._shape(row) for row in self.raw.fetchall()]
+
+    def __iter__(self):
+        return (self._shape(row) for row in self.raw)
+
+    @property
+    def column_names(self):
+        return tuple(column[0] for column in self.raw.description or ())
+
+    @property
+    def description(self):
+        return self.raw.description
+
+    @property
+    def rowcount(self):
+        return self.raw.rowcount
+
+    @property
+    def lastrowid(self):
+        return self.raw.lastrowid
+
+    def close(self):
+        self.raw.close()
+
+class SQLiteConnection:
+    """mysql.connector-style connection over sqlite3, in autocommit mode"""
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def cursor(self, dictionary=False, **kwargs):
+        return SQLiteCursor(self.raw.cursor(), dictionary)
+
+    def start_transaction(self, **kwargs):
+        # Take the write lock up front, as InnoDB row locks would be
+        self.raw.execute('BEGIN IMMEDIATE')
+
+    @property
+    def in_transaction(self):
+        return self.raw.in_transaction
+
+    def commit(self):
+        if self.raw.in_transaction:
+            self.raw.commit()
+
+    def rollback(self):
+        if self.raw.in_transaction:
+            self.raw.rollback()
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        self.rollback()
+        self.raw.close()
+
+schema_lock = threading.Lock()
+schema_state = {'path': None}
+
+def init_sqlite_database(path=SQLITE_PATH):
+    """Create the schema in a new database file and switch it to WAL"""
+    raw = sqlite3.connect(path, isolation_level=None)
+    try:
+        raw.execute('PRAGMA journal_mode=WAL')
+        exists = raw.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'transactions'"
+        ).fetchone()
+        if not exists:
+            with open(SQLITE_SCHEMA, encoding='utf-8') as schema:
+                raw.executescript(schema.read())
+    finally:
+        raw.close()
+
+def connect_sqlite(path=SQLITE_PATH):
+    """Open a connection, creating the schema on first use in this process"""
+    with schema_lock:
+        if schema_state['path'] != path:
+            init_sqlite_database(path)
+            schema_state['path'] = path
+
+    raw = sqlite3.connect(
+        path,
+        isolation_level=None,
+        detect_types=sqlite3.PARSE_DECLTYPES,
+        timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False
+    )
+    raw.execute('PRAGMA foreign_keys = ON')
+    raw.execute('PRAGMA synchronous = NORMAL')
+    _register_functions(raw)
+    return SQLiteConnection(raw)
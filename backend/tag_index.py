@@ -0,0 +1,128 @@
+"""
+Normalized tag storage helpers
+
+Transactions keep their comma-separated `tags` column for display, but
+filtering goes through the `tags` / `transaction_tags` tables. These helpers
+keep the junction rows and `usage_count` in sync from every write path.
+"""
+
+MAX_TAG_LENGTH = 50
+
+def parse_tags(tags):
+    """Split a comma-separated tag string into unique, normalized names"""
+    names = []
+    for name in (tags or '').split(','):
+        name = name.strip().lower()[:MAX_TAG_LENGTH]
+        if name and name not in names:
+            names.append(name)
+    return names
+
+def resolve_tag_ids(cursor, names, user_id=None, create=True):
+    """Map tag names to ids, creating missing tags when requested"""
+    if not names:
+        return {}
+
+    placeholders = ', '.join(['%s'] * len(names))
+    cursor.execute(f"""
+        SELECT id, name FROM tags
+        WHERE user_id <=> %s AND name IN ({placeholders})
+    """, [user_id, *names])
+    tag_ids = {row[1]: row[0] for row in _tuples(cursor.fetchall(), ('id', 'name'))}
+
+    if create:
+        for name in names:
+            if name not in tag_ids:
+                cursor.execute("INSERT INTO tags (user_id, name) VALUES (%s, %s)", (user_id, name))
+                tag_ids[name] = cursor.lastrowid
+
+    return tag_ids
+
+def attach_tags(cursor, items, user_id=None):
+    """Link freshly inserted transactions to their tags in one batch
+
+    items is an iterable of (transaction_id, tags_string) pairs.
+    """
+    links = [(transaction_id, parse_tags(tags)) for transaction_id, tags in items]
+    names = sorted({name for _, transaction_names in links for name in transaction_names})
+    if not names:
+        return
+
+    tag_ids = resolve_tag_ids(cursor, names, user_id)
+    rows = [(transaction_id, tag_ids[name]) for transaction_id, transaction_names in links for name in transaction_names]
+    cursor.executemany("INSERT IGNORE INTO transaction_tags (transaction_id, tag_id) VALUES (%s, %s)", rows)
+    _adjust_usage(cursor, [tag_id for _, tag_id in rows], 1)
+
+def detach_tags(cursor, items, user_id=None):
+    """Unlink many transactions from their tags in one batch
+
+    items is an iterable of (transaction_id, tags_string) pairs, the tags
+    the transactions currently carry.
+    """
+    links = [(transaction_id, parse_tags(tags)) for transaction_id, tags in items]
+    names = sorted({name for _, transaction_names in links for name in transaction_names})
+    if not names:
+        return
+
+    tag_ids = resolve_tag_ids(cursor, names, user_id, create=False)
+    transaction_ids = [transaction_id for transaction_id, transaction_names in links if transaction_names]
+    placeholders = ', '.join(['%s'] * len(transaction_ids))
+    cursor.execute(f"""
+        DELETE FROM transaction_tags
+        WHERE transaction_id IN ({placeholders})
+    """, transaction_ids)
+    _adjust_usage(cursor, [tag_ids[name] for _, transaction_names in links
+                           for name in transaction_names if name in tag_ids], -1)
+
+def sync_transaction_tags(cursor, transaction_id, old_tags, new_tags, user_id=None):
+    """Apply the difference between two tag strings for one transaction"""
+    old_names = set(parse_tags(old_tags))
+    new_names = parse_tags(new_tags)
+
+    added = [name for name in new_names if name not in old_names]
+    removed = sorted(old_names - set(new_names))
+
+    if added:
+        attach_tags(cursor, [(transaction_id, ','.join(added))], user_id)
+
+    if removed:
+        tag_ids = list(resolve_tag_ids(cursor, removed, user_id, create=False).values())
+        if tag_ids:
+            placeholders = ', '.join(['%s'] * len(tag_ids))
+            cursor.execute(f"""
+                DELETE FROM transaction_tags
+                WHERE transaction_id = %s AND tag_id IN ({placeholders})
+            """, [transaction_id, *tag_ids])
+            _adjust_usage(cursor, tag_ids, -1)
+
+def build_tag_filter(tags, match='any', column='t.id', user_id=None):
+    """Build a WHERE fragment restricting `column` to tagged transactions"""
+    names = parse_tags(tags)
+    if not names:
+        return '', []
+
+    placeholders = ', '.join(['%s'] * len(names))
+    subquery = f"""
+        SELECT tt.transaction_id
+        FROM tags tg
+        JOIN transaction_tags tt ON tt.tag_id = tg.id
+        WHERE tg.user_id <=> %s AND tg.name IN ({placeholders})
+    """
+    params = [user_id, *names]
+    if match == 'all':
+        subquery += " GROUP BY tt.transaction_id HAVING COUNT(DISTINCT tg.name) = %s"
+        params.append(len(names))
+
+    return f" AND {column} IN ({subquery})", params
+
+def _adjust_usage(cursor, tag_ids, delta):
+    """Bump usage_count once per distinct tag by delta times its occurrences"""
+    counts = {}
+    for tag_id in tag_ids:
+        counts[tag_id] = counts.get(tag_id, 0) + delta
+    cursor.executemany("""
+        UPDATE tags SET usage_count = GREATEST(usage_count + %s, 0) WHERE id = %s
+    """, [(count, tag_id) for tag_id, count in counts.items()])
+
+def _tuples(rows, keys):
+    """Normalize rows from plain or dictionary cursors to tuples"""
+    return [tuple(row[key] for key in keys) if isinstance(row, dict) else tuple(row) for row in rows]
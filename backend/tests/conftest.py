@@ -0,0 +1,98 @@
+"""
+Shared fixtures: the app under test on each storage backend
+
+Tests that take `client` or `db` run once per backend. SQLite gets a fresh
+database file for every test. MySQL runs only when TEST_MYSQL_DATABASE
+names a disposable database, which is rebuilt from schema.sql for every
+test; the connection settings are the usual MYSQL_HOST/MYSQL_USER/
+MYSQL_PASSWORD.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SQLITE_PATH = os.path.join(tempfile.mkdtemp(prefix='spend-tracker-tests-'), 'test.db')
+MYSQL_DATABASE = os.getenv('TEST_MYSQL_DATABASE')
+
+# Settings read when app.py is imported
+os.environ['SQLITE_PATH'] = SQLITE_PATH
+os.environ['ENABLE_MULTI_USER'] = 'False'
+os.environ['ADMISSION_CONTROL_ENABLED'] = 'False'
+os.environ['ANALYTICS_STORE_ENABLED'] = 'False'
+os.environ['EXPORT_WORKERS'] = '0'
+if MYSQL_DATABASE:
+    os.environ['MYSQL_DATABASE'] = MYSQL_DATABASE
+
+import app as app_module  # noqa: E402
+import categorizer  # noqa: E402
+import storage  # noqa: E402
+
+BACKENDS = [
+    'sqlite',
+    pytest.param('mysql', marks=pytest.mark.skipif(not MYSQL_DATABASE, reason='TEST_MYSQL_DATABASE is not set'))
+]
+
+def reset_sqlite():
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(SQLITE_PATH + suffix):
+            os.remove(SQLITE_PATH + suffix)
+    # The next connection recreates the schema
+    storage.schema_state['path'] = None
+
+def reset_mysql():
+    import setup_database
+    assert setup_database.execute_schema()
+
+def reset_caches():
+    with app_module.timeseries_cache.lock:
+        app_module.timeseries_cache.entries.clear()
+    with app_module.forecast_cache.lock:
+        app_module.forecast_cache.entries.clear()
+    with app_module.routing_lock:
+        app_module.recent_writes.clear()
+    with app_module.change_hub.lock:
+        app_module.change_hub.subscribers.clear()
+    categorizer.forget()
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, monkeypatch):
+    """The storage backend of this run, with an empty database"""
+    monkeypatch.setattr(storage, 'BACKEND', request.param)
+    if request.param == 'sqlite':
+        reset_sqlite()
+    else:
+        reset_mysql()
+    reset_caches()
+    return request.param
+
+@pytest.fixture
+def app(backend):
+    return app_module
+
+@pytest.fixture
+def client(app):
+    return app.app.test_client()
+
+@pytest.fixture
+def db(app):
+    """A connection for arranging and inspecting rows directly"""
+    connection = app.get_db_connection(readonly=False)
+    yield connection
+    connection.close()
+
+@pytest.fixture
+def add(client):
+    """Create a transaction through the API and return its response body"""
+    def add(transaction_date, debited=0, credited=0, category_id=8, description='test', **fields):
+        response = client.post('/api/transactions', json=dict(
+            fields, transaction_date=transaction_date, description=description,
+            debited=debited, credited=credited, category_id=category_id
+        ))
+        assert response.status_code == 201, response.get_json()
+        return response.get_json()
+    return add
@@ -0,0 +1,58 @@
+"""Admission control and pool checkout under load"""
+
+import threading
+import time
+
+import pytest
+
+import app
+from admission import ConcurrencyGate
+
+def test_gate_charges_fan_out_requests_per_connection():
+    gate = ConcurrencyGate(limit=5, latency_budget=0.05)
+    assert gate.enter('analytics', slots=4) == (True, 0)
+    assert gate.enter('read') == (True, 0)
+    # A second dashboard would need four more connections
+    admitted, retry_after = gate.enter('analytics', slots=4)
+    assert not admitted and retry_after > 0
+    assert gate.stats()['in_flight'] == 5
+
+    gate.leave(0.01, slots=4)
+    assert gate.enter('analytics', slots=4) == (True, 0)
+
+def test_gate_wakes_a_multi_slot_waiter():
+    gate = ConcurrencyGate(limit=4, latency_budget=1)
+    gate.service_time = 0.01
+    for _ in range(4):
+        gate.enter('read')
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(gate.enter('analytics', slots=2)))
+    waiter.start()
+    time.sleep(0.05)
+    gate.leave(0.01)
+    gate.leave(0.01)
+    waiter.join(1)
+    assert results == [(True, 0)]
+
+class ExhaustedPool:
+    """Raises PoolError until `busy` checkouts have been refused"""
+
+    def __init__(self, error, busy):
+        self.error = error
+        self.busy = busy
+
+    def get_connection(self):
+        if self.busy:
+            self.busy -= 1
+            raise self.error('Failed getting connection; pool exhausted')
+        return 'connection'
+
+def test_checkout_waits_for_a_free_connection(monkeypatch):
+    monkeypatch.setattr(app, 'POOL_CHECKOUT_WAIT_SECONDS', 1)
+    assert app.wait_for_connection(ExhaustedPool(app.pooling.PoolError, busy=3)) == 'connection'
+
+    monkeypatch.setattr(app, 'POOL_CHECKOUT_WAIT_SECONDS', 0.05)
+    started = time.monotonic()
+    with pytest.raises(app.pooling.PoolError):
+        app.wait_for_connection(ExhaustedPool(app.pooling.PoolError, busy=1000))
+    assert time.monotonic() - started < 0.5
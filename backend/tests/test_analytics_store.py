@@ -0,0 +1,78 @@
+"""The in-memory analytics store must answer exactly as the SQL endpoints do"""
+
+import pytest
+
+from analytics_store import AnalyticsStore, check_consistency
+
+QUERIES = [
+    '/api/summary',
+    '/api/summary?from_date=2024-02-01&to_date=2024-03-31',
+    '/api/summary?category_id=7',
+    '/api/charts/category-spending',
+    '/api/charts/category-spending?from_date=2024-02-01&to_date=2024-02-29',
+    '/api/charts/category-spending?format=columns',
+    '/api/charts/monthly-trend?from_date=2024-01-01',
+    '/api/charts/monthly-trend?from_date=2024-01-15&to_date=2024-03-10',
+]
+
+@pytest.fixture
+def store(app, monkeypatch):
+    store = AnalyticsStore(lambda: app.get_db_connection(readonly=True))
+    monkeypatch.setattr(app, 'analytics_store', None)
+    return store
+
+def run(app, method):
+    """load() or sync() on a fresh connection, so MySQL reads a new snapshot"""
+    connection = app.get_db_connection(readonly=True)
+    method(connection)
+    connection.close()
+
+def assert_store_matches_sql(app, client, store, monkeypatch):
+    # Otherwise the handlers would quietly fall back to SQL
+    assert store.serves({})
+    for query in QUERIES:
+        monkeypatch.setattr(app, 'analytics_store', None)
+        expected = client.get(query)
+        monkeypatch.setattr(app, 'analytics_store', store)
+        actual = client.get(query)
+        assert expected.status_code == actual.status_code == 200, query
+        assert actual.get_json() == expected.get_json(), query
+    monkeypatch.setattr(app, 'analytics_store', None)
+
+def seed(add):
+    rows = [
+        add('2024-01-10', credited=3000, category_id=1, description='salary'),
+        add('2024-01-12', debited=42.5, category_id=7, description='groceries'),
+        add('2024-02-03', debited=19.99, category_id=8, description='bus'),
+        add('2024-02-14', debited=80, category_id=7, description='dinner'),
+        add('2024-03-01', debited=250, category_id=9, description='shoes'),
+        add('2024-03-05', credited=120, category_id=2, description='side job'),
+    ]
+    return [row['id'] for row in rows]
+
+def test_loaded_store_matches_sql(app, client, add, store, monkeypatch, db):
+    seed(add)
+    run(app, store.load)
+    assert store.stats()['transactions'] == 6
+    assert_store_matches_sql(app, client, store, monkeypatch)
+    assert check_consistency(db) == []
+
+def test_sync_applies_every_kind_of_change(app, client, add, store, monkeypatch):
+    ids = seed(add)
+    run(app, store.load)
+
+    add('2024-02-20', debited=5.25, category_id=8, description='parking')
+    client.put(f'/api/transactions/{ids[1]}', json={'transaction_date': '2024-03-02', 'debited': 60})
+    client.delete(f'/api/transactions/{ids[2]}')
+    client.post('/api/transactions/bulk/recategorize', json={'ids': [ids[3]], 'category_id': 9})
+    client.post('/api/transactions/import', json={'transactions': [
+        {'transaction_date': '2024-01-20', 'description': 'refund', 'credited': 15, 'category_id': 6},
+    ]})
+    response = client.post('/api/categories', json={'name': 'Pets', 'color': '#123456', 'icon': 'paw'})
+    category_id = response.get_json()['id']
+    add('2024-03-03', debited=33, category_id=category_id, description='vet')
+    client.put('/api/categories/9', json={'name': 'Clothes'})
+
+    run(app, store.sync)
+    assert store.stats()['transactions'] == 8
+    assert_store_matches_sql(app, client, store, monkeypatch)
@@ -0,0 +1,23 @@
+"""Server-sent change feed"""
+
+def test_streams_over_the_cap_are_refused(app, client, add, monkeypatch):
+    monkeypatch.setattr(app.change_hub, 'max_subscribers', 1)
+
+    stream = client.get('/api/changes', buffered=False)
+    assert stream.status_code == 200
+    refused = client.get('/api/changes')
+    assert refused.status_code == 503
+    assert refused.headers['Retry-After']
+
+    add('2024-01-05', debited=12, description='lunch')
+    frames = stream.response
+    body = ''
+    while 'event: transaction' not in body:
+        body += next(frames).decode()
+    assert '"type":"added"' in body
+
+    stream.close()
+    assert app.change_hub.subscriber_count() == 0
+    reopened = client.get('/api/changes', buffered=False)
+    assert reopened.status_code == 200
+    reopened.close()
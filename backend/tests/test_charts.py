@@ -0,0 +1,62 @@
+"""Cached time-series endpoints and their range bounds"""
+
+import time
+
+import guardrails
+import timeseries
+
+def test_timeseries_buckets_monthly_expense(client, add):
+    add('2024-01-10', debited=40, category_id=7)
+    add('2024-01-20', debited=10, category_id=8)
+    add('2024-03-05', debited=25, category_id=7)
+
+    response = client.get('/api/charts/timeseries?granularity=month&from_date=2024-01-01&to_date=2024-03-31')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['buckets'] == ['2024-01-01', '2024-02-01', '2024-03-01']
+    assert data['total'] == [50, 0, 25]
+
+def test_timeseries_refuses_ranges_over_the_bucket_cap(client):
+    max_days = guardrails.series_max_days('day')
+    assert max_days < guardrails.ANALYTICS_MAX_RANGE_DAYS
+
+    response = client.get('/api/charts/timeseries?granularity=day&from_date=2020-01-01&to_date=2020-01-01')
+    assert response.status_code == 200
+
+    started = time.monotonic()
+    for query in ('granularity=day&from_date=2020-01-01&to_date=2024-12-31',
+                  'granularity=year&from_date=0001-01-01&to_date=9999-12-31'):
+        response = client.get(f'/api/charts/timeseries?{query}')
+        assert response.status_code == 400, query
+        assert response.get_json()['alternatives'] == {'export': 'POST /api/exports'}
+    assert time.monotonic() - started < 5
+
+    response = client.get('/api/charts/timeseries?granularity=month&from_date=2020-01-01&to_date=2024-12-31')
+    assert response.status_code == 200
+    assert len(response.get_json()['buckets']) == 60
+
+def test_balance_history_bounds(client, add):
+    add('2024-01-01', credited=100, category_id=1)
+    add('2024-01-03', debited=30)
+
+    data = client.get('/api/charts/balance-history?from=2024-01-01&to=2024-01-05').get_json()
+    assert data['dates'][0] == '2024-01-01' and data['dates'][-1] == '2024-01-05'
+    assert data['balances'] == [100, 100, 70, 70, 70]
+
+    response = client.get('/api/charts/balance-history?from=0001-01-01&to=9999-12-31')
+    assert response.status_code == 400
+    assert response.get_json()['max_days'] == guardrails.ANALYTICS_MAX_RANGE_DAYS
+
+    # Without from, a far-off to is shortened to the cap rather than walked day by day
+    started = time.monotonic()
+    response = client.get('/api/charts/balance-history?to=9999-12-31')
+    assert response.status_code == 200
+    assert time.monotonic() - started < 5
+
+def test_cache_evicts_least_recently_used_users():
+    cache = timeseries.TimeSeriesCache(lambda user_id: [], max_entries=2)
+    first = cache.get(1)
+    cache.get(2)
+    assert cache.get(1) is first
+    cache.get(3)
+    assert list(cache.entries) == [1, 3]
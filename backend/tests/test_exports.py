@@ -0,0 +1,71 @@
+"""Background export jobs and their reuse"""
+
+import csv
+import io
+import time
+
+import pytest
+
+import exports
+import guardrails
+
+@pytest.fixture
+def pool(app, monkeypatch, tmp_path):
+    """A worker pool without threads; tests claim and run jobs themselves"""
+    monkeypatch.setattr(exports, 'EXPORT_DIR', str(tmp_path))
+    return exports.ExportWorkerPool(lambda: app.get_db_connection(readonly=False), app.export_query, workers=0)
+
+def backdate_writes(db):
+    """Move existing rows' updated_at into the past, clear of the one-second resolution"""
+    cursor = db.cursor()
+    cursor.execute("UPDATE transactions SET updated_at = DATE_SUB(NOW(), INTERVAL 1 MINUTE)")
+    db.commit()
+    cursor.close()
+
+def test_export_is_reused_until_a_write(client, add, pool, db):
+    add('2024-01-05', debited=12, description='lunch')
+    add('2024-01-06', debited=30, description='fuel')
+    backdate_writes(db)
+
+    response = client.post('/api/exports', json={'format': 'csv'})
+    assert response.status_code == 202
+    job_id = response.get_json()['id']
+    pool.run(pool.claim())
+
+    job = client.get(f'/api/exports/{job_id}').get_json()
+    assert (job['status'], job['rows_written']) == ('done', 2)
+    rows = list(csv.DictReader(io.StringIO(client.get(job['download_url']).data.decode())))
+    assert [(row['transaction_date'], row['description'], float(row['running_balance'])) for row in rows] == \
+        [('2024-01-06', 'fuel', -42), ('2024-01-05', 'lunch', -12)]
+
+    response = client.post('/api/exports', json={'format': 'csv'})
+    assert (response.status_code, response.get_json()['id']) == (200, job_id)
+
+    # A write at or after the job's snapshot makes its file stale
+    add('2024-01-07', debited=5, description='coffee')
+    response = client.post('/api/exports', json={'format': 'csv'})
+    assert response.status_code == 202
+    assert response.get_json()['id'] != job_id
+
+def test_worker_threads_run_queued_jobs(app, client, add, monkeypatch, tmp_path):
+    monkeypatch.setattr(exports, 'EXPORT_DIR', str(tmp_path))
+    monkeypatch.setattr(exports, 'EXPORT_POLL_SECONDS', 0.05)
+    pool = exports.ExportWorkerPool(lambda: app.get_db_connection(readonly=False), app.export_query, workers=1)
+    monkeypatch.setattr(app, 'export_pool', pool)
+    # As in a fresh worker process: the first checkout starts the threads
+    monkeypatch.setitem(app.worker_state, 'pid', None)
+    add('2024-01-05', debited=12, description='lunch')
+
+    try:
+        job_id = client.post('/api/exports', json={'format': 'ndjson'}).get_json()['id']
+        assert pool.threads
+        deadline = time.monotonic() + 5
+        while client.get(f'/api/exports/{job_id}').get_json()['status'] != 'done':
+            assert time.monotonic() < deadline, 'export job was never run'
+            time.sleep(0.05)
+    finally:
+        pool.stop()
+    assert pool.stats()['completed'] == 1
+
+def test_running_jobs_outlive_their_slowest_query():
+    assert exports.EXPORT_STALE_SECONDS * 1000 > guardrails.QUERY_TIMEOUTS_MS['background']
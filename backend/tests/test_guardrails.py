@@ -0,0 +1,26 @@
+"""Query time budgets surface as 503 on every guarded endpoint"""
+
+import pytest
+
+import guardrails
+
+ENDPOINTS = [
+    '/api/transactions',
+    '/api/transactions/search?q=coffee',
+    '/api/summary',
+    '/api/charts/timeseries?from_date=2024-01-01&to_date=2024-03-31',
+    '/api/charts/balance-history',
+    '/api/anomalies',
+    '/api/forecast',
+]
+
+@pytest.mark.parametrize('url', ENDPOINTS)
+def test_killed_query_is_503(client, monkeypatch, url):
+    def killed(self, query, params=None, *args, **kwargs):
+        if guardrails.SELECT.match(query):
+            raise guardrails.QueryTimeout('Query exceeded 0 ms')
+        return self._cursor.execute(query, params, *args, **kwargs)
+    monkeypatch.setattr(guardrails.GuardedCursor, 'execute', killed)
+
+    response = client.get(url)
+    assert response.status_code == 503, response.get_json()
@@ -0,0 +1,101 @@
+"""The MySQL dialect the handlers use, rewritten for SQLite and run on both backends"""
+
+from datetime import date
+
+import pytest
+
+import storage
+
+@pytest.mark.parametrize('query, expected', [
+    ("SELECT 1 FROM t WHERE user_id <=> %s", "SELECT 1 FROM t WHERE user_id  IS  ?"),
+    ("INSERT IGNORE INTO tags (name) VALUES (%s)", "INSERT OR IGNORE INTO tags (name) VALUES (?)"),
+    ("insert  ignore into tags (name) VALUES (%s)", "INSERT OR IGNORE into tags (name) VALUES (?)"),
+    ("SELECT id FROM t WHERE id = %s FOR UPDATE", "SELECT id FROM t WHERE id = ? "),
+    ("SELECT id FROM jobs LIMIT 1 FOR UPDATE SKIP LOCKED", "SELECT id FROM jobs LIMIT 1 "),
+    ("SHOW COLUMNS FROM transactions", "SELECT name AS Field FROM pragma_table_info('transactions')"),
+    ("SELECT DATE_SUB(%s, INTERVAL 7 DAY)", "SELECT DATE_SUB(?, (7 || ' DAY'))"),
+    ("SELECT DATE_ADD(d, INTERVAL (n * 3) MONTH)", "SELECT DATE_ADD(d, ((n * 3) || ' MONTH'))"),
+    ("SELECT DATE_FORMAT(d, '%%Y-%%m') WHERE a = %s", "SELECT DATE_FORMAT(d, '%Y-%m') WHERE a = ?"),
+])
+def test_translate(query, expected):
+    assert storage.translate(query, True) == expected
+
+def test_translate_without_params_keeps_percent_signs():
+    query = "SELECT DATE_FORMAT(d, '%Y-%m') FROM t"
+    assert storage.translate(query, False) == query
+
+def scalar(db, query, params=None):
+    cursor = db.cursor()
+    cursor.execute(query, params)
+    value = cursor.fetchone()[0]
+    cursor.close()
+    return value
+
+def test_null_safe_equality(db):
+    cursor = db.cursor()
+    cursor.execute("SELECT COUNT(*) FROM categories WHERE user_id <=> %s", (None,))
+    system = cursor.fetchone()[0]
+    cursor.execute("SELECT COUNT(*) FROM categories WHERE user_id IS NULL")
+    assert system == cursor.fetchone()[0] > 0
+    cursor.execute("SELECT COUNT(*) FROM categories WHERE user_id <=> %s", (12345,))
+    assert cursor.fetchone()[0] == 0
+    cursor.close()
+
+def test_insert_ignore_skips_duplicates(db):
+    cursor = db.cursor()
+    for count in (1, 2):
+        # Unique on (user_key, token, category_id); user_key is 0 for NULL users
+        cursor.execute("""
+            INSERT IGNORE INTO category_token_counts (user_id, token, category_id, count)
+            VALUES (%s, %s, %s, %s)
+        """, (None, 'groceries', 7, count))
+    cursor.execute("SELECT count FROM category_token_counts WHERE token = %s", ('groceries',))
+    assert cursor.fetchall() == [(1,)]
+    cursor.close()
+
+def test_select_for_update_inside_a_transaction(db):
+    cursor = db.cursor(dictionary=True)
+    db.start_transaction()
+    cursor.execute("SELECT id, name FROM categories WHERE id = %s FOR UPDATE", (1,))
+    assert cursor.fetchone() == {'id': 1, 'name': 'Salary'}
+    db.rollback()
+    cursor.close()
+
+def test_show_columns(db):
+    cursor = db.cursor(dictionary=True)
+    cursor.execute("SHOW COLUMNS FROM transactions")
+    columns = {row['Field'] for row in cursor.fetchall()}
+    cursor.close()
+    assert {'id', 'user_id', 'transaction_date', 'credited', 'debited', 'running_balance', 'status'} <= columns
+
+@pytest.mark.parametrize('expression, expected', [
+    ("DATE_SUB('2024-03-31', INTERVAL 1 MONTH)", '2024-02-29'),
+    ("DATE_ADD('2024-01-31', INTERVAL 1 DAY)", '2024-02-01'),
+    ("DATE_ADD('2023-11-15', INTERVAL (2 * 3) MONTH)", '2024-05-15'),
+    ("DATE_FORMAT('2024-07-04', '%%Y-%%m')", '2024-07'),
+    ("DATEDIFF('2024-03-01', '2024-02-01')", 29),
+    ("GREATEST(3, 7, 5)", 7),
+    ("LEAST(3, 7, 5)", 3),
+])
+def test_date_and_math_functions(db, expression, expected):
+    value = scalar(db, f"SELECT {expression} AS value", ())
+    if isinstance(value, date):
+        value = value.isoformat()
+    assert value == expected or str(value) == str(expected)
+
+def test_interval_with_placeholder(db):
+    value = scalar(db, "SELECT DATE_SUB(%s, INTERVAL %s DAY) AS value", ('2024-01-10', 9))
+    assert str(value)[:10] == '2024-01-01'
+
+def test_exp_and_decimal_round_trip(db):
+    assert scalar(db, "SELECT EXP(0) AS value", ()) == 1
+    cursor = db.cursor()
+    cursor.execute("""
+        INSERT INTO transactions (transaction_date, category_id, description, credited, debited, running_balance)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, ('2024-01-01', 1, 'salary', '1234.56', 0, '1234.56'))
+    cursor.execute("SELECT credited, transaction_date FROM transactions WHERE id = %s", (cursor.lastrowid,))
+    credited, transaction_date = cursor.fetchone()
+    cursor.close()
+    assert str(credited) == '1234.56'
+    assert transaction_date == date(2024, 1, 1)
@@ -0,0 +1,165 @@
+"""Transaction handlers, run against each storage backend"""
+
+import archiver
+import audit
+
+def balances(client):
+    rows = client.get('/api/transactions').get_json()
+    return {row['description']: float(row['running_balance']) for row in rows}
+
+def test_add_and_list(client, add):
+    created = add('2024-01-05', credited=1000, category_id=1, description='salary')
+    assert created['running_balance'] == 1000
+    add('2024-01-06', debited=40, description='bus pass')
+
+    rows = client.get('/api/transactions').get_json()
+    assert [row['description'] for row in rows] == ['bus pass', 'salary']
+    assert rows[0]['category_name'] == 'Transportation'
+
+def test_add_validates_input(client):
+    response = client.post('/api/transactions', json={'transaction_date': '2024-01-05', 'description': 'x'})
+    assert response.status_code == 400
+    response = client.post('/api/transactions', json={
+        'transaction_date': '2024-01-05', 'description': 'x', 'debited': 5, 'category_id': 99999
+    })
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'Category not found'
+
+def test_backdated_update_repairs_running_balances(client, add):
+    add('2024-01-01', credited=100, category_id=1, description='first')
+    middle = add('2024-01-02', debited=10, description='second')
+    add('2024-01-03', debited=20, description='third')
+
+    response = client.put(f"/api/transactions/{middle['id']}", json={'debited': 50})
+    assert response.status_code == 200
+    assert balances(client) == {'first': 100, 'second': 50, 'third': 30}
+
+def test_backdated_add_repairs_running_balances(client, add):
+    add('2024-01-01', credited=100, category_id=1, description='first')
+    add('2024-01-03', debited=20, description='third')
+
+    created = add('2024-01-02', debited=10, description='second')
+    assert created['running_balance'] == 90
+    assert balances(client) == {'first': 100, 'second': 90, 'third': 70}
+
+def test_delete_is_soft_and_repairs_balances(client, add, db):
+    add('2024-01-01', credited=100, category_id=1, description='first')
+    second = add('2024-01-02', debited=10, description='second')
+    add('2024-01-03', debited=20, description='third')
+
+    assert client.delete(f"/api/transactions/{second['id']}").status_code == 200
+    assert balances(client) == {'first': 100, 'third': 80}
+
+    cursor = db.cursor()
+    cursor.execute("SELECT status FROM transactions WHERE id = %s", (second['id'],))
+    assert cursor.fetchone()[0] == 'inactive'
+    cursor.close()
+
+    assert client.delete(f"/api/transactions/{second['id']}").status_code == 404
+
+def counts(db):
+    cursor = db.cursor()
+    totals = {}
+    for table in ('transactions', 'duplicate_keys', 'category_stats'):
+        cursor.execute(f"SELECT COUNT(*) FROM {table}")
+        totals[table] = cursor.fetchone()[0]
+    cursor.close()
+    return totals
+
+def test_failed_write_leaves_no_partial_state(client, add, db, monkeypatch):
+    row = add('2024-01-01', credited=100, category_id=1, description='kept')
+    before = counts(db)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError('audit unavailable')
+    monkeypatch.setattr(audit, 'record', fail)
+    assert client.post('/api/transactions', json={
+        'transaction_date': '2024-01-02', 'description': 'lost', 'debited': 10, 'category_id': 8
+    }).status_code == 500
+    assert client.put(f"/api/transactions/{row['id']}", json={'credited': 5}).status_code == 500
+    assert client.delete(f"/api/transactions/{row['id']}").status_code == 500
+
+    assert counts(db) == before
+    assert balances(client) == {'kept': 100}
+
+def test_update_missing_transaction(client):
+    assert client.put('/api/transactions/12345', json={'debited': 5}).status_code == 404
+
+def test_search_matches_term_prefixes(client, add):
+    add('2024-02-01', debited=12, description='Corner coffee shop', tags='cafe')
+    add('2024-02-02', debited=30, description='Weekly groceries')
+
+    response = client.get('/api/transactions/search?q=coff')
+    assert response.status_code == 200
+    assert [row['description'] for row in response.get_json()['results']] == ['Corner coffee shop']
+    assert client.get('/api/transactions/search?q=').status_code == 400
+
+def test_import_reports_and_skips_duplicates(client, add):
+    add('2024-03-01', debited=25, description='Pizza Palace')
+
+    response = client.post('/api/transactions/import', json={
+        'skip_duplicates': True,
+        'transactions': [
+            {'transaction_date': '2024-03-01', 'description': 'Pizza Palace', 'debited': 25, 'category_id': 7},
+            {'transaction_date': '2024-03-04', 'description': 'Train ticket', 'debited': 8, 'category_id': 8},
+        ]
+    })
+    assert response.status_code == 201
+    body = response.get_json()
+    assert (body['imported'], body['skipped']) == (1, 1)
+    assert body['duplicates'][0]['index'] == 0 and body['duplicates'][0]['skipped']
+    assert balances(client) == {'Pizza Palace': -25, 'Train ticket': -33}
+
+def test_import_rejects_bad_rows_atomically(client):
+    response = client.post('/api/transactions/import', json={'transactions': [
+        {'transaction_date': '2024-03-01', 'description': 'ok', 'debited': 5, 'category_id': 8},
+        {'transaction_date': '2024-03-02', 'description': 'bad', 'debited': 5, 'category_id': 99999},
+    ]})
+    assert response.status_code == 400
+    assert client.get('/api/transactions').get_json() == []
+
+def test_bulk_recategorize_and_delete(client, add):
+    first = add('2024-04-01', debited=10, description='one')
+    second = add('2024-04-02', debited=20, description='two')
+    add('2024-04-03', debited=30, description='three')
+
+    response = client.post('/api/transactions/bulk/recategorize',
+                           json={'ids': [first['id'], second['id']], 'category_id': 9})
+    assert response.get_json()['affected'] == 2
+    response = client.post('/api/transactions/bulk/delete', json={'filter': {'category_id': 9}})
+    assert response.get_json()['affected'] == 2
+    assert balances(client) == {'three': -30}
+
+    response = client.post('/api/transactions/bulk/recategorize', json={'ids': [first['id']], 'category_id': 99999})
+    assert response.status_code == 400
+
+def test_summary_and_charts(client, add):
+    add('2024-05-01', credited=500, category_id=1, description='salary')
+    add('2024-05-02', debited=40, category_id=7, description='dinner')
+    add('2024-06-03', debited=60, category_id=8, description='fuel')
+    add('2024-06-04', debited=15, category_id=7, description='lunch')
+    dates = 'from_date=2024-05-01&to_date=2024-06-30'
+
+    summary = client.get(f'/api/summary?{dates}').get_json()
+    assert float(summary['total_credited']) == 500
+    assert float(summary['total_debited']) == 115
+    assert summary['transaction_count'] == 4
+
+    spending = client.get(f'/api/charts/category-spending?{dates}').get_json()
+    assert [(row['name'], float(row['total_spent'])) for row in spending] == \
+        [('Transportation', 60), ('Food & Dining', 55)]
+
+    trend = client.get(f'/api/charts/monthly-trend?{dates}').get_json()
+    assert [(row['month'], float(row['total_income']), float(row['total_expense'])) for row in trend] == \
+        [('2024-05', 500, 40), ('2024-06', 0, 75)]
+
+def test_restore_from_trash(client, add, db):
+    row = add('2024-07-01', debited=10, description='archived')
+    client.delete(f"/api/transactions/{row['id']}")
+    assert archiver.archive_batch(db, 'transactions') == 1
+
+    trash = client.get('/api/trash').get_json()
+    assert [entry['record_id'] for entry in trash] == [row['id']]
+    assert client.post(f"/api/trash/{trash[0]['id']}/restore").status_code == 200
+    assert balances(client) == {'archived': -10}
+    assert client.post(f"/api/trash/{trash[0]['id']}/restore").status_code == 404
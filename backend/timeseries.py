@@ -0,0 +1,326 @@
+"""
+Per-day, per-category transaction aggregates for time-series charts
+
+Each user's history is loaded once with a single GROUP BY into one integer
+array of cents per category and direction, indexed by day offset. Write
+handlers apply their deltas in O(1), so the cache stays current without
+rescanning. Every chart variant (day/week/month/quarter/year buckets,
+cumulative and rolling series) is then computed from prefix sums over those
+arrays, not with a new SQL query.
+
+The aggregate also keeps the daily net across all categories, whose prefix
+sums are the end-of-day balances. Balance history over any range is read
+from it in time proportional to the number of days, then downsampled with
+largest-triangle-three-buckets, so the response size is fixed by the
+requested number of points rather than by the length of history.
+"""
+
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+GRANULARITIES = ('day', 'week', 'month', 'quarter', 'year')
+# Shortest bucket of each granularity, in days
+BUCKET_MIN_DAYS = {'day': 1, 'week': 7, 'month': 28, 'quarter': 90, 'year': 365}
+METRICS = ('expense', 'income', 'net')
+
+def parse_date(value):
+    """Accept a date or an ISO date/datetime string"""
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+def to_cents(amount):
+    """Convert a Decimal/float/str amount to integer cents"""
+    return int((Decimal(str(amount or 0)) * 100).quantize(Decimal('1')))
+
+def bucket_start(day, granularity):
+    """First day of the bucket containing day"""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    if granularity == 'quarter':
+        return date(day.year, 3 * ((day.month - 1) // 3) + 1, 1)
+    if granularity == 'year':
+        return date(day.year, 1, 1)
+    return day
+
+class DailyAggregate:
+    """Daily income/expense cents per category over a contiguous date range"""
+
+    def __init__(self, start):
+        self.start = start
+        self.days = 0
+        self.income = {}
+        self.expense = {}
+        # Net cents of all categories per day, and in total before start
+        self.net = array('q')
+        self.opening = 0
+
+    def _index(self, day):
+        """Array offset for day, growing the range to cover it"""
+        offset = (day - self.start).days
+        if offset < 0:
+            padding = array('q', bytes(8 * -offset))
+            for series in (self.income, self.expense):
+                for category_id in series:
+                    series[category_id] = padding + series[category_id]
+            self.net = padding + self.net
+            self.start = day
+            self.days -= offset
+            offset = 0
+        if offset >= self.days:
+            growth = offset + 1 - self.days
+            for series in (self.income, self.expense):
+                for values in series.values():
+                    values.extend(array('q', bytes(8 * growth)))
+            self.net.extend(array('q', bytes(8 * growth)))
+            self.days += growth
+        return offset
+
+    def _series(self, series, category_id):
+        if category_id not in series:
+            series[category_id] = array('q', bytes(8 * self.days))
+        return series[category_id]
+
+    def add(self, day, category_id, credited_cents, debited_cents):
+        """Apply one day/category delta in cents"""
+        offset = self._index(day)
+        self._series(self.income, category_id)[offset] += credited_cents
+        self._series(self.expense, category_id)[offset] += debited_cents
+        self.net[offset] += credited_cents - debited_cents
+
+    def window(self, from_date, to_date, category_ids=None):
+        """Copy of the days from from_date to to_date, clipped to the cached
+        range; the days before it are folded into opening"""
+        lo = min(max((from_date - self.start).days, 0), self.days)
+        hi = min(max((to_date - self.start).days + 1, lo), self.days)
+        copy = DailyAggregate(self.start + timedelta(days=lo))
+        copy.days = hi - lo
+        for series, copied in ((self.income, copy.income), (self.expense, copy.expense)):
+            for category_id, values in series.items():
+                if category_ids is None or category_id in category_ids:
+                    copied[category_id] = values[lo:hi]
+        copy.net = self.net[lo:hi]
+        copy.opening = self.opening + sum(self.net[:lo])
+        return copy
+
+class TimeSeriesCache:
+    """Per-user DailyAggregate cache, refreshed after ttl seconds
+
+    The least recently used aggregates are evicted beyond max_entries.
+    The lock guards the arrays that write handlers update in place. Reads
+    copy the window they need while holding it and compute without it, so
+    a long chart request never stalls writes.
+    """
+
+    def __init__(self, loader, ttl=300, max_entries=1000):
+        self.loader = loader
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, user_id):
+        """Return the user's aggregate, loading it on first use or expiry"""
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry and time.monotonic() - entry[0] < self.ttl:
+                self.entries.move_to_end(user_id)
+                return entry[1]
+
+        aggregate = DailyAggregate(date.today())
+        for day, category_id, credited, debited in self.loader(user_id):
+            aggregate.add(parse_date(day), category_id, to_cents(credited), to_cents(debited))
+
+        with self.lock:
+            self.entries[user_id] = (time.monotonic(), aggregate)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return aggregate
+
+    def apply(self, user_id, day, category_id, credited, debited, sign=1):
+        """Fold a write into a cached aggregate; uncached users load lazily"""
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry:
+                entry[1].add(parse_date(day), int(category_id),
+                             sign * to_cents(credited), sign * to_cents(debited))
+
+    def invalidate(self, user_id):
+        """Drop a user's aggregate so the next read reloads it"""
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def build_series(self, user_id, from_date, to_date, granularity='month', metric='expense',
+                     category_ids=None, cumulative=False, rolling=None):
+        """Bucket the cached daily arrays into chart series"""
+        aggregate = self.get(user_id)
+        with self.lock:
+            snapshot = aggregate.window(from_date, to_date, category_ids and set(category_ids))
+        return build_series(snapshot, from_date, to_date, granularity, metric,
+                            category_ids, cumulative, rolling)
+
+    def balance_history(self, user_id, from_date, to_date, points, max_days=None):
+        """Downsampled end-of-day balances; from_date None starts at the
+        first day of history, or max_days before to_date if that is later"""
+        aggregate = self.get(user_id)
+        with self.lock:
+            if from_date is None:
+                from_date = min(aggregate.start, to_date)
+                if max_days is not None:
+                    from_date = max(from_date, to_date - timedelta(days=max_days - 1))
+            snapshot = aggregate.window(from_date, to_date)
+        return balance_history(snapshot, from_date, to_date, points)
+
+def bucket_bounds(from_date, to_date, granularity):
+    """Labels and day offsets (relative to from_date) where each bucket starts"""
+    labels = []
+    starts = []
+    day = from_date
+    while day <= to_date:
+        start = bucket_start(day, granularity)
+        if not labels or labels[-1] != start:
+            labels.append(start)
+            starts.append((day - from_date).days)
+        # Jump straight to the next bucket
+        if granularity == 'day':
+            day += timedelta(days=1)
+        elif granularity == 'week':
+            day = start + timedelta(days=7)
+        elif granularity == 'month':
+            day = (start + timedelta(days=32)).replace(day=1)
+        elif granularity == 'quarter':
+            day = bucket_start((start + timedelta(days=95)).replace(day=1), 'quarter')
+        else:
+            day = date(start.year + 1, 1, 1)
+    starts.append((to_date - from_date).days + 1)
+    return labels, starts
+
+def window_prefix(values, shift, n):
+    """Prefix sums over n requested days, where day k is values[k + shift]
+
+    Days outside the cached range count as zero.
+    """
+    lead = min(max(-shift, 0), n)
+    lo = max(shift, 0)
+    hi = min(shift + n, len(values))
+
+    prefix = [0] * (lead + 1)
+    if hi > lo:
+        prefix.extend(accumulate(values[lo:hi]))
+    prefix.extend([prefix[-1]] * (n + 1 - len(prefix)))
+    return prefix
+
+def rebucket(values, shift, starts):
+    """Sum daily values into the buckets starting at each offset in starts"""
+    prefix = window_prefix(values, shift, starts[-1])
+    return [prefix[end] - prefix[begin] for begin, end in zip(starts, starts[1:])]
+
+def rolling_mean(values, window):
+    """Trailing mean over `window` buckets (shorter at the start)"""
+    prefix = list(accumulate(values, initial=0))
+    return [
+        (prefix[i + 1] - prefix[max(0, i + 1 - window)]) / min(i + 1, window)
+        for i in range(len(values))
+    ]
+
+def build_series(aggregate, from_date, to_date, granularity, metric, category_ids, cumulative, rolling):
+    """Compute per-category and total series over an aggregate"""
+    labels, starts = bucket_bounds(from_date, to_date, granularity)
+    shift = (from_date - aggregate.start).days
+
+    if category_ids is None:
+        category_ids = sorted(set(aggregate.income) | set(aggregate.expense))
+
+    series = {}
+    total = [0] * len(labels)
+    empty = array('q')
+    for category_id in category_ids:
+        income = rebucket(aggregate.income.get(category_id, empty), shift, starts)
+        expense = rebucket(aggregate.expense.get(category_id, empty), shift, starts)
+        if metric == 'income':
+            values = income
+        elif metric == 'net':
+            values = [i - e for i, e in zip(income, expense)]
+        else:
+            values = expense
+        if not any(values):
+            continue
+        series[category_id] = values
+        total = [t + v for t, v in zip(total, values)]
+
+    def finish(values):
+        if cumulative:
+            values = list(accumulate(values))
+        if rolling:
+            values = rolling_mean(values, rolling)
+        return [round(v / 100, 2) for v in values]
+
+    return {
+        'granularity': granularity,
+        'metric': metric,
+        'buckets': [label.isoformat() for label in labels],
+        'series': {str(category_id): finish(values) for category_id, values in series.items()},
+        'total': finish(total)
+    }
+
+def lttb(values, threshold):
+    """Indices of the points kept by largest-triangle-three-buckets
+
+    values are y at evenly spaced x. The first and last points are always
+    kept; every bucket in between keeps the point forming the largest
+    triangle with the previous kept point and the next bucket's average,
+    which preserves peaks and troughs that plain sampling would drop.
+    """
+    n = len(values)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+
+    every = (n - 2) / (threshold - 2)
+    selected = [0]
+    previous = 0
+    for bucket in range(threshold - 2):
+        next_start = int((bucket + 1) * every) + 1
+        next_end = min(int((bucket + 2) * every) + 1, n)
+        average_x = (next_start + next_end - 1) / 2
+        average_y = sum(values[next_start:next_end]) / (next_end - next_start)
+
+        previous_y = values[previous]
+        best_area = -1
+        for index in range(int(bucket * every) + 1, next_start):
+            area = abs((previous - average_x) * (values[index] - previous_y)
+                       - (previous - index) * (average_y - previous_y))
+            if area > best_area:
+                best_area = area
+                selected_index = index
+        selected.append(selected_index)
+        previous = selected_index
+    selected.append(n - 1)
+    return selected
+
+def balance_history(aggregate, from_date, to_date, points):
+    """End-of-day balances from from_date to to_date, at most `points` of them"""
+    n = (to_date - from_date).days + 1
+    shift = (from_date - aggregate.start).days
+    # Everything before the range, clipped to the cached days
+    opening = aggregate.opening + sum(aggregate.net[:min(max(shift, 0), len(aggregate.net))])
+    prefix = window_prefix(aggregate.net, shift, n)
+    balances = [opening + total for total in prefix[1:]]
+
+    kept = lttb(balances, points)
+    return {
+        'from': from_date.isoformat(),
+        'to': to_date.isoformat(),
+        'days': n,
+        'downsampled': len(kept) < n,
+        'opening_balance': round(opening / 100, 2),
+        'dates': [(from_date + timedelta(days=index)).isoformat() for index in kept],
+        'balances': [round(balances[index] / 100, 2) for index in kept]
+    }